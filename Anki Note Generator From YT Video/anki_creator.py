@@ -1,9 +1,12 @@
 import hashlib
+import json
 import os
+import re
 from typing import Optional
 
 import genanki
 
+from apkg_writer import ApkgWriter
 from schemas import FlashcardsResponse, Card, CardQA, CardSingleChoice, CardMultipleChoice, CardMatching
 
 
@@ -35,21 +38,57 @@ def _format_card_to_fields(card: Card) -> tuple[str, str, str]:
     return "Unsupported card", "", ""
 
 
-def create_anki_deck(
-    flashcards: FlashcardsResponse,
-    deck_name: str = "Generated Deck",
-    output_path: Optional[str] = None,
-) -> str:
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+def note_guid(source_id: str, topic: str, card: Card) -> str:
     """
-    Create an Anki package containing multiple decks, one per topic/subtopic.
+    Deterministic note GUID from the video, topic and normalized card content.
 
-    - Each deck is named as "{topic}" or "{topic}::{subtopic}" to form hierarchy.
-    - The exported filename will be derived from `deck_name` unless `output_path` is provided.
+    Regenerating the same card yields the same GUID, so re-importing updates the
+    existing note instead of adding a duplicate.
     """
+    q, a, _extra = _format_card_to_fields(card)
+    return genanki.guid_for(source_id, _normalize(topic), _normalize(q), _normalize(a))
+
+
+def manifest_path(apkg_path: str) -> str:
+    return os.path.splitext(apkg_path)[0] + ".manifest.json"
+
+
+def update_path(apkg_path: str) -> str:
+    """Where incremental mode writes the package of changed topics only."""
+    return os.path.splitext(apkg_path)[0] + ".update.apkg"
+
+
+def load_manifest(apkg_path: str) -> dict:
+    """Topic hashes recorded by the last write of `apkg_path` (empty when there is none)."""
+    try:
+        with open(manifest_path(apkg_path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def incremental_settings(incremental: Optional[bool] = None) -> bool:
+    """Resolve incremental mode from the argument or env `ANKI_INCREMENTAL`."""
+    if incremental is None:
+        incremental = (os.getenv("ANKI_INCREMENTAL") or "").strip().lower() in ("1", "true", "yes", "on")
+    return incremental
+
+
+def rebuild_full_settings(rebuild_full: Optional[bool] = None) -> bool:
+    """Resolve from the argument or env `ANKI_REBUILD_FULL` whether incremental writes also rebuild the full package."""
+    if rebuild_full is None:
+        rebuild_full = (os.getenv("ANKI_REBUILD_FULL") or "").strip().lower() in ("1", "true", "yes", "on")
+    return rebuild_full
+
+
+def _card_model(deck_name: str) -> genanki.Model:
     # Shared model across all decks
-    model_id = _stable_id_from_name(deck_name + "::model")
-    model = genanki.Model(
-        model_id=model_id,
+    return genanki.Model(
+        model_id=_stable_id_from_name(deck_name + "::model"),
         name="UniversalCardModel",
         fields=[{"name": "Question"}, {"name": "Answer"}, {"name": "Extra"}],
         templates=[
@@ -61,52 +100,231 @@ def create_anki_deck(
         ],
     )
 
-    # Build decks per topic/subtopic, nested under the provided root `deck_name`.
-    # Deck names will be formed as "{deck_name}::{topic}" or
-    # "{deck_name}::{topic}::{subtopic}" so Anki shows a single root deck with
-    # topic/subtopic children.
-    name_to_deck: dict[str, genanki.Deck] = {}
 
-    def get_or_create_deck(name: str) -> genanki.Deck:
-        d = name_to_deck.get(name)
+class DeckBuilder:
+    """
+    Build an Anki package incrementally, one card at a time.
+
+    Notes are constructed as soon as cards arrive (e.g. from a streaming LLM response),
+    so only the file write is left once generation finishes. Note GUIDs derive from
+    `source_id` (the video ID; the deck name when unknown), topic and card content.
+    """
+
+    def __init__(self, deck_name: str = "Generated Deck", source_id: Optional[str] = None) -> None:
+        self.deck_name = deck_name
+        self.source_id = source_id or deck_name
+        self.model = _card_model(deck_name)
+        self.note_count = 0
+        # topic -> [(deck name, note)], for per-topic change detection
+        self._topics: dict[str, list[tuple[str, genanki.Note]]] = {}
+        self._guids: set[str] = set()
+        # Topics included in the last `write`, and the delta package it wrote (incremental mode)
+        self.changed: list[str] = []
+        self.update_path: Optional[str] = None
+        # Build decks per topic/subtopic, nested under the provided root `deck_name`.
+        # Deck names will be formed as "{deck_name}::{topic}" or
+        # "{deck_name}::{topic}::{subtopic}" so Anki shows a single root deck with
+        # topic/subtopic children.
+        self._decks: dict[str, genanki.Deck] = {}
+        # Ensure the root deck exists so the hierarchy has a single main deck
+        self._get_or_create_deck(deck_name)
+
+    def _get_or_create_deck(self, name: str) -> genanki.Deck:
+        d = self._decks.get(name)
         if d is None:
             d = genanki.Deck(deck_id=_stable_id_from_name(name), name=name)
-            name_to_deck[name] = d
+            self._decks[name] = d
         return d
 
-    # Ensure the root deck exists so the hierarchy has a single main deck
-    get_or_create_deck(deck_name)
-
-    for deck_cards in flashcards.decks:
+    def add_card(self, topic: str, subtopic: Optional[str], card: Card) -> None:
         # Prefix every topic/subtopic with the main deck name to create a tree
-        deck_full_name = f"{deck_name}::{deck_cards.topic}"
-        if deck_cards.subtopic:
-            deck_full_name = f"{deck_full_name}::{deck_cards.subtopic}"
+        deck_full_name = f"{self.deck_name}::{topic}"
+        if subtopic:
+            deck_full_name = f"{deck_full_name}::{subtopic}"
+        q, a, extra = _format_card_to_fields(card)
+        guid = note_guid(self.source_id, topic, card)
+        if guid in self._guids:
+            # Same card twice in one topic would collide on import
+            return
+        self._guids.add(guid)
+        note = genanki.Note(model=self.model, fields=[q, a, extra], guid=guid)
+        self._get_or_create_deck(deck_full_name).add_note(note)
+        self._topics.setdefault(topic, []).append((deck_full_name, note))
+        self.note_count += 1
+
+    def add_flashcards(self, flashcards: FlashcardsResponse) -> None:
+        for deck_cards in flashcards.decks:
+            for card in deck_cards.cards:
+                self.add_card(deck_cards.topic, deck_cards.subtopic, card)
+
+    def topic_hashes(self) -> dict[str, str]:
+        """Content hash per topic; independent of card order."""
+        hashes = {}
+        for topic, notes in self._topics.items():
+            h = hashlib.sha1()
+            for deck_full_name, guid in sorted((name, note.guid) for name, note in notes):
+                h.update(f"{deck_full_name}\x1f{guid}\n".encode("utf-8"))
+            hashes[topic] = h.hexdigest()
+        return hashes
+
+    def changed_topics(self, manifest: dict) -> list[str]:
+        """Topics whose content differs from (or is missing in) a previous manifest."""
+        if manifest.get("source_id") != self.source_id or manifest.get("deck_name") != self.deck_name:
+            return list(self._topics)
+        previous = manifest.get("topics") or {}
+        return [topic for topic, digest in self.topic_hashes().items() if previous.get(topic) != digest]
+
+    def _delta_decks(self, topics: list[str]) -> list[genanki.Deck]:
+        decks: dict[str, genanki.Deck] = {}
+        for topic in topics:
+            for deck_full_name, note in self._topics[topic]:
+                deck = decks.get(deck_full_name)
+                if deck is None:
+                    deck = decks[deck_full_name] = genanki.Deck(
+                        deck_id=_stable_id_from_name(deck_full_name), name=deck_full_name
+                    )
+                deck.add_note(note)
+        return list(decks.values())
 
-        target_deck = get_or_create_deck(deck_full_name)
+    def write(
+        self, output_path: Optional[str] = None, incremental: Optional[bool] = None, rebuild_full: Optional[bool] = None
+    ) -> str:
+        """
+        Write the package; the filename is derived from the deck name unless `output_path` is a .apkg file.
 
-        for card in deck_cards.cards:
-            q, a, extra = _format_card_to_fields(card)
-            note = genanki.Note(model=model, fields=[q, a, extra])
-            target_deck.add_note(note)
+        A manifest of topic hashes is written next to the package. In incremental mode
+        (argument or env `ANKI_INCREMENTAL`) with a previous package, only the topics that
+        changed since that manifest are written, to `<name>.update.apkg` (`update_path`,
+        returned); importing it updates the matching notes in place. The full package is
+        left alone unless `rebuild_full` (env `ANKI_REBUILD_FULL`) asks for it. When nothing
+        changed, nothing is written.
+        """
+        output_path_final = self._resolve_path(output_path)
+        self.changed = list(self._topics)
+        self.update_path = None
+        os.makedirs(os.path.dirname(output_path_final), exist_ok=True)
+        if incremental_settings(incremental):
+            manifest = load_manifest(output_path_final)
+            self.changed = self.changed_topics(manifest)
+            if not self.changed and os.path.exists(output_path_final):
+                return output_path_final
+            if manifest and os.path.exists(output_path_final):
+                self.update_path = update_path(output_path_final)
+                genanki.Package(self._delta_decks(self.changed)).write_to_file(self.update_path)
+                if not rebuild_full_settings(rebuild_full):
+                    self._write_manifest(output_path_final)
+                    return self.update_path
 
-    # Package all decks together
-    decks = list(name_to_deck.values()) or [genanki.Deck(_stable_id_from_name(deck_name), deck_name)]
-    package = genanki.Package(decks)
+        # Package all decks together
+        genanki.Package(list(self._decks.values())).write_to_file(output_path_final)
+        self._write_manifest(output_path_final)
+        return output_path_final
 
+    def _write_manifest(self, apkg_path: str) -> None:
+        manifest = {"deck_name": self.deck_name, "source_id": self.source_id, "topics": self.topic_hashes()}
+        tmp = manifest_path(apkg_path) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp, manifest_path(apkg_path))
+
+    def _resolve_path(self, output_path: Optional[str]) -> str:
+        return _resolve_output_path(self.deck_name, output_path)
+
+
+def _resolve_output_path(deck_name: str, output_path: Optional[str]) -> str:
     safe_name = deck_name.replace(os.sep, "_").replace(" ", "_")
     if output_path is None:
-        output_path_final = os.path.abspath(f"{safe_name}.apkg")
-    else:
-        output_path = os.path.abspath(output_path)
-        if output_path.lower().endswith(".apkg"):
-            output_path_final = output_path
-        else:
-            os.makedirs(output_path, exist_ok=True)
-            output_path_final = os.path.join(output_path, f"{safe_name}.apkg")
+        return os.path.abspath(f"{safe_name}.apkg")
+    output_path = os.path.abspath(output_path)
+    if output_path.lower().endswith(".apkg"):
+        return output_path
+    os.makedirs(output_path, exist_ok=True)
+    return os.path.join(output_path, f"{safe_name}.apkg")
+
+
+class CourseVideo:
+    """
+    One video's cards for a `CoursePackageWriter`, held until the video succeeds.
+
+    `add_card` only formats the note, so it is cheap enough for a streaming callback
+    on the event loop; `CoursePackageWriter.commit` writes the notes to the package.
+    """
+
+    def __init__(self, deck_name: str, video_title: str, source_id: str) -> None:
+        self.video_title = video_title
+        self.source_id = source_id
+        self._root = f"{deck_name}::{video_title}"
+        # (deck name, fields, guid)
+        self.notes: list[tuple[str, tuple[str, str, str], str]] = []
+
+    def add_card(self, topic: str, subtopic: Optional[str], card: Card) -> None:
+        deck_full_name = f"{self._root}::{topic}"
+        if subtopic:
+            deck_full_name = f"{deck_full_name}::{subtopic}"
+        self.notes.append((deck_full_name, _format_card_to_fields(card), note_guid(self.source_id, topic, card)))
+
+    def add_flashcards(self, flashcards: FlashcardsResponse) -> None:
+        for deck_cards in flashcards.decks:
+            for card in deck_cards.cards:
+                self.add_card(deck_cards.topic, deck_cards.subtopic, card)
+
+
+class CoursePackageWriter:
+    """
+    One package for many videos, streamed to disk instead of held in memory.
+
+    All videos share one note model; notes go to
+    "{deck_name}::{video title}::{topic}[::{subtopic}]". Each video's cards are staged
+    in a `CourseVideo` and only written by `commit` once the video succeeded, so a
+    failed video leaves nothing behind. Videos can be committed from several threads;
+    `close` writes the package.
+    """
 
-    os.makedirs(os.path.dirname(output_path_final), exist_ok=True)
-    package.write_to_file(output_path_final)
-    return output_path_final
+    def __init__(self, output_path: Optional[str] = None, deck_name: str = "Course") -> None:
+        self.deck_name = deck_name
+        self.model = _card_model(deck_name)
+        self.output_path = _resolve_output_path(deck_name, output_path)
+        self._writer = ApkgWriter(self.output_path, [self.model], deck_id_for=_stable_id_from_name)
+        self._writer.deck_id(deck_name)
 
+    @property
+    def note_count(self) -> int:
+        return self._writer.note_count
 
+    def video(self, video_title: str, source_id: str) -> CourseVideo:
+        """Stage the cards of one video; pass `add_card` as a streaming `on_card` callback."""
+        return CourseVideo(self.deck_name, video_title, source_id)
+
+    def commit(self, video: CourseVideo) -> None:
+        """Write a video's staged notes (blocking: SQLite inserts in batches)."""
+        for deck_full_name, fields, guid in video.notes:
+            self._writer.add_note(deck_full_name, self.model, fields, guid)
+        video.notes = []
+
+    def add_flashcards(self, video_title: str, source_id: str, flashcards: FlashcardsResponse) -> None:
+        video = self.video(video_title, source_id)
+        video.add_flashcards(flashcards)
+        self.commit(video)
+
+    def close(self) -> str:
+        return self._writer.close()
+
+
+def create_anki_deck(
+    flashcards: FlashcardsResponse,
+    deck_name: str = "Generated Deck",
+    output_path: Optional[str] = None,
+    source_id: Optional[str] = None,
+    incremental: Optional[bool] = None,
+    rebuild_full: Optional[bool] = None,
+) -> str:
+    """
+    Create an Anki package containing multiple decks, one per topic/subtopic.
+
+    - Each deck is named as "{topic}" or "{topic}::{subtopic}" to form hierarchy.
+    - The exported filename will be derived from `deck_name` unless `output_path` is provided.
+    - Note GUIDs are stable per `source_id` (video ID); see `DeckBuilder.write` for incremental mode.
+    """
+    builder = DeckBuilder(deck_name, source_id=source_id)
+    builder.add_flashcards(flashcards)
+    return builder.write(output_path, incremental=incremental, rebuild_full=rebuild_full)
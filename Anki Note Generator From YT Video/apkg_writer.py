@@ -0,0 +1,185 @@
+import hashlib
+import html
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import zipfile
+from typing import Callable, Iterable, Optional, Sequence
+
+import genanki
+from genanki.apkg_col import APKG_COL
+from genanki.apkg_schema import APKG_SCHEMA
+
+DEFAULT_BATCH_SIZE = 2000
+
+# Indexes are created after the bulk load; maintaining them row by row is most of the insert cost
+_INDEXES = [line for line in APKG_SCHEMA.splitlines() if line.startswith("CREATE INDEX")]
+_TABLES = "\n".join(line for line in APKG_SCHEMA.splitlines() if not line.startswith("CREATE INDEX"))
+# Skips repeated GUIDs while loading; not part of Anki's schema, so dropped on close
+_GUID_INDEX = "CREATE UNIQUE INDEX ix_writer_guid ON notes (guid)"
+
+_STYLE_RE = re.compile(r"(?is)<style.*?>.*?</style>|<script.*?>.*?</script>|<!--.*?-->")
+_TAG_RE = re.compile(r"(?s)<.*?>")
+_MEDIA_RE = re.compile(r"(?i)<img[^>]+src=[\"']?([^\"'>]+)[\"']?[^>]*>|\[sound:(.+?)\]")
+
+
+def field_checksum(field: str) -> int:
+    """
+    Anki's `csum` of a note: the first 8 hex digits of the SHA-1 of its first field with
+    HTML and media references stripped. Anki uses it to find duplicate notes on import.
+    """
+    text = _MEDIA_RE.sub(lambda m: " " + (m.group(1) or m.group(2)) + " ", field)
+    text = html.unescape(_TAG_RE.sub("", _STYLE_RE.sub("", text)))
+    return int(hashlib.sha1(text.encode("utf-8")).hexdigest()[:8], 16)
+
+
+class ApkgWriter:
+    """
+    Write an .apkg by streaming notes straight into its collection database.
+
+    Unlike `genanki.Package`, no note objects are kept: rows are buffered up to
+    `batch_size` and inserted with `executemany`, so memory stays flat however many
+    notes are written. Decks and models are small and written to the `col` row on
+    `close`, which also zips the database. `deck_id_for` maps a deck name to its
+    stable ID. A note whose GUID was already written is skipped (by a unique index in the
+    database, so nothing per note stays in memory), as importing two notes with one GUID
+    would collide. Safe to call from several threads.
+    """
+
+    def __init__(
+        self,
+        output_path: str,
+        models: Sequence[genanki.Model],
+        deck_id_for: Callable[[str], int],
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        timestamp: Optional[float] = None,
+    ) -> None:
+        self.output_path = output_path
+        self.models = {model.model_id: model for model in models}
+        self.batch_size = batch_size
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self._deck_id_for = deck_id_for
+        self.note_count = 0
+        self._mod = int(self.timestamp)
+        self._next_id = int(self.timestamp * 1000)
+        self._decks: dict[str, int] = {}
+        # Card ords per model, from the fields each template requires (the model's "req")
+        self._reqs = {model.model_id: model.to_json(self.timestamp, 0)["req"] for model in models}
+        self._notes: list[tuple] = []
+        self._cards: list[tuple] = []
+        self._lock = threading.Lock()
+        fd, self._db_path = tempfile.mkstemp(suffix=".anki2")
+        os.close(fd)
+        self._conn = sqlite3.connect(self._db_path, check_same_thread=False)
+        # Scratch database: durability only matters once it is zipped
+        self._conn.execute("PRAGMA journal_mode=OFF")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.executescript(_TABLES)
+        self._conn.executescript(APKG_COL)
+        self._conn.execute(_GUID_INDEX)
+        # Cards wait here until their notes are inserted, then only those of new notes are kept
+        self._conn.execute("CREATE TEMP TABLE pending_cards AS SELECT * FROM cards WHERE 0")
+
+    def __enter__(self) -> "ApkgWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def deck_id(self, deck_name: str) -> int:
+        deck_id = self._decks.get(deck_name)
+        if deck_id is None:
+            deck_id = self._decks[deck_name] = self._deck_id_for(deck_name)
+        return deck_id
+
+    def add_note(
+        self,
+        deck_name: str,
+        model: genanki.Model,
+        fields: Sequence[str],
+        guid: str,
+        tags: Iterable[str] = (),
+    ) -> None:
+        """Queue one note and its cards; dropped on flush when a note with `guid` was already added."""
+        with self._lock:
+            deck_id = self.deck_id(deck_name)
+            note_id = self._next_id
+            self._next_id += 1
+            self._notes.append(
+                (
+                    note_id,
+                    guid,
+                    model.model_id,
+                    self._mod,
+                    -1,
+                    " " + " ".join(tags) + " ",
+                    "\x1f".join(fields),
+                    fields[model.sort_field_index],
+                    field_checksum(fields[0]),
+                    0,
+                    "",
+                )
+            )
+            for card_ord, any_or_all, required in self._reqs[model.model_id]:
+                op = any if any_or_all == "any" else all
+                if op(fields[i] for i in required):
+                    self._cards.append(
+                        (self._next_id, note_id, deck_id, card_ord, self._mod, -1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, "")
+                    )
+                    self._next_id += 1
+            if len(self._notes) >= self.batch_size:
+                self._flush()
+
+    def _flush(self) -> None:
+        conn = self._conn
+        with conn:
+            before = conn.total_changes
+            conn.executemany("INSERT OR IGNORE INTO notes VALUES (?,?,?,?,?,?,?,?,?,?,?)", self._notes)
+            self.note_count += conn.total_changes - before
+            conn.executemany("INSERT INTO pending_cards VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)", self._cards)
+            # Notes skipped as repeats were never inserted, so their ids match nothing
+            conn.execute("INSERT INTO cards SELECT p.* FROM pending_cards p JOIN notes n ON n.id = p.nid")
+            conn.execute("DELETE FROM pending_cards")
+        self._notes.clear()
+        self._cards.clear()
+
+    def close(self) -> str:
+        """Write decks and models, build the indexes and zip the package; returns its path."""
+        with self._lock:
+            self._flush()
+            conn = self._conn
+            decks = json.loads(conn.execute("SELECT decks FROM col").fetchone()[0])
+            for name, deck_id in self._decks.items():
+                decks[str(deck_id)] = genanki.Deck(deck_id=deck_id, name=name).to_json()
+            default_deck = next(iter(self._decks.values()), 1)
+            models = json.loads(conn.execute("SELECT models FROM col").fetchone()[0])
+            for model in self.models.values():
+                models[str(model.model_id)] = model.to_json(self.timestamp, default_deck)
+            with conn:
+                conn.execute("UPDATE col SET decks = ?, models = ?", (json.dumps(decks), json.dumps(models)))
+                conn.execute("DROP INDEX ix_writer_guid")
+                for statement in _INDEXES:
+                    conn.execute(statement)
+            conn.close()
+
+            directory = os.path.dirname(os.path.abspath(self.output_path))
+            os.makedirs(directory, exist_ok=True)
+            with zipfile.ZipFile(self.output_path, "w") as outzip:
+                outzip.write(self._db_path, "collection.anki2")
+                outzip.writestr("media", "{}")
+            os.remove(self._db_path)
+            return self.output_path
+
+    def abort(self) -> None:
+        """Discard the partial package."""
+        with self._lock:
+            self._conn.close()
+            if os.path.exists(self._db_path):
+                os.remove(self._db_path)
@@ -0,0 +1,283 @@
+import asyncio
+import json
+import os
+import subprocess
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from transcript_extractor import _extract_video_id, extract_transcript_async
+from model_selection import close_clients, get_generator
+from anki_creator import CoursePackageWriter, DeckBuilder, create_anki_deck
+from compaction import Compaction, compact_transcript, compaction_settings
+from dedupe import CardDeduper, DuplicateRecord, dedupe_settings, get_dedupe_index, save_dedupe_index
+from generation import streaming_settings
+from yt_title import fetch_video_title
+import tracing
+
+
+DEFAULT_LANGUAGES = ["en", "en-US", "en-GB"]
+
+# Sentinel pushed through the stage queues to tell workers to stop
+_DONE = object()
+
+
+@dataclass
+class BatchResult:
+    index: int
+    url: str
+    apkg_path: Optional[str] = None
+    error: Optional[str] = None
+    # Near-duplicate cards removed before packaging
+    duplicates: list[DuplicateRecord] = field(default_factory=list)
+    # Token reduction of the transcript before prompting (None when compaction is off)
+    compaction: Optional[Compaction] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def video_source_id(url: str) -> Optional[str]:
+    """Video ID used to derive stable note GUIDs, or None when the URL has none."""
+    try:
+        return _extract_video_id(url)
+    except ValueError:
+        return None
+
+
+def is_playlist_url(url: str) -> bool:
+    """True for playlist URLs (``/playlist?list=...``) that do not point at a single video."""
+    return "/playlist" in url or ("list=" in url and "v=" not in url and "youtu.be/" not in url)
+
+
+def is_batch_source(source: str) -> bool:
+    return os.path.isfile(source) or is_playlist_url(source)
+
+
+def expand_playlist(url: str) -> list[str]:
+    """Return the video URLs of a playlist using a flat yt-dlp listing (no per-video extraction)."""
+    cmd = [
+        "python",
+        "-m",
+        "yt_dlp",
+        "--flat-playlist",
+        "--dump-single-json",
+        url,
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f"Could not list playlist: {(result.stderr or '').strip()[:500]}")
+    data = json.loads(result.stdout)
+    urls: list[str] = []
+    for entry in data.get("entries") or []:
+        if not isinstance(entry, dict):
+            continue
+        video_id = entry.get("id")
+        entry_url = entry.get("url")
+        if isinstance(video_id, str) and video_id:
+            urls.append(f"https://www.youtube.com/watch?v={video_id}")
+        elif isinstance(entry_url, str) and entry_url:
+            urls.append(entry_url)
+    return urls
+
+
+def read_url_file(path: str) -> list[str]:
+    """Read one URL per line; blank lines and ``#`` comments are ignored."""
+    urls: list[str] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                urls.append(line)
+    return urls
+
+
+def collect_urls(source: str) -> list[str]:
+    """Resolve a URL file, playlist URL or single video URL into a de-duplicated list of video URLs."""
+    if os.path.isfile(source):
+        entries = read_url_file(source)
+    else:
+        entries = [source]
+    urls: list[str] = []
+    for entry in entries:
+        if is_playlist_url(entry):
+            urls.extend(expand_playlist(entry))
+        else:
+            urls.append(entry)
+    return list(dict.fromkeys(urls))
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(1, int(os.environ.get(name, default)))
+    except ValueError:
+        return default
+
+
+async def run_batch(
+    urls: list[str],
+    output_dir: str,
+    transcript_concurrency: Optional[int] = None,
+    llm_concurrency: Optional[int] = None,
+    package_concurrency: Optional[int] = None,
+    on_result: Optional[Callable[[BatchResult], None]] = None,
+) -> list[BatchResult]:
+    """
+    Process many videos as a three-stage pipeline: transcript -> LLM -> package.
+
+    - Each stage has its own pool of workers, so transcript fetches for later videos
+      overlap LLM generation for earlier ones.
+    - Stages are connected by bounded queues; a slow stage applies backpressure instead
+      of letting finished transcripts pile up in memory.
+    - A failing video is recorded in its `BatchResult` and does not stop the batch.
+    - Transcripts are compacted before prompting (env `TRANSCRIPT_COMPACT`).
+    - With env `ANKI_COURSE_DECK` set, every video goes into one package under that
+      root deck, written to disk as videos finish instead of one package per video.
+    Results are returned in input order.
+    """
+    transcript_workers = transcript_concurrency or _env_int("BATCH_TRANSCRIPT_CONCURRENCY", 4)
+    llm_workers = llm_concurrency or _env_int("BATCH_LLM_CONCURRENCY", 2)
+    package_workers = package_concurrency or _env_int("BATCH_PACKAGE_CONCURRENCY", 2)
+
+    provider = (os.environ.get("LLM_PROVIDER") or "groq").strip().lower()
+    model = os.environ.get("LLM_MODEL")
+    generator = get_generator(provider)
+    # Streaming builds each video's notes while its cards arrive
+    stream = streaming_settings()
+    dedupe_mode = dedupe_settings()
+    compaction = compaction_settings()
+    course_deck = (os.environ.get("ANKI_COURSE_DECK") or "").strip()
+    course = CoursePackageWriter(output_dir, course_deck) if course_deck else None
+
+    results = [BatchResult(index=i, url=url) for i, url in enumerate(urls)]
+    url_queue: asyncio.Queue = asyncio.Queue()
+    llm_queue: asyncio.Queue = asyncio.Queue(maxsize=llm_workers)
+    package_queue: asyncio.Queue = asyncio.Queue(maxsize=package_workers)
+
+    for i in range(len(urls)):
+        url_queue.put_nowait(i)
+    for _ in range(transcript_workers):
+        url_queue.put_nowait(_DONE)
+
+    def _finish(result: BatchResult, error: Optional[BaseException] = None) -> None:
+        if error is not None:
+            result.error = f"{type(error).__name__}: {error}"
+        if on_result is not None:
+            on_result(result)
+
+    async def transcript_worker() -> None:
+        while (i := await url_queue.get()) is not _DONE:
+            url = urls[i]
+            try:
+                with tracing.span("transcript", video=i) as sp:
+                    # Fetch the title alongside the transcript; both only depend on the URL
+                    transcript, title = await asyncio.gather(
+                        extract_transcript_async(url, language_preference=DEFAULT_LANGUAGES),
+                        asyncio.to_thread(fetch_video_title, url),
+                    )
+                    sp.add_bytes_out(transcript)
+                if compaction != "off":
+                    compacted = await asyncio.to_thread(
+                        compact_transcript, transcript, strip_fillers=compaction == "fillers"
+                    )
+                    transcript = compacted.text
+                    results[i].compaction = compacted
+            except Exception as exc:
+                _finish(results[i], exc)
+                continue
+            await llm_queue.put((i, transcript, title))
+
+    async def llm_worker() -> None:
+        while (item := await llm_queue.get()) is not _DONE:
+            i, transcript, title = item
+            source_id = video_source_id(urls[i])
+            builder = None
+            sink = None
+            if stream and course is not None:
+                # Staged until the video succeeds; the package worker writes them
+                builder = course.video(title or f"Video {i + 1}", source_id or urls[i])
+                sink = builder.add_card
+            elif stream:
+                builder = DeckBuilder(title or f"Generated Deck {i + 1}", source_id=source_id)
+                sink = builder.add_card
+            deduper = None
+            if dedupe_mode != "off":
+                deduper = CardDeduper(get_dedupe_index(), source_id or urls[i], dedupe_mode)
+                results[i].duplicates = deduper.removed
+            try:
+                with tracing.span("generate", video=i, provider=provider) as sp:
+                    sp.add_bytes_in(transcript)
+                    if sink is not None:
+                        on_card = deduper.filter(sink) if deduper is not None else sink
+                        _topics, flashcards = await generator(transcript, model, on_card=on_card)
+                        # Already staged for the course package
+                        flashcards = None if course is not None else flashcards
+                    else:
+                        _topics, flashcards = await generator(transcript, model)
+                        if deduper is not None:
+                            flashcards = deduper.dedupe(flashcards)
+            except Exception as exc:
+                if deduper is not None:
+                    deduper.rollback()
+                _finish(results[i], exc)
+                continue
+            await package_queue.put((i, flashcards, title, builder, deduper))
+
+    async def package_worker() -> None:
+        while (item := await package_queue.get()) is not _DONE:
+            i, flashcards, title, builder, deduper = item
+            try:
+                with tracing.span("package", video=i):
+                    if course is not None:
+                        if flashcards is not None:
+                            await asyncio.to_thread(
+                                course.add_flashcards, title or f"Video {i + 1}", video_source_id(urls[i]) or urls[i], flashcards
+                            )
+                        elif builder is not None:
+                            await asyncio.to_thread(course.commit, builder)
+                        results[i].apkg_path = course.output_path
+                    elif builder is not None:
+                        results[i].apkg_path = await asyncio.to_thread(builder.write, output_dir)
+                    else:
+                        results[i].apkg_path = await asyncio.to_thread(
+                            create_anki_deck,
+                            flashcards,
+                            deck_name=title or f"Generated Deck {i + 1}",
+                            output_path=output_dir,
+                            source_id=video_source_id(urls[i]),
+                        )
+            except Exception as exc:
+                # Cards of a video without a package must not drop duplicates elsewhere
+                if deduper is not None:
+                    deduper.rollback()
+                _finish(results[i], exc)
+                continue
+            _finish(results[i])
+
+    async def run_stage(workers: list[asyncio.Task], next_queue: Optional[asyncio.Queue], next_count: int) -> None:
+        await asyncio.gather(*workers)
+        if next_queue is not None:
+            for _ in range(next_count):
+                await next_queue.put(_DONE)
+
+    with tracing.span("batch", videos=len(urls)):
+        # Workers copy the context when created, so their spans nest under this one
+        t_tasks = [asyncio.create_task(transcript_worker()) for _ in range(transcript_workers)]
+        l_tasks = [asyncio.create_task(llm_worker()) for _ in range(llm_workers)]
+        p_tasks = [asyncio.create_task(package_worker()) for _ in range(package_workers)]
+        try:
+            await asyncio.gather(
+                run_stage(t_tasks, llm_queue, llm_workers),
+                run_stage(l_tasks, package_queue, package_workers),
+                run_stage(p_tasks, None, 0),
+            )
+        finally:
+            for task in t_tasks + l_tasks + p_tasks:
+                task.cancel()
+            # Provider clients are shared by every video in the batch; release them once
+            await close_clients()
+            if dedupe_mode != "off":
+                await asyncio.to_thread(save_dedupe_index)
+            if course is not None:
+                await asyncio.to_thread(course.close)
+    return results
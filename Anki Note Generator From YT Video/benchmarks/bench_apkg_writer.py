@@ -0,0 +1,97 @@
+"""
+Benchmark writing very large packages: genanki objects vs the streaming writer.
+
+Each case runs in a fresh subprocess so peak RSS is measured per case. Run from the
+project root:
+
+    python benchmarks/bench_apkg_writer.py [--notes 10000 100000 500000] [--skip-legacy-above 100000]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+VIDEOS = 100
+TOPICS = 10
+
+
+def _cards(notes: int):
+    from schemas import CardQA
+
+    per_video = max(1, notes // VIDEOS)
+    for n in range(notes):
+        video, i = divmod(n, per_video)
+        yield (
+            f"Video {video}",
+            f"vid{video}",
+            f"Topic {i % TOPICS}",
+            CardQA(question=f"Question {n} about a concept from the lecture?", answer=f"Answer {n}", explanation="..."),
+        )
+
+
+def run_case(writer: str, notes: int) -> dict:
+    from anki_creator import CoursePackageWriter, DeckBuilder
+
+    out = os.path.join(tempfile.mkdtemp(), "bench.apkg")
+    start = time.perf_counter()
+    if writer == "legacy":
+        builder = DeckBuilder("Course")
+        for video, source_id, topic, card in _cards(notes):
+            builder.add_card(f"{video}::{topic}", None, card)
+        builder.write(out)
+    else:
+        course = CoursePackageWriter(out, "Course")
+        staged = None
+        for video, source_id, topic, card in _cards(notes):
+            if staged is None or staged.video_title != video:
+                if staged is not None:
+                    course.commit(staged)
+                staged = course.video(video, source_id)
+            staged.add_card(topic, None, card)
+        if staged is not None:
+            course.commit(staged)
+        course.close()
+    elapsed = time.perf_counter() - start
+    return {
+        "seconds": elapsed,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "size_mb": os.path.getsize(out) / 1024 / 1024,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--notes", type=int, nargs="+", default=[10_000, 100_000, 500_000])
+    parser.add_argument("--skip-legacy-above", type=int, default=None)
+    parser.add_argument("--case", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(args.case[0], int(args.case[1]))))
+        return
+
+    print(f"{'notes':>8} {'writer':>10} {'seconds':>9} {'peak RSS MB':>12} {'apkg MB':>8}")
+    for notes in args.notes:
+        for writer in ("legacy", "streaming"):
+            if writer == "legacy" and args.skip_legacy_above and notes > args.skip_legacy_above:
+                continue
+            out = subprocess.run(
+                [sys.executable, __file__, "--case", writer, str(notes)], capture_output=True, text=True, check=True
+            )
+            r = json.loads(out.stdout)
+            print(f"{notes:>8} {writer:>10} {r['seconds']:>9.2f} {r['peak_rss_mb']:>12.0f} {r['size_mb']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
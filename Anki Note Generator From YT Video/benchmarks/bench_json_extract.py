@@ -0,0 +1,239 @@
+"""
+Benchmark JSON extraction on large, realistic (and realistically broken) LLM outputs.
+
+Compares `json_extract.extract_json` with the per-client parsers it replaced
+(copied below for reference). Run from the project root:
+
+    python benchmarks/bench_json_extract.py [--cards 3000] [--repeat 5]
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from json_extract import extract_json  # noqa: E402
+
+
+# --- Parsers as they were before json_extract -------------------------------------
+
+
+def legacy_gemini_strip_to_json(text: str) -> dict:
+    """Best-effort extraction of a JSON object from LLM text.
+
+    Never raises; returns an empty dict on failure.
+    """
+    if not isinstance(text, str):
+        return {}
+
+    text = text.strip()
+    if not text:
+        return {}
+
+    # Prefer fenced code blocks first
+    fence_match = re.search(r"```(?:json)?\s*([\s\S]*?)```", text, re.IGNORECASE)
+    if fence_match:
+        fenced = fence_match.group(1).strip()
+        if fenced:
+            try:
+                obj = json.loads(fenced)
+                return obj if isinstance(obj, dict) else {"data": obj}
+            except Exception:
+                # try json5 as a fallback for fenced content
+                try:
+                    import json5  # type: ignore
+
+                    parsed = json5.loads(fenced)
+                    obj = json.loads(json.dumps(parsed))
+                    return obj if isinstance(obj, dict) else {"data": obj}
+                except Exception:
+                    pass
+
+    # Try direct JSON first
+    try:
+        obj = json.loads(text)
+        return obj if isinstance(obj, dict) else {"data": obj}
+    except Exception:
+        pass
+
+    # Extract largest {...} or [...] segment and try that
+    brace_start, brace_end = text.find("{"), text.rfind("}")
+    bracket_start, bracket_end = text.find("["), text.rfind("]")
+
+    candidate = None
+    if brace_start != -1 and brace_end != -1 and brace_end > brace_start:
+        candidate = text[brace_start : brace_end + 1]
+    elif bracket_start != -1 and bracket_end != -1 and bracket_end > bracket_start:
+        candidate = text[bracket_start : bracket_end + 1]
+
+    if candidate:
+        try:
+            obj = json.loads(candidate)
+            return obj if isinstance(obj, dict) else {"data": obj}
+        except Exception:
+            # try json5 on candidate
+            try:
+                import json5  # type: ignore
+
+                parsed = json5.loads(candidate)
+                obj = json.loads(json.dumps(parsed))
+                return obj if isinstance(obj, dict) else {"data": obj}
+            except Exception:
+                pass
+
+    # json5 last resort on full text
+    try:
+        import json5  # type: ignore
+
+        parsed = json5.loads(text)
+        obj = json.loads(json.dumps(parsed))
+        return obj if isinstance(obj, dict) else {"data": obj}
+    except Exception:
+        return {}
+
+
+def legacy_groq_strip_to_json(text: str) -> dict:
+    text = text.strip()
+
+    # If response is fenced as a code block, extract the fenced content
+    fence_match = re.search(r"```(?:json)?\s*([\s\S]*?)```", text, re.IGNORECASE)
+    if fence_match:
+        text = fence_match.group(1).strip()
+
+    # Try direct strict JSON
+    try:
+        return json.loads(text)
+    except Exception:
+        pass
+
+    # Try extracting the largest braced object
+    start = text.find("{")
+    end = text.rfind("}")
+    if start != -1 and end != -1 and end > start:
+        candidate = text[start : end + 1]
+        try:
+            return json.loads(candidate)
+        except Exception:
+            pass
+
+    # Fall back to JSON5 for non-strict JSON (single quotes, trailing commas, etc.)
+    try:
+        import json5  # type: ignore
+
+        parsed = json5.loads(text)
+        # Re-serialize to strict JSON and load again to ensure standard structure
+        return json.loads(json.dumps(parsed))
+    except Exception as exc:
+        # Re-try with candidate slice in JSON5
+        if start != -1 and end != -1 and end > start:
+            try:
+                import json5  # type: ignore
+
+                parsed = json5.loads(candidate)
+                return json.loads(json.dumps(parsed))
+            except Exception:
+                pass
+        # Bubble up with context for troubleshooting
+        raise json.JSONDecodeError("Failed to parse model JSON output", text, 0) from exc
+
+
+# --- Synthetic completions ----------------------------------------------------------
+
+
+def _flashcards(n_cards: int) -> dict:
+    decks = []
+    for d in range(max(1, n_cards // 25)):
+        cards = []
+        for c in range(25):
+            i = d * 25 + c
+            if i % 3 == 0:
+                cards.append(
+                    {
+                        "type": "single_choice",
+                        "question": f"Which statement about concept {i} is correct?",
+                        "options": [f"Option {k} for concept {i}, with some detail" for k in range(4)],
+                        "correct_option": i % 4,
+                        "explanation": f"Concept {i} follows from the definition given in the lecture.",
+                    }
+                )
+            else:
+                cards.append(
+                    {
+                        "type": "qa",
+                        "question": f"What is the role of \"component {i}\" in the pipeline?",
+                        "answer": f"Component {i} transforms the input; see the worked example {{x: {i}}}.",
+                    }
+                )
+        decks.append({"topic": f"Topic {d // 4}", "subtopic": f"Part {d}", "cards": cards})
+    return {"decks": decks}
+
+
+def _variants(n_cards: int) -> dict[str, str]:
+    doc = _flashcards(n_cards)
+    clean = json.dumps(doc, ensure_ascii=False, indent=2)
+    fenced = "Here are your flashcards:\n\n```json\n" + clean + "\n```\n\nLet me know if you need {more}!"
+    # Trailing commas and comments, as produced by models imitating JS
+    commas = re.sub(r"(\})(\n\s*\])", r"\1,\2", clean)
+    commas = commas.replace('"decks": [', '"decks": [ // generated', 1)
+    # Raw newlines inside string values
+    newlines = clean.replace("transforms the input; ", "transforms the input;\n")
+    # Unquoted keys and single quotes: only json5 copes
+    json5_only = re.sub(r'"(\w+)":', r"\1:", clean).replace('"topic"', "'topic'")
+    return {
+        "clean": clean,
+        "fenced+prose": fenced,
+        "trailing-commas": "```json\n" + commas + "\n```",
+        "raw-newlines": newlines,
+        "json5-only": json5_only,
+    }
+
+
+def _time(fn, text: str, repeat: int) -> tuple[float, str]:
+    best = float("inf")
+    outcome = ""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            value = fn(text)
+            outcome = "ok" if value else "empty"
+        except Exception as exc:
+            outcome = type(exc).__name__
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, outcome
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cards", type=int, default=3000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    parsers = {
+        "extract_json": lambda text: extract_json(text).value,
+        "legacy gemini": legacy_gemini_strip_to_json,
+        "legacy groq": legacy_groq_strip_to_json,
+    }
+    print(f"{'variant':<16} {'size':>9}  " + "  ".join(f"{name:>22}" for name in parsers) + "  strategy")
+    for variant, text in _variants(args.cards).items():
+        cells = []
+        for fn in parsers.values():
+            # json5 is very slow in pure Python; one run is enough to show it
+            repeat = 1 if variant == "json5-only" else args.repeat
+            ms, outcome = _time(fn, text, repeat)
+            cells.append(f"{ms:>10.1f} ms {outcome:>8}")
+        try:
+            strategy = extract_json(text).strategy
+        except Exception:
+            strategy = "-"
+        print(f"{variant:<16} {len(text) / 1024:>7.0f}KB  " + "  ".join(f"{c:>22}" for c in cells) + f"  {strategy}")
+
+
+if __name__ == "__main__":
+    main()
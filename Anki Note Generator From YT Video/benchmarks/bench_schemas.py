@@ -0,0 +1,102 @@
+"""
+Benchmark flashcard validation on large completions.
+
+Compares the old path (json.loads, then a left-to-right union model built per call)
+with the cached discriminated-union adapter validating the raw text. Run from the
+project root:
+
+    python benchmarks/bench_schemas.py [--cards 10000] [--repeat 5]
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional, Union
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from pydantic import BaseModel, TypeAdapter  # noqa: E402
+
+from schemas import (  # noqa: E402
+    FLASHCARDS_ADAPTER,
+    CardMatching,
+    CardMultipleChoice,
+    CardQA,
+    CardSingleChoice,
+    validate_completion,
+)
+
+
+# --- Models as they were before the discriminated union ---------------------------
+
+
+class LegacyDeckCards(BaseModel):
+    topic: str
+    subtopic: Optional[str] = None
+    cards: List[Union[CardQA, CardSingleChoice, CardMultipleChoice, CardMatching]]
+
+
+class LegacyFlashcardsResponse(BaseModel):
+    decks: List[LegacyDeckCards] = []
+
+
+def legacy_validate(text: str) -> LegacyFlashcardsResponse:
+    return TypeAdapter(LegacyFlashcardsResponse).validate_python(json.loads(text))
+
+
+# --- Synthetic data ---------------------------------------------------------------
+
+
+def make_completion(cards: int) -> str:
+    kinds = [
+        lambda i: {"type": "qa", "question": f"What is concept {i}?", "answer": f"Concept {i} is ..."},
+        lambda i: {"type": "single_choice", "question": f"Pick {i}", "options": ["a", "b", "c"], "correct_option": 1},
+        lambda i: {"type": "multiple_choice", "question": f"Pick all {i}", "options": ["a", "b", "c"], "correct_options": [0, 2]},
+        lambda i: {"type": "matching", "pairs": [{"left": f"l{i}", "right": f"r{i}"}, {"left": "x", "right": "y"}]},
+    ]
+    per_deck = 50
+    decks = []
+    for d in range(0, cards, per_deck):
+        decks.append(
+            {
+                "topic": f"Topic {d // per_deck}",
+                "subtopic": "Details",
+                "cards": [kinds[i % len(kinds)](i) for i in range(d, min(cards, d + per_deck))],
+            }
+        )
+    return json.dumps({"decks": decks})
+
+
+def timed(fn, text: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--cards", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    text = make_completion(args.cards)
+    current = lambda t: validate_completion(FLASHCARDS_ADAPTER, t, json.loads)  # noqa: E731
+    assert sum(len(d.cards) for d in current(text).decks) == args.cards
+
+    legacy = timed(legacy_validate, text, args.repeat)
+    new = timed(current, text, args.repeat)
+    print(f"{args.cards} cards, {len(text) / 1024:.0f} KiB")
+    print(f"  legacy union + json.loads   {legacy * 1000:8.1f} ms")
+    print(f"  discriminated validate_json {new * 1000:8.1f} ms  ({legacy / new:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Offline CPU benchmark suite for transcript parsing, JSON extraction, validation and packaging.
+
+Every input is synthetic (json3 subtitle files, malformed LLM completions and
+flashcard payloads from 100 to 100k cards), so no network or API key is needed.
+Each run is saved to `benchmarks/results/<commit>.json`; compare two runs to spot
+regressions between commits. Run from the project root:
+
+    python benchmarks/suite.py [--sizes 100 1000 10000 100000] [--repeat 3] [--only parse_json3 create_anki_deck]
+    python benchmarks/suite.py --compare benchmarks/results/OLD.json benchmarks/results/NEW.json [--threshold 1.10]
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+DEFAULT_SIZES = [100, 1_000, 10_000, 100_000]
+# Caption lines per card (each line is a caption event plus a line-break append)
+EVENTS_PER_CARD = 2
+MALFORMATIONS = ("clean", "fenced", "broken")
+
+
+# --- Synthetic data ---------------------------------------------------------------
+
+
+def write_json3(path: str, events: int) -> None:
+    """A YouTube json3 subtitle file with `events` caption events and line-break appends."""
+    words = "so the key idea here is that gradient descent follows the slope downhill".split()
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"wireMagic":"pb3","events":[')
+        for i in range(events):
+            if i:
+                f.write(",")
+            start = i * 2000
+            segs = [{"utf8": (" " if k else "") + words[(i + k) % len(words)], "tOffsetMs": k * 300} for k in range(5)]
+            f.write(json.dumps({"tStartMs": start, "dDurationMs": 2500, "wWinId": 1, "segs": segs}))
+            f.write(",")
+            f.write(json.dumps({"tStartMs": start + 1900, "dDurationMs": 100, "wWinId": 1, "aAppend": 1, "segs": [{"utf8": "\n"}]}))
+        f.write("]}")
+
+
+def make_payload(cards: int) -> dict:
+    """A FlashcardsResponse-shaped dict with every card type, 50 cards per deck."""
+    kinds = [
+        lambda i: {"type": "qa", "question": f"What is concept {i}?", "answer": f"Concept {i} is ...", "explanation": "Because ..."},
+        lambda i: {"type": "single_choice", "question": f"Pick {i}", "options": ["a", "b", "c"], "correct_option": 1},
+        lambda i: {"type": "multiple_choice", "question": f"Pick all {i}", "options": ["a", "b", "c"], "correct_options": [0, 2]},
+        lambda i: {"type": "matching", "pairs": [{"left": f"l{i}", "right": f"r{i}"}, {"left": "x", "right": "y"}]},
+    ]
+    per_deck = 50
+    decks = []
+    for d in range(0, cards, per_deck):
+        decks.append(
+            {
+                "topic": f"Topic {d // per_deck}",
+                "subtopic": "Details",
+                "cards": [kinds[i % len(kinds)](i) for i in range(d, min(cards, d + per_deck))],
+            }
+        )
+    return {"decks": decks}
+
+
+def make_completion(payload: dict, malformation: str) -> str:
+    """
+    Model output for `payload`: "clean" JSON, "fenced" (prose and a ```json fence
+    around it) or "broken" (comments, trailing commas, Python literals and raw
+    newlines inside strings, as seen from real models).
+    """
+    text = json.dumps(payload, indent=2)
+    if malformation == "fenced":
+        return f"Sure! Here are the flashcards you asked for:\n\n```json\n{text}\n```\n\nLet me know if you need more."
+    if malformation == "broken":
+        text = text.replace('"type": "qa",', '"type": "qa", // from the lecture')
+        text = text.replace('"explanation": "Because ..."', '"explanation": "Because\n..."')
+        text = text.replace('"subtopic": "Details"', '"subtopic": None')
+        # Trailing comma after the last card of every deck
+        text = text.replace("\n        }\n      ]", "\n        },\n      ]")
+        return text
+    return text
+
+
+# --- Cases ------------------------------------------------------------------------
+
+
+def _cases(size: int, workdir: str) -> dict[str, Callable[[], object]]:
+    """Benchmark name -> zero-argument callable for one input size (setup happens here, untimed)."""
+    from anki_creator import _format_card_to_fields, create_anki_deck
+    from gemini_client import _strip_to_json as gemini_strip_to_json
+    from groq_client import _strip_to_json as groq_strip_to_json
+    from schemas import FlashcardsResponse
+    from transcript_extractor import _parse_json3_to_text
+
+    json3_path = os.path.join(workdir, f"subs-{size}.json3")
+    write_json3(json3_path, size * EVENTS_PER_CARD)
+    payload = make_payload(size)
+    flashcards = FlashcardsResponse.model_validate(payload)
+    cards = [card for deck in flashcards.decks for card in deck.cards]
+    deck_path = os.path.join(workdir, f"deck-{size}.apkg")
+
+    cases: dict[str, Callable[[], object]] = {"parse_json3": lambda: _parse_json3_to_text(json3_path)}
+    for malformation in MALFORMATIONS:
+        text = make_completion(payload, malformation)
+        cases[f"strip_to_json.groq.{malformation}"] = lambda text=text: groq_strip_to_json(text)
+        cases[f"strip_to_json.gemini.{malformation}"] = lambda text=text: gemini_strip_to_json(text)
+    cases["model_validate"] = lambda: FlashcardsResponse.model_validate(payload)
+    cases["format_card_to_fields"] = lambda: [_format_card_to_fields(card) for card in cards]
+    cases["create_anki_deck"] = lambda: create_anki_deck(flashcards, deck_name="Bench", output_path=deck_path)
+    return cases
+
+
+def time_case(fn: Callable[[], object], repeat: int) -> dict:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {"best_ms": round(min(times) * 1000, 3), "median_ms": round(statistics.median(times) * 1000, 3), "runs": repeat}
+
+
+def run_suite(sizes: list[int], repeat: int, only: Optional[list[str]] = None) -> dict:
+    results: dict[str, dict[str, dict]] = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in sizes:
+            for name, fn in _cases(size, workdir).items():
+                if only and not any(name.startswith(prefix) for prefix in only):
+                    continue
+                result = time_case(fn, repeat)
+                results.setdefault(name, {})[str(size)] = result
+                print(f"{name:<32} {size:>7} cards {result['best_ms']:>10.2f} ms (median {result['median_ms']:.2f})")
+    return results
+
+
+# --- Stored results ---------------------------------------------------------------
+
+
+def git_revision() -> str:
+    """Short commit hash of the working tree, with "-dirty" for uncommitted changes ("unknown" outside git)."""
+    try:
+        rev = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=PROJECT_ROOT, capture_output=True, text=True
+        ).stdout.strip()
+        return f"{rev}-dirty" if dirty else rev
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def save_results(results: dict, sizes: list[int], repeat: int, path: Optional[str] = None) -> str:
+    revision = git_revision()
+    path = path or str(RESULTS_DIR / f"{revision}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    document = {
+        "revision": revision,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()}",
+        "sizes": sizes,
+        "repeat": repeat,
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2)
+    return path
+
+
+def compare(old_path: str, new_path: str, threshold: float) -> int:
+    """Print new/old ratios of the best times; returns the number of regressions beyond `threshold`."""
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+    print(f"{old['revision']} -> {new['revision']}  (regression: ratio > {threshold:.2f})")
+    if old.get("machine") != new.get("machine") or old.get("python") != new.get("python"):
+        print("warning: runs come from different machines or Python versions")
+    print(f"{'benchmark':<32} {'cards':>7} {'old ms':>10} {'new ms':>10} {'ratio':>7}")
+    regressions = 0
+    for name, by_size in new["results"].items():
+        for size, result in by_size.items():
+            before = old["results"].get(name, {}).get(size)
+            if before is None or not before["best_ms"]:
+                continue
+            ratio = result["best_ms"] / before["best_ms"]
+            flag = "  REGRESSION" if ratio > threshold else ""
+            regressions += bool(flag)
+            print(f"{name:<32} {size:>7} {before['best_ms']:>10.2f} {result['best_ms']:>10.2f} {ratio:>6.2f}x{flag}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="+", help="benchmark name prefixes to run")
+    parser.add_argument("--output", help="results file (default benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    parser.add_argument("--threshold", type=float, default=1.10)
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, threshold=args.threshold) else 0)
+    results = run_suite(args.sizes, args.repeat, args.only)
+    print(f"Saved {save_results(results, args.sizes, args.repeat, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
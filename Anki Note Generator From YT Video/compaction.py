@@ -0,0 +1,117 @@
+import os
+import re
+import string
+from typing import Iterable, NamedTuple
+
+import tracing
+
+DEFAULT_MIN_OVERLAP = 3
+DEFAULT_MAX_OVERLAP = 40
+
+_FILLERS = frozenset({"um", "umm", "uh", "uhh", "uhm", "erm", "er", "ah", "hmm", "mm", "mhm"})
+# Caption annotations for non-speech ("[Music]", "[Applause]") and speaker-change markers
+_NON_SPEECH_RE = re.compile(r"\[[^\]\n]{1,40}\]|>>")
+_PUNCT = string.punctuation + "…“”‘’"
+
+
+class Compaction(NamedTuple):
+    """Compacted transcript with the estimated prompt tokens before and after."""
+
+    text: str
+    tokens_before: int
+    tokens_after: int
+
+    @property
+    def saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+    def report(self) -> str:
+        percent = 100 * self.saved / self.tokens_before if self.tokens_before else 0.0
+        return f"Transcript compacted: {self.tokens_before} -> {self.tokens_after} estimated tokens (-{percent:.0f}%)."
+
+
+def _key(word: str) -> str:
+    return word.lower().strip(_PUNCT) or word
+
+
+def remove_rolling_overlaps(
+    words: list[str], min_overlap: int = DEFAULT_MIN_OVERLAP, max_overlap: int = DEFAULT_MAX_OVERLAP
+) -> list[str]:
+    """
+    Drop word n-grams that immediately repeat the words before them.
+
+    Rolling auto-captions show each line twice (as the bottom line, then as the top line
+    of the next caption), so the joined text repeats runs of words back to back. Only
+    repeats of at least `min_overlap` words are removed, leaving ordinary repetition
+    ("very very", "no, no") alone. Words compare case- and punctuation-insensitively.
+    """
+    out: list[str] = []
+    out_keys: list[str] = []
+    # Recent positions of each word in `out`, to find candidate overlaps without scanning
+    seen: dict[str, list[int]] = {}
+    keys = [_key(w) for w in words]
+    i = 0
+    n = len(words)
+    while i < n:
+        skip = 0
+        positions = seen.get(keys[i])
+        if positions:
+            size = len(out)
+            for pos in reversed(positions):
+                k = size - pos
+                if k > max_overlap:
+                    break
+                if k >= min_overlap and k > skip and out_keys[pos:] == keys[i : i + k]:
+                    skip = k
+        if skip:
+            i += skip
+            continue
+        seen.setdefault(keys[i], []).append(len(out))
+        out.append(words[i])
+        out_keys.append(keys[i])
+        i += 1
+    return out
+
+
+def compact_transcript(
+    text: str,
+    strip_fillers: bool = False,
+    min_overlap: int = DEFAULT_MIN_OVERLAP,
+    max_overlap: int = DEFAULT_MAX_OVERLAP,
+) -> Compaction:
+    """
+    Shrink a transcript before it is put into prompts.
+
+    - Repeated n-grams from rolling captions are removed (see `remove_rolling_overlaps`).
+    - Whitespace, including caption line breaks, collapses to single spaces.
+    - With `strip_fillers`, filler words ("um", "uh", ...) and non-speech annotations
+      ("[Music]", ">>") are dropped as well.
+    """
+    from generation import estimate_tokens
+
+    with tracing.span("compact") as sp:
+        sp.add_bytes_in(text)
+        source = _NON_SPEECH_RE.sub(" ", text) if strip_fillers else text
+        words = source.split()
+        if strip_fillers:
+            words = [w for w in words if _key(w) not in _FILLERS]
+        compacted = " ".join(remove_rolling_overlaps(words, min_overlap, max_overlap))
+        sp.add_bytes_out(compacted)
+    return Compaction(compacted, estimate_tokens(text), estimate_tokens(compacted))
+
+
+def compaction_settings(mode: str | None = None) -> str:
+    """Compaction mode from env `TRANSCRIPT_COMPACT`: "on" (default), "fillers" (also strip fillers) or "off"."""
+    value = (mode if mode is not None else os.getenv("TRANSCRIPT_COMPACT", "on")).strip().lower()
+    if value in ("0", "false", "no", "off"):
+        return "off"
+    return "fillers" if value == "fillers" else "on"
+
+
+def summarize(compactions: Iterable[Compaction]) -> str:
+    """One line with the total token reduction over several transcripts."""
+    items = list(compactions)
+    before = sum(c.tokens_before for c in items)
+    after = sum(c.tokens_after for c in items)
+    percent = 100 * (before - after) / before if before else 0.0
+    return f"Transcripts compacted: {before} -> {after} estimated tokens (-{percent:.0f}%) over {len(items)} videos."
@@ -0,0 +1,220 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from generation import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 300
+# Below this many tokens the provider rejects explicit caches (checked by model prefix)
+_MIN_CACHEABLE_TOKENS = (
+    ("gemini-1.5", 32_768),
+    ("gemini-2.5-flash", 1_024),
+    ("gemini-2.5-pro", 4_096),
+)
+_DEFAULT_MIN_CACHEABLE_TOKENS = 4_096
+# Prices relative to the regular input price per token
+CACHED_INPUT_RATIO = 0.25
+STORAGE_RATIO_PER_HOUR = 3.6
+
+CreateCache = Callable[[int], Awaitable[str]]
+UpdateCache = Callable[[str, int], Awaitable[None]]
+DeleteCache = Callable[[str], Awaitable[None]]
+
+
+def min_cacheable_tokens(model: str) -> int:
+    """Smallest context the provider will cache for `model` (env `GEMINI_CACHE_MIN_TOKENS` overrides)."""
+    override = os.getenv("GEMINI_CACHE_MIN_TOKENS")
+    if override:
+        return int(override)
+    name = model.rsplit("/", 1)[-1]
+    for prefix, tokens in _MIN_CACHEABLE_TOKENS:
+        if name.startswith(prefix):
+            return tokens
+    return _DEFAULT_MIN_CACHEABLE_TOKENS
+
+
+def inline_is_cheaper(context_tokens: int, expected_requests: int, ttl_seconds: float = DEFAULT_TTL_SECONDS) -> bool:
+    """
+    Compare sending the context with every request against caching it once.
+
+    Caching pays the context once at the full rate, then the cached rate per request,
+    plus storage for the TTL.
+    """
+    inline = expected_requests * context_tokens
+    cached = context_tokens * (1 + expected_requests * CACHED_INPUT_RATIO + STORAGE_RATIO_PER_HOUR * ttl_seconds / 3600)
+    return inline <= cached
+
+
+class _Entry:
+    __slots__ = ("name", "expires_at", "pending", "keepalive")
+
+    def __init__(self, name: str, expires_at: float) -> None:
+        self.name = name
+        self.expires_at = expires_at
+        self.pending = 0
+        self.keepalive: Optional[asyncio.Task] = None
+
+
+class ContextCacheRegistry:
+    """
+    Live provider context caches keyed by (transcript hash, model, system instruction).
+
+    - A live cache is reused instead of created again (concurrent creators share one).
+    - While any caller holds a cache, its TTL is extended before it runs out.
+    - A cache replaced because it was about to expire is deleted once its last user
+      releases it (given `delete`), or at the latest by `close`.
+    - `close` deletes every cache this process created.
+    - Caching is skipped below the model's minimum size or when `inline_is_cheaper`;
+      env `GEMINI_CONTEXT_CACHE` = auto (default), always or off.
+    """
+
+    def __init__(self, ttl_seconds: int = DEFAULT_TTL_SECONDS) -> None:
+        self.ttl_seconds = ttl_seconds
+        self._entries: dict[tuple[str, str, str], _Entry] = {}
+        self._creating: dict[tuple[str, str, str], asyncio.Future] = {}
+        # Entries taken out of `_entries` (replaced or expiring) that were not deleted yet
+        self._retired: list[_Entry] = []
+        self.created = 0
+        self.reused = 0
+
+    @staticmethod
+    def key(model: str, transcript: str, system_instruction: str) -> tuple[str, str, str]:
+        digest = hashlib.sha256
+        return (
+            digest(transcript.encode("utf-8")).hexdigest(),
+            model,
+            digest(system_instruction.encode("utf-8")).hexdigest(),
+        )
+
+    def _live(self, key: tuple[str, str, str]) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        # Leave a margin so a request is not sent against a cache about to expire
+        if entry is not None and entry.expires_at - time.time() > min(30, self.ttl_seconds / 4):
+            return entry
+        if entry is not None:
+            # A new cache takes its place; this one may still be in use and live on the server
+            del self._entries[key]
+            self._retired.append(entry)
+        return None
+
+    def should_cache(self, model: str, transcript: str, expected_requests: int) -> bool:
+        mode = (os.getenv("GEMINI_CONTEXT_CACHE") or "auto").strip().lower()
+        if mode in ("off", "0", "false", "no"):
+            return False
+        if mode == "always":
+            return True
+        tokens = estimate_tokens(transcript)
+        if tokens < min_cacheable_tokens(model):
+            return False
+        return not inline_is_cheaper(tokens, expected_requests, self.ttl_seconds)
+
+    async def _acquire(self, key: tuple[str, str, str], create: CreateCache) -> _Entry:
+        entry = self._live(key)
+        if entry is not None:
+            self.reused += 1
+            return entry
+        pending = self._creating.get(key)
+        if pending is not None:
+            self.reused += 1
+            return await asyncio.shield(pending)
+        future = asyncio.get_running_loop().create_future()
+        self._creating[key] = future
+        try:
+            name = await create(self.ttl_seconds)
+            entry = _Entry(name, time.time() + self.ttl_seconds)
+            self._entries[key] = entry
+            self.created += 1
+            future.set_result(entry)
+            return entry
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Nobody else may be waiting; avoid "exception was never retrieved"
+            future.exception()
+            raise
+        finally:
+            del self._creating[key]
+
+    async def _keepalive(self, entry: _Entry, update: UpdateCache) -> None:
+        while True:
+            await asyncio.sleep(max(1.0, entry.expires_at - time.time() - self.ttl_seconds / 3))
+            try:
+                await update(entry.name, self.ttl_seconds)
+                entry.expires_at = time.time() + self.ttl_seconds
+            except Exception as exc:
+                logger.warning("Could not extend context cache %s: %s", entry.name, exc)
+
+    @asynccontextmanager
+    async def use(
+        self,
+        model: str,
+        transcript: str,
+        system_instruction: str,
+        expected_requests: int,
+        create: CreateCache,
+        update: UpdateCache,
+        delete: Optional[DeleteCache] = None,
+    ) -> AsyncIterator[Optional[str]]:
+        """
+        Yield a cache name holding `transcript`, or None when the caller should send it inline.
+
+        `create(ttl_seconds)` returns a new cache name; `update(name, ttl_seconds)` extends one;
+        `delete(name)` removes a replaced cache once nobody uses it (otherwise `close` does).
+        A failed creation also yields None, so generation never depends on caching.
+        """
+        key = self.key(model, transcript, system_instruction)
+        if self._live(key) is None and key not in self._creating and not self.should_cache(
+            model, transcript, expected_requests
+        ):
+            yield None
+            return
+        try:
+            entry = await self._acquire(key, create)
+        except Exception as exc:
+            logger.warning("Context cache creation failed, sending the transcript inline: %s", exc)
+            yield None
+            return
+        entry.pending += 1
+        if entry.keepalive is None:
+            entry.keepalive = asyncio.create_task(self._keepalive(entry, update))
+        try:
+            yield entry.name
+        finally:
+            entry.pending -= 1
+            if entry.pending == 0 and entry.keepalive is not None:
+                entry.keepalive.cancel()
+                entry.keepalive = None
+            if entry.pending == 0 and delete is not None and entry in self._retired:
+                self._retired.remove(entry)
+                await self._delete(entry, delete)
+
+    async def _delete(self, entry: _Entry, delete: DeleteCache) -> None:
+        try:
+            await delete(entry.name)
+        except Exception as exc:
+            logger.warning("Could not delete context cache %s: %s", entry.name, exc)
+
+    async def close(self, delete: DeleteCache) -> None:
+        """Delete every cache created through this registry, including replaced ones."""
+        entries = list(self._entries.values()) + self._retired
+        self._entries, self._retired = {}, []
+        for entry in entries:
+            if entry.keepalive is not None:
+                entry.keepalive.cancel()
+            await self._delete(entry, delete)
+
+
+_REGISTRY: Optional[ContextCacheRegistry] = None
+
+
+def get_context_cache_registry() -> ContextCacheRegistry:
+    """Process-wide registry; TTL from env `GEMINI_CACHE_TTL` (seconds, default 300)."""
+    global _REGISTRY
+    if _REGISTRY is None:
+        _REGISTRY = ContextCacheRegistry(ttl_seconds=int(os.getenv("GEMINI_CACHE_TTL") or DEFAULT_TTL_SECONDS))
+    return _REGISTRY
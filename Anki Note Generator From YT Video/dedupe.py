@@ -0,0 +1,483 @@
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Iterable, NamedTuple, Optional
+
+from generation import CardSink
+from schemas import Card, DeckCards, FlashcardsResponse
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "anki-yt-notes", "near_duplicates.idx")
+_MAGIC = b"ANKIDEDUPE2\n"
+# Version 1 files stored no band tables; they are still read and rebuilt once
+_MAGIC_V1 = b"ANKIDEDUPE1\n"
+_MASK31 = (1 << 31) - 1
+# Offset per step for bins filled by rotation densification; filled bins hold values
+# below 2**31, copied bins are tagged with the top bit
+_DENSIFY_STEP = 0x9E3779B1
+_COPIED = 1 << 31
+
+DEFAULT_NUM_PERM = 64
+DEFAULT_BANDS = 16
+DEFAULT_THRESHOLD = 0.8
+# Band buckets larger than this come from boilerplate shared by many cards ("What is
+# the ..."); they are skipped, since real duplicates also collide in other bands
+DEFAULT_MAX_BUCKET = 64
+MODES = ("off", "drop", "merge")
+
+_WORD_RE = re.compile(r"\w+")
+_TAG_RE = re.compile(r"<[^>]+>")
+
+
+def card_text(card: Card) -> str:
+    """Question and answer content of a card, whatever its type."""
+    parts = [getattr(card, "question", None) or "", getattr(card, "answer", None) or ""]
+    options = getattr(card, "options", None)
+    if options:
+        correct = getattr(card, "correct_options", None)
+        if correct is None:
+            correct = [getattr(card, "correct_option", -1)]
+        parts.extend(opt for i, opt in enumerate(options) if i in correct)
+    for pair in getattr(card, "pairs", None) or ():
+        parts.extend((pair.left, pair.right))
+    return " ".join(parts)
+
+
+def _words(text: str) -> list[str]:
+    return _WORD_RE.findall(_TAG_RE.sub(" ", text).casefold())
+
+
+def shingles(text: str, size: int = 2) -> list[int]:
+    """CRC32 hashes of the word n-grams of `text` after case and markup normalization."""
+    words = _words(text)
+    if len(words) < size:
+        return [zlib.crc32(w.encode("utf-8")) for w in words]
+    return [zlib.crc32(" ".join(words[i : i + size]).encode("utf-8")) for i in range(len(words) - size + 1)]
+
+
+class DuplicateRecord(NamedTuple):
+    """A card removed as a near-duplicate of `duplicate_of` (source::topic: question of the kept card)."""
+
+    source_id: str
+    topic: str
+    subtopic: Optional[str]
+    question: str
+    duplicate_of: str
+    similarity: float
+    action: str
+
+
+class NearDuplicateIndex:
+    """
+    MinHash/LSH index of card texts, sized for 100k+ cards.
+
+    - Signatures use one-permutation hashing (each shingle hashed once, min per bin)
+      with rotation densification, stored flat in an `array('I')`.
+    - LSH splits each signature into `bands`; cards sharing any band are candidates,
+      confirmed when the estimated Jaccard similarity reaches `threshold`.
+    - Band tables are sorted arrays searched with bisect; cards added since the last
+      rebuild sit in small dicts until they are merged in. Buckets holding more than
+      `max_bucket` cards are ignored so lookups stay constant-time.
+    - `save`/`load` persist signatures, labels and the band tables, so loading reads
+      arrays instead of hashing and sorting every card again.
+    """
+
+    def __init__(
+        self,
+        num_perm: int = DEFAULT_NUM_PERM,
+        bands: int = DEFAULT_BANDS,
+        threshold: float = DEFAULT_THRESHOLD,
+        shingle_size: int = 2,
+        max_bucket: int = DEFAULT_MAX_BUCKET,
+    ) -> None:
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.max_bucket = max_bucket
+        self._signatures = array("I")
+        self._sources = array("I")
+        self._source_names: list[str] = []
+        self._source_ids: dict[str, int] = {}
+        self._labels: list[str] = []
+        self._alive = bytearray()
+        self._frozen: list[tuple[array, array]] = [(array("q"), array("I")) for _ in range(bands)]
+        self._fresh: list[dict[int, list[int]]] = [{} for _ in range(bands)]
+        self._fresh_count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(self._alive)
+
+    def signature(self, text: str) -> Optional[array]:
+        """One-permutation MinHash of `text`, or None when it has no words."""
+        hashes = shingles(text, self.shingle_size)
+        if not hashes:
+            return None
+        k = self.num_perm
+        # Min per bin: within a bin, hash order equals value order, so the smallest write wins
+        filled = {h % k: h // k for h in sorted(hashes, reverse=True)}
+        if len(filled) == k:
+            return array("I", [filled[j] for j in range(k)])
+        # Rotation densification: an empty bin copies the next filled bin (wrapping
+        # around), offset by the distance so copies from different bins stay distinct
+        bins = [0] * k
+        source = min(filled) + k
+        v = filled[source - k]
+        for j in range(k - 1, -1, -1):
+            if j in filled:
+                v = bins[j] = filled[j]
+                source = j
+            else:
+                bins[j] = ((v + (source - j) * _DENSIFY_STEP) & _MASK31) | _COPIED
+        return array("I", bins)
+
+    def _band_keys(self, sig: array) -> list[int]:
+        # CRC32 rather than hash(): byte-string hashes differ between processes, and the
+        # band tables are saved. Colliding bands only add candidates, which are confirmed.
+        raw = sig.tobytes()
+        width = self.rows * sig.itemsize
+        return [zlib.crc32(raw[i : i + width]) for i in range(0, len(raw), width)]
+
+    def _candidates(self, keys: list[int]) -> set[int]:
+        found: set[int] = set()
+        for band, key in enumerate(keys):
+            frozen_keys, frozen_ids = self._frozen[band]
+            lo = bisect_left(frozen_keys, key)
+            hi = bisect_right(frozen_keys, key, lo)
+            fresh = self._fresh[band].get(key, ())
+            if hi - lo + len(fresh) > self.max_bucket:
+                continue
+            found.update(frozen_ids[lo:hi])
+            found.update(fresh)
+        return found
+
+    def similarity(self, sig: array, card_id: int) -> float:
+        """Estimated Jaccard similarity over bins filled in either signature (copies only route LSH)."""
+        k = self.num_perm
+        other = self._signatures[card_id * k : (card_id + 1) * k]
+        matches = used = 0
+        for a, b in zip(sig, other):
+            if a < _COPIED or b < _COPIED:
+                used += 1
+                matches += a == b
+        return matches / used
+
+    def query(self, sig: array, keys: Optional[list[int]] = None) -> Optional[tuple[int, float]]:
+        """Best live match at or above the threshold as (card id, similarity)."""
+        best: Optional[tuple[int, float]] = None
+        for card_id in self._candidates(keys or self._band_keys(sig)):
+            if not self._alive[card_id]:
+                continue
+            sim = self.similarity(sig, card_id)
+            if sim >= self.threshold and (best is None or sim > best[1]):
+                best = (card_id, sim)
+        return best
+
+    def add(self, sig: array, source_id: str, label: str, keys: Optional[list[int]] = None) -> int:
+        card_id = len(self._labels)
+        self._signatures.extend(sig)
+        source = self._source_ids.get(source_id)
+        if source is None:
+            source = self._source_ids[source_id] = len(self._source_names)
+            self._source_names.append(source_id)
+        self._sources.append(source)
+        self._labels.append(label)
+        self._alive.append(1)
+        for band, key in enumerate(keys or self._band_keys(sig)):
+            bucket = self._fresh[band].setdefault(key, [])
+            if len(bucket) <= self.max_bucket:
+                bucket.append(card_id)
+        self._fresh_count += 1
+        if self._fresh_count > max(4096, len(self._frozen[0][0])):
+            self._rebuild()
+        return card_id
+
+    def check_and_add(self, text: str, source_id: str, label: str) -> tuple[int, Optional[float]]:
+        """
+        Return `(card id, similarity)` of the match for `text`; when there is none, add
+        it and return `(new card id, None)`. Text without words is not indexed (id -1).
+        """
+        sig = self.signature(text)
+        if sig is None:
+            return -1, None
+        keys = self._band_keys(sig)
+        with self._lock:
+            match = self.query(sig, keys)
+            if match is None:
+                return self.add(sig, source_id, label, keys), None
+            return match
+
+    def label(self, card_id: int) -> str:
+        return f"{self._source_names[self._sources[card_id]]}::{self._labels[card_id]}"
+
+    def remove_source(self, source_id: str) -> list[int]:
+        """Forget every card of `source_id` (e.g. before regenerating that video); returns their ids."""
+        source = self._source_ids.get(source_id)
+        if source is None:
+            return []
+        removed = []
+        with self._lock:
+            for card_id, s in enumerate(self._sources):
+                if s == source and self._alive[card_id]:
+                    self._alive[card_id] = 0
+                    removed.append(card_id)
+        return removed
+
+    def set_alive(self, card_ids: Iterable[int], alive: bool) -> None:
+        """Forget (or bring back) individual cards, e.g. to undo a video that failed."""
+        with self._lock:
+            for card_id in card_ids:
+                self._alive[card_id] = alive
+
+    def _rebuild(self, new_ids: Optional[dict[int, int]] = None) -> None:
+        # Merge the fresh dicts into the sorted tables; with `new_ids` (compaction) cards
+        # missing from it are dropped and the rest renumbered. Band keys are never recomputed.
+        for band in range(self.bands):
+            frozen_keys, frozen_ids = self._frozen[band]
+            keys = list(frozen_keys)
+            ids = list(frozen_ids)
+            for key, bucket in self._fresh[band].items():
+                keys.extend([key] * len(bucket))
+                ids.extend(bucket)
+            # Mostly sorted already, so this is close to linear
+            order = sorted(range(len(keys)), key=keys.__getitem__)
+            if new_ids is None:
+                self._frozen[band] = (array("q", [keys[i] for i in order]), array("I", [ids[i] for i in order]))
+            else:
+                order = [i for i in order if ids[i] in new_ids]
+                self._frozen[band] = (array("q", [keys[i] for i in order]), array("I", [new_ids[ids[i]] for i in order]))
+        self._fresh = [{} for _ in range(self.bands)]
+        self._fresh_count = 0
+
+    def _compact(self) -> None:
+        # Drop removed cards so they do not survive a save/load cycle
+        k = self.num_perm
+        keep = [i for i in range(len(self._labels)) if self._alive[i]]
+        if len(keep) == len(self._labels):
+            if self._fresh_count:
+                self._rebuild()
+            return
+        self._rebuild({old: new for new, old in enumerate(keep)})
+        signatures = array("I")
+        for i in keep:
+            signatures.extend(self._signatures[i * k : (i + 1) * k])
+        self._signatures = signatures
+        self._sources = array("I", (self._sources[i] for i in keep))
+        self._labels = [self._labels[i] for i in keep]
+        self._alive = bytearray(b"\x01" * len(keep))
+
+    def _rebuild_from_signatures(self) -> None:
+        k = self.num_perm
+        for card_id in range(len(self._labels)):
+            keys = self._band_keys(self._signatures[card_id * k : (card_id + 1) * k])
+            for band, key in enumerate(keys):
+                self._fresh[band].setdefault(key, []).append(card_id)
+        self._fresh_count = len(self._labels)
+        self._rebuild()
+
+    def save(self, path: str) -> None:
+        with self._lock:
+            self._compact()
+            header = {
+                "num_perm": self.num_perm,
+                "bands": self.bands,
+                "shingle_size": self.shingle_size,
+                "byteorder": sys.byteorder,
+                "sources": self._source_names,
+                "labels": self._labels,
+                "band_sizes": [len(keys) for keys, _ids in self._frozen],
+            }
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(_MAGIC)
+                f.write(json.dumps(header).encode("utf-8") + b"\n")
+                self._sources.tofile(f)
+                self._signatures.tofile(f)
+                for keys, ids in self._frozen:
+                    keys.tofile(f)
+                    ids.tofile(f)
+            os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, **params) -> "NearDuplicateIndex":
+        """Load a saved index; returns an empty one when the file is missing or was built with other parameters."""
+        index = cls(**params)
+        try:
+            with open(path, "rb") as f:
+                magic = f.readline()
+                if magic not in (_MAGIC, _MAGIC_V1):
+                    raise ValueError("not a near-duplicate index")
+                header = json.loads(f.readline())
+                if (header["num_perm"], header["bands"], header["shingle_size"]) != (
+                    index.num_perm,
+                    index.bands,
+                    index.shingle_size,
+                ):
+                    logger.info("Near-duplicate index %s uses other parameters; starting a new one", path)
+                    return index
+                count = len(header["labels"])
+                index._sources.fromfile(f, count)
+                index._signatures.fromfile(f, count * index.num_perm)
+                if magic == _MAGIC:
+                    for band, size in enumerate(header["band_sizes"]):
+                        keys, ids = array("q"), array("I")
+                        keys.fromfile(f, size)
+                        ids.fromfile(f, size)
+                        index._frozen[band] = (keys, ids)
+        except FileNotFoundError:
+            return index
+        except (OSError, ValueError, KeyError, EOFError) as exc:
+            logger.warning("Could not load near-duplicate index %s: %s", path, exc)
+            return cls(**params)
+        if header["byteorder"] != sys.byteorder:
+            index._sources.byteswap()
+            index._signatures.byteswap()
+            for keys, ids in index._frozen:
+                keys.byteswap()
+                ids.byteswap()
+        index._source_names = list(header["sources"])
+        index._source_ids = {name: i for i, name in enumerate(index._source_names)}
+        index._labels = list(header["labels"])
+        index._alive = bytearray(b"\x01" * count)
+        if magic == _MAGIC_V1:
+            index._rebuild_from_signatures()
+        return index
+
+
+def _merge_into(kept: Card, duplicate: Card) -> bool:
+    """Fold what `duplicate` adds (a different answer, an explanation) into `kept`'s explanation."""
+    if not hasattr(kept, "explanation"):
+        return False
+    extra = []
+    answer = getattr(duplicate, "answer", None)
+    if answer and _words(answer) != _words(getattr(kept, "answer", None) or ""):
+        extra.append(f"Also: {answer}")
+    explanation = getattr(duplicate, "explanation", None)
+    if explanation and explanation not in (kept.explanation or ""):
+        extra.append(explanation)
+    if extra:
+        kept.explanation = "<br/>".join(filter(None, [kept.explanation, *extra]))
+    return True
+
+
+class CardDeduper:
+    """
+    Drops (or merges) cards that are near-duplicates of cards already in `index`.
+
+    Cards previously indexed for the same `source_id` are forgotten first, so
+    regenerating a video is not deduplicated against its own earlier run. In merge
+    mode a duplicate of a card from the same response is folded into that card;
+    duplicates of cards from other videos (already packaged) are always dropped.
+    Removed cards are collected in `removed`. Call `rollback()` when the video fails
+    before its package is written, so its cards do not drop duplicates elsewhere.
+    """
+
+    def __init__(self, index: NearDuplicateIndex, source_id: str = "", mode: str = "drop") -> None:
+        if mode not in MODES:
+            raise ValueError(f"Unknown dedupe mode: {mode}")
+        self.index = index
+        self.source_id = source_id
+        self.mode = mode
+        self.removed: list[DuplicateRecord] = []
+        self._kept: dict[int, Card] = {}
+        self._added: list[int] = []
+        self._replaced = index.remove_source(source_id)
+
+    def check(self, topic: str, subtopic: Optional[str], card: Card) -> bool:
+        """True when the card should be kept."""
+        if self.mode == "off":
+            return True
+        question = getattr(card, "question", None) or ""
+        label = f"{topic}: {question}"[:200]
+        card_id, similarity = self.index.check_and_add(card_text(card), self.source_id, label)
+        if similarity is None:
+            if card_id >= 0:
+                self._added.append(card_id)
+                if self.mode == "merge":
+                    self._kept[card_id] = card
+            return True
+        action = "dropped"
+        if self.mode == "merge" and card_id in self._kept and _merge_into(self._kept[card_id], card):
+            action = "merged"
+        record = DuplicateRecord(self.source_id, topic, subtopic, question, self.index.label(card_id), similarity, action)
+        self.removed.append(record)
+        logger.info("Near-duplicate card %s (%.2f) of %s: %s", action, similarity, record.duplicate_of, label)
+        return False
+
+    def rollback(self) -> None:
+        """Forget the cards this video added and restore those of its previous run."""
+        self.index.set_alive(self._added, False)
+        self.index.set_alive(self._replaced, True)
+        self._added = []
+        self._replaced = []
+
+    def filter(self, on_card: CardSink) -> CardSink:
+        """Wrap a streaming card sink so duplicates never reach it (merge degrades to drop)."""
+
+        def sink(topic: str, subtopic: Optional[str], card: Card) -> None:
+            if self.check(topic, subtopic, card):
+                on_card(topic, subtopic, card)
+
+        return sink
+
+    def dedupe(self, flashcards: FlashcardsResponse) -> FlashcardsResponse:
+        decks = []
+        for deck in flashcards.decks:
+            cards = [card for card in deck.cards if self.check(deck.topic, deck.subtopic, card)]
+            if cards:
+                decks.append(DeckCards(topic=deck.topic, subtopic=deck.subtopic, cards=cards))
+        return FlashcardsResponse(decks=decks)
+
+
+def dedupe_settings(mode: Optional[str] = None) -> str:
+    """Resolve the dedupe mode from the argument or env `ANKI_DEDUPE` (off, drop or merge)."""
+    mode = (mode or os.getenv("ANKI_DEDUPE") or "off").strip().lower()
+    if mode in ("1", "true", "yes", "on"):
+        mode = "drop"
+    return mode if mode in MODES else "off"
+
+
+_INDEX: Optional[NearDuplicateIndex] = None
+
+
+def get_dedupe_index() -> NearDuplicateIndex:
+    """Process-wide index loaded from env `ANKI_DEDUPE_INDEX`, threshold from `ANKI_DEDUPE_THRESHOLD`."""
+    global _INDEX
+    if _INDEX is None:
+        threshold = float(os.getenv("ANKI_DEDUPE_THRESHOLD") or DEFAULT_THRESHOLD)
+        _INDEX = NearDuplicateIndex.load(_index_path(), threshold=threshold)
+    return _INDEX
+
+
+def save_dedupe_index() -> None:
+    """Persist the process-wide index if it was used."""
+    if _INDEX is not None:
+        _INDEX.save(_index_path())
+
+
+def _index_path() -> str:
+    return os.path.expanduser(os.getenv("ANKI_DEDUPE_INDEX") or _DEFAULT_PATH)
+
+
+def summarize(records: Iterable[DuplicateRecord]) -> str:
+    """Report of removed cards: a count line, then one line per card."""
+    records = list(records)
+    merged = sum(1 for r in records if r.action == "merged")
+    lines = [f"Near-duplicates: {len(records) - merged} cards dropped, {merged} merged"]
+    for r in records:
+        lines.append(f"  [{r.action} {r.similarity:.2f}] {r.source_id}::{r.topic}: {r.question} ~ {r.duplicate_of}")
+    return "\n".join(lines)
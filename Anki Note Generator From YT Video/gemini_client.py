@@ -1,14 +1,36 @@
-import asyncio
+import hashlib
 import json
+import logging
 import os
-import re
 from typing import Tuple
 
 from google import genai
 from google.genai import types
 
-from prompts import _topics_prompt, _flashcards_prompt
-from schemas import TopicsResponse, FlashcardsResponse
+from context_cache import get_context_cache_registry
+from generation import (
+    FANOUT_MAX_TOKENS,
+    CardSink,
+    OnText,
+    chunking_settings,
+    emit_cards,
+    estimate_tokens,
+    extract_topics_chunked,
+    fanout_settings,
+    generate_flashcards_per_topic,
+    generate_flashcards_with_recovery,
+    stream_flashcards,
+    stream_flashcards_per_topic,
+    stream_topics_and_flashcards,
+    streaming_settings,
+    topic_units,
+)
+from json_extract import extract_json
+from prompts import _FLASHCARDS_SCHEMA, _topics_prompt, _flashcards_prompt
+from rate_limiter import get_scheduler
+from response_cache import get_response_cache
+from schemas import TOPICS_ADAPTER, FlashcardsResponse, FlashcardsSchema, TopicsResponse, validate_completion
+import tracing
 
 
 def _strip_to_json(text: str) -> dict:
@@ -16,160 +38,366 @@ def _strip_to_json(text: str) -> dict:
 
     Never raises; returns an empty dict on failure.
     """
-    if not isinstance(text, str):
+    if not isinstance(text, str) or not text.strip():
         return {}
-
-    text = text.strip()
-    if not text:
+    try:
+        obj = extract_json(text).value
+    except json.JSONDecodeError:
         return {}
+    return obj if isinstance(obj, dict) else {"data": obj}
 
-    # Prefer fenced code blocks first
-    fence_match = re.search(r"```(?:json)?\s*([\s\S]*?)```", text, re.IGNORECASE)
-    if fence_match:
-        fenced = fence_match.group(1).strip()
-        if fenced:
-            try:
-                obj = json.loads(fenced)
-                return obj if isinstance(obj, dict) else {"data": obj}
-            except Exception:
-                # try json5 as a fallback for fenced content
-                try:
-                    import json5  # type: ignore
 
-                    parsed = json5.loads(fenced)
-                    obj = json.loads(json.dumps(parsed))
-                    return obj if isinstance(obj, dict) else {"data": obj}
-                except Exception:
-                    pass
+logger = logging.getLogger(__name__)
 
-    # Try direct JSON first
-    try:
-        obj = json.loads(text)
-        return obj if isinstance(obj, dict) else {"data": obj}
-    except Exception:
-        pass
-
-    # Extract largest {...} or [...] segment and try that
-    brace_start, brace_end = text.find("{"), text.rfind("}")
-    bracket_start, bracket_end = text.find("["), text.rfind("]")
-
-    candidate = None
-    if brace_start != -1 and brace_end != -1 and brace_end > brace_start:
-        candidate = text[brace_start : brace_end + 1]
-    elif bracket_start != -1 and bracket_end != -1 and bracket_end > bracket_start:
-        candidate = text[bracket_start : bracket_end + 1]
-
-    if candidate:
-        try:
-            obj = json.loads(candidate)
-            return obj if isinstance(obj, dict) else {"data": obj}
-        except Exception:
-            # try json5 on candidate
-            try:
-                import json5  # type: ignore
+_LAST_FAKE_CLIENT = None  # testing hook to inspect the instantiated client
 
-                parsed = json5.loads(candidate)
-                obj = json.loads(json.dumps(parsed))
-                return obj if isinstance(obj, dict) else {"data": obj}
-            except Exception:
-                pass
+_DEFAULT_MODEL = "gemini-1.5-pro"
+_SYSTEM_INSTRUCTION = "You are an expert at analyzing transcripts and creating Anki flashcards."
 
-    # json5 last resort on full text
-    try:
-        import json5  # type: ignore
+# One client per process, shared across videos; its aio surface keeps a pooled
+# HTTP session per event loop.
+_CLIENT = None
 
-        parsed = json5.loads(text)
-        obj = json.loads(json.dumps(parsed))
-        return obj if isinstance(obj, dict) else {"data": obj}
-    except Exception:
-        return {}
 
+def _get_client():
+    global _CLIENT, _LAST_FAKE_CLIENT
+    if _CLIENT is None:
+        api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise RuntimeError("GOOGLE_API_KEY or GEMINI_API_KEY is not set")
+        _CLIENT = genai.Client(api_key=api_key)
+        # Expose the client for tests that monkeypatch and need to inspect calls
+        _LAST_FAKE_CLIENT = _CLIENT
+    return _CLIENT
 
-_LAST_FAKE_CLIENT = None  # testing hook to inspect the instantiated client
 
+async def open_client():
+    """Create (or reuse) the shared client ahead of the first request."""
+    return _get_client()
 
-async def generate_topics_and_flashcards(transcript: str, model: str | None = None) -> Tuple[TopicsResponse, FlashcardsResponse]:
-    api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise RuntimeError("GOOGLE_API_KEY or GEMINI_API_KEY is not set")
-    client = genai.Client(api_key=api_key)
-    # Expose the client for tests that monkeypatch and need to inspect calls
-    global _LAST_FAKE_CLIENT
-    _LAST_FAKE_CLIENT = client
-
-    model_name = model or os.getenv("GEMINI_MODEL", "gemini-1.5-pro")
-
-    # Create a 5-minute explicit context cache for the transcript
-    cached = client.caches.create(
-        model=model_name,
-        config=types.CreateCachedContentConfig(
-            contents=[transcript],
-            system_instruction="You are an expert at analyzing transcripts and creating Anki flashcards.",
-            ttl="300s",
-        )
+
+async def _delete_cache(name: str) -> None:
+    await _get_client().aio.caches.delete(name=name)
+
+
+async def close_client() -> None:
+    """Close the shared client's async sessions and drop it."""
+    global _CLIENT
+    if _CLIENT is None:
+        return
+    # Context caches are billed for storage until they expire; drop ours now
+    await get_context_cache_registry().close(_delete_cache)
+    client, _CLIENT = _CLIENT, None
+    aclose = getattr(getattr(client, "aio", None), "aclose", None)
+    if aclose is not None:
+        await aclose()
+    close = getattr(client, "close", None)
+    if close is not None:
+        close()
+
+
+def _usage_tokens(response) -> int | None:
+    return getattr(getattr(response, "usage_metadata", None), "total_token_count", None)
+
+
+def _hit_max_tokens(response) -> bool:
+    for cand in getattr(response, "candidates", None) or []:
+        if "MAX_TOKENS" in str(getattr(cand, "finish_reason", "") or ""):
+            return True
+    return False
+
+
+def _response_text(response) -> str:
+    text = getattr(response, "text", None)
+    if not text and hasattr(response, "candidates") and response.candidates:
+        parts = []
+        for cand in response.candidates:
+            try:
+                content = getattr(cand, "content", None)
+                for part in getattr(content, "parts", []) or []:
+                    val = getattr(part, "text", None)
+                    if isinstance(val, str):
+                        parts.append(val)
+            except Exception:
+                continue
+        text = "\n".join(parts)
+    return text or ""
+
+
+def _generate_config(max_tokens: int, response_schema, cached_content: str | None):
+    return types.GenerateContentConfig(
+        max_output_tokens=max_tokens,
+        temperature=0,
+        top_p=0.95,
+        top_k=40,
+        response_mime_type="application/json",
+        response_schema=response_schema,
+        cached_content=cached_content,
     )
 
-    def _generate(prompt: str, max_tokens: int, response_schema) -> str:
-        config = types.GenerateContentConfig(
-            max_output_tokens=max_tokens,
-            temperature=0,
-            top_p=0.95,
-            top_k=40,
-            response_mime_type="application/json",
-            response_schema=response_schema,
-            cached_content=getattr(cached, "name", None),
-        )
-        response = client.models.generate_content(
+
+async def _generate(
+    model_name: str,
+    prompt: str,
+    max_tokens: int,
+    response_schema,
+    cached_content: str | None = None,
+    context: str = "",
+) -> str:
+    """
+    One JSON completion. `context` identifies inputs outside the prompt (the cached
+    transcript) for the response cache, since cache names change between runs.
+    """
+    config = _generate_config(max_tokens, response_schema, cached_content)
+    client = _get_client()
+
+    async def request():
+        return await client.aio.models.generate_content(
             model=model_name,
             contents=prompt,
-            config=config
+            config=config,
+        )
+
+    async def uncached() -> str:
+        sp.set(cached=False)
+        # Rate limiting and retries (429/5xx) are handled by the shared scheduler
+        response = await get_scheduler().call(
+            "gemini", model_name, request, estimated_tokens=estimate_tokens(prompt), actual_tokens=_usage_tokens
+        )
+        if _hit_max_tokens(response):
+            logger.warning("Completion hit max_output_tokens=%d and was truncated", max_tokens)
+        return _response_text(response)
+
+    with tracing.span("llm", provider="gemini", model=model_name, cached=True) as sp:
+        sp.add_bytes_in(prompt)
+        # temperature=0: identical inputs give the same completion, so serve repeats from disk
+        text = await get_response_cache().get_or_call(
+            "gemini", model_name, prompt, uncached, schema=response_schema, max_tokens=max_tokens, context=context
         )
-        text = getattr(response, "text", None)
-        if not text and hasattr(response, "candidates") and response.candidates:
-            for cand in response.candidates:
-                parts = []
-                try:
-                    content = getattr(cand, "content", None)
-                    for part in getattr(content, "parts", []) or []:
-                        val = getattr(part, "text", None)
-                        if isinstance(val, str):
-                            parts.append(val)
-                except Exception:
-                    continue
-            text = "\n".join(parts)
-        return text or ""
-
-    # Build prompts that rely on cached transcript rather than embedding it again
-    # 1) Topics prompt (do not include transcript text)
-    cached_topics_prompt = (
-        "You are an assistant that returns strict JSON only. "
-        "Extract a list of high-quality learning topics with subtopics from the cached transcript. "
-        "Do not create topics for the course description, instructor, or any other non-learning content. Only create topics for the learning content that is important to learn. "
-        "Return ONLY valid JSON matching this schema: {\n  \"topics\": [ { \n    \"title\": string,\n    \"subtopics\": [ { \n      \"title\": string, \n      \"summary\": string, \n      \"key_points\": string[] \n    } ] \n  } ] \n}\n"
+        sp.add_bytes_out(text)
+        return text
+
+
+async def _generate_stream(
+    model_name: str,
+    prompt: str,
+    max_tokens: int,
+    response_schema,
+    on_text: OnText,
+    cached_content: str | None = None,
+    context: str = "",
+) -> str:
+    """Like `_generate`, but passes each chunk to `on_text(delta, attempt)` as it arrives."""
+    config = _generate_config(max_tokens, response_schema, cached_content)
+    client = _get_client()
+    attempts = 0
+
+    async def request() -> str:
+        nonlocal attempts
+        attempt, attempts = attempts, attempts + 1
+        stream = await client.aio.models.generate_content_stream(model=model_name, contents=prompt, config=config)
+        parts = []
+        async for chunk in stream:
+            if _hit_max_tokens(chunk):
+                logger.warning("Completion hit max_output_tokens=%d and was truncated", max_tokens)
+            delta = _response_text(chunk)
+            if delta:
+                parts.append(delta)
+                on_text(delta, attempt)
+        return "".join(parts)
+
+    async def uncached() -> str:
+        sp.set(cached=False)
+        return await get_scheduler().call("gemini", model_name, request, estimated_tokens=estimate_tokens(prompt))
+
+    with tracing.span("llm", provider="gemini", model=model_name, cached=True, stream=True) as sp:
+        sp.add_bytes_in(prompt)
+        # Shares entries with `_generate`; a hit is delivered as a single delta
+        text = await get_response_cache().get_or_call(
+            "gemini", model_name, prompt, uncached, schema=response_schema, max_tokens=max_tokens, context=context
+        )
+        sp.add_bytes_out(text)
+    if not attempts:
+        on_text(text, 0)
+    return text
+
+
+async def _create_cache(model_name: str, transcript: str, ttl_seconds: int) -> str:
+    client = _get_client()
+    cached = await get_scheduler().call(
+        "gemini",
+        model_name,
+        lambda: client.aio.caches.create(
+            model=model_name,
+            config=types.CreateCachedContentConfig(
+                contents=[transcript],
+                system_instruction=_SYSTEM_INSTRUCTION,
+                ttl=f"{ttl_seconds}s",
+            ),
+        ),
+        estimated_tokens=estimate_tokens(transcript),
     )
+    return cached.name
 
-    loop = asyncio.get_event_loop()
-    topics_text = await loop.run_in_executor(None, lambda: _generate(cached_topics_prompt, 65_535, response_schema=TopicsResponse))
-    topics_json = _strip_to_json(topics_text)
-    topics = TopicsResponse.model_validate(topics_json)
-
-    # 2) Flashcards prompt: include topics JSON but not the transcript (still in cache)
-    cached_flashcards_prompt = (
-        "You are an assistant that returns strict JSON. "
-        "Create Anki flashcards for the given topics and subtopics. Create as many flashcards as possible for each topic and subtopic. Limit the number of flashcards to 50 for each topic."
-        "Do not create flashcards for the course description, instructor, or any other non-learning content. Only create flashcards for the learning content that is important to learn."
-        "Create some flashcards for the examples, exercises, questions, etc. that is not the main learning content. These are important to learn and review, but not the main learning content."
-        "Card types allowed: qa, single_choice, multiple_choice, matching. "
-        "For choice questions, include options and the correct index(es). "
-        "Return ONLY valid JSON matching this schema: "
-        "{\n  \"decks\": [\n    {\n      \"topic\": string,\n      \"subtopic\": string?,\n      \"cards\": [\n        { \n          \"type\": \"qa\", \n          \"question\": string, \n          \"answer\": string, \n          \"explanation\": string? \n        } | { \n          \"type\": \"single_choice\", \n          \"question\": string, \n          \"options\": string[], \n          \"correct_option\": number, \n          \"explanation\": string? \n        } | { \n          \"type\": \"multiple_choice\", \n          \"question\": string, \n          \"options\": string[], \n          \"correct_options\": number[], \n          \"explanation\": string? \n        } | { \n          \"type\": \"matching\", \n          \"question\": string?, \n          \"pairs\": [ { \"left\": string, \"right\": string } ] \n        }\n      ]\n    }\n  ]\n}"
-        f"\nTopics JSON:\n{json.dumps(topics_json, ensure_ascii=False)}"
+
+async def _update_cache(name: str, ttl_seconds: int) -> None:
+    await _get_client().aio.caches.update(
+        name=name, config=types.UpdateCachedContentConfig(ttl=f"{ttl_seconds}s")
     )
 
-    flash_text = await loop.run_in_executor(None, lambda: _generate(cached_flashcards_prompt, 65_535, response_schema=FlashcardsResponse))
-    flash_json = _strip_to_json(flash_text)
-    flashcards = FlashcardsResponse.model_validate(flash_json)
 
-    return topics, flashcards
+async def generate_topics_and_flashcards(
+    transcript: str,
+    model: str | None = None,
+    chunk_tokens: int | None = None,
+    chunk_parallelism: int | None = None,
+    per_topic: bool | None = None,
+    flashcard_parallelism: int | None = None,
+    stream: bool | None = None,
+    on_card: CardSink | None = None,
+) -> Tuple[TopicsResponse, FlashcardsResponse]:
+    """
+    Generate topics, then flashcards, with the transcript held in an explicit context cache.
+
+    The cache comes from the process-wide registry, so a live cache for the same
+    transcript, model and system instruction is reused. Transcripts that are too small
+    to cache, or cheaper to send inline for the expected number of requests, are sent
+    with each prompt instead.
+
+    When `chunk_tokens` (or env `LLM_TOPICS_CHUNK_TOKENS`) is set and the transcript is
+    larger, topics are extracted per overlapping window (sent inline) and merged.
+    With `per_topic` (or env `LLM_FLASHCARDS_PER_TOPIC`), flashcards are requested
+    concurrently per topic/subtopic.
+    With `stream` (or env `LLM_STREAM`), completions are streamed and `on_card` receives
+    each card as soon as it is complete (see `groq_client.generate_topics_and_flashcards`).
+    """
+    chunk_tokens, chunk_parallelism = chunking_settings(chunk_tokens, chunk_parallelism)
+    per_topic, flashcard_parallelism = fanout_settings(per_topic, flashcard_parallelism)
+    stream = streaming_settings(stream)
+
+    model_name = model or os.getenv("GEMINI_MODEL", _DEFAULT_MODEL)
+
+    topics: TopicsResponse | None = None
+    if chunk_tokens and estimate_tokens(transcript) > chunk_tokens:
 
+        async def complete(prompt: str) -> str:
+            # Windows carry their own slice of the transcript, so no cache is attached
+            return await _generate(model_name, prompt, 65_535, TopicsResponse)
 
+        topics = await extract_topics_chunked(
+            transcript, complete, _strip_to_json, chunk_tokens, parallelism=chunk_parallelism
+        )
+        expected_requests = len(topic_units(topics)) if per_topic else 1
+    else:
+        # Topics plus at least two fan-out requests, or one deck request
+        expected_requests = 1 + (2 if per_topic else 1)
+
+    registry = get_context_cache_registry()
+    async with registry.use(
+        model_name,
+        transcript,
+        _SYSTEM_INSTRUCTION,
+        expected_requests,
+        create=lambda ttl: _create_cache(model_name, transcript, ttl),
+        update=_update_cache,
+        delete=_delete_cache,
+    ) as cache_name:
+        # Cache names change per run; the response cache keys on what they hold instead
+        cache_context = (
+            hashlib.sha256(f"{_SYSTEM_INSTRUCTION}\x1f{transcript}".encode("utf-8")).hexdigest() if cache_name else ""
+        )
+
+        # With a cache the prompts only reference it; otherwise each carries the transcript
+        prompt_transcript = None if cache_name else transcript
+
+        def stream_with(max_tokens: int, schema):
+            async def complete_stream(prompt: str, on_text: OnText) -> str:
+                return await _generate_stream(model_name, prompt, max_tokens, schema, on_text, cache_name, cache_context)
+
+            return complete_stream
+
+        if topics is None:
+            if cache_name:
+                # Build prompts that rely on the cached transcript rather than embedding it again
+                topics_prompt = (
+                    "You are an assistant that returns strict JSON only. "
+                    "Extract a list of high-quality learning topics with subtopics from the cached transcript. "
+                    "Do not create topics for the course description, instructor, or any other non-learning content. Only create topics for the learning content that is important to learn. "
+                    "Return ONLY valid JSON matching this schema: {\n  \"topics\": [ { \n    \"title\": string,\n    \"subtopics\": [ { \n      \"title\": string, \n      \"summary\": string, \n      \"key_points\": string[] \n    } ] \n  } ] \n}\n"
+                )
+            else:
+                topics_prompt = _topics_prompt(transcript)
+            if stream and per_topic:
+                # Each topic's flashcards start as soon as the topic closes in the stream
+                return await stream_topics_and_flashcards(
+                    topics_prompt,
+                    stream_with(65_535, TopicsResponse),
+                    _strip_to_json,
+                    on_card,
+                    transcript=prompt_transcript,
+                    parallelism=flashcard_parallelism,
+                )
+            topics_text = await _generate(model_name, topics_prompt, 65_535, TopicsResponse, cache_name, cache_context)
+            topics = validate_completion(TOPICS_ADAPTER, topics_text, _strip_to_json)
+        topics_json = topics.model_dump(exclude_none=True)
+
+        if per_topic and stream:
+            flashcards = await stream_flashcards_per_topic(
+                topics,
+                stream_with(FANOUT_MAX_TOKENS, FlashcardsSchema),
+                _strip_to_json,
+                on_card,
+                transcript=prompt_transcript,
+                parallelism=flashcard_parallelism,
+            )
+        elif per_topic:
+
+            async def complete_topic(prompt: str) -> str:
+                return await _generate(model_name, prompt, FANOUT_MAX_TOKENS, FlashcardsSchema, cache_name, cache_context)
+
+            flashcards = await generate_flashcards_per_topic(
+                topics,
+                complete_topic,
+                _strip_to_json,
+                transcript=prompt_transcript,
+                parallelism=flashcard_parallelism,
+            )
+            emit_cards(flashcards, on_card)
+        else:
+
+            def prompt_for(topics_json: dict) -> str:
+                if not cache_name:
+                    return _flashcards_prompt(topics_json, transcript)
+                # Flashcards prompt: include topics JSON but not the transcript (still in cache)
+                return (
+                    "You are an assistant that returns strict JSON. "
+                    "Create Anki flashcards for the given topics and subtopics. Create as many flashcards as possible for each topic and subtopic. Limit the number of flashcards to 50 for each topic."
+                    "Do not create flashcards for the course description, instructor, or any other non-learning content. Only create flashcards for the learning content that is important to learn."
+                    "Create some flashcards for the examples, exercises, questions, etc. that is not the main learning content. These are important to learn and review, but not the main learning content."
+                    "Card types allowed: qa, single_choice, multiple_choice, matching. "
+                    "For choice questions, include options and the correct index(es). "
+                    "Return ONLY valid JSON matching this schema: "
+                    + _FLASHCARDS_SCHEMA
+                    + f"\nTopics JSON:\n{json.dumps(topics_json, ensure_ascii=False)}"
+                )
+
+            # Output cut off at max_tokens is kept; only the missing topics are requested again
+            if stream:
+                decks = await stream_flashcards(
+                    prompt_for(topics_json),
+                    stream_with(65_535, FlashcardsSchema),
+                    _strip_to_json,
+                    on_card,
+                    topics=topics,
+                    prompt_for=prompt_for,
+                )
+                flashcards = FlashcardsResponse(decks=decks)
+            else:
+
+                async def complete_deck(prompt: str) -> str:
+                    return await _generate(model_name, prompt, 65_535, FlashcardsSchema, cache_name, cache_context)
+
+                flashcards = await generate_flashcards_with_recovery(topics, prompt_for, complete_deck, _strip_to_json)
+                emit_cards(flashcards, on_card)
+
+    return topics, flashcards
@@ -0,0 +1,690 @@
+import asyncio
+import logging
+import os
+import random
+import re
+from typing import Any, Awaitable, Callable, Iterable, NamedTuple, Optional
+
+from pydantic import ValidationError
+
+from incremental_json import IncrementalJSONParser, StreamItem
+from prompts import _topic_flashcards_prompt, _topics_prompt
+from schemas import (
+    CARD_ADAPTER,
+    FLASHCARDS_ADAPTER,
+    TOPICS_ADAPTER,
+    Card,
+    DeckCards,
+    FlashcardsResponse,
+    Subtopic,
+    Topic,
+    TopicsResponse,
+    validate_completion,
+)
+
+logger = logging.getLogger(__name__)
+
+# Rough average for English prose with BPE tokenizers
+_CHARS_PER_TOKEN = 4
+
+DEFAULT_CHUNK_OVERLAP_TOKENS = 200
+DEFAULT_CHUNK_PARALLELISM = 4
+DEFAULT_FANOUT_PARALLELISM = 4
+DEFAULT_FANOUT_RETRIES = 2
+# Follow-up requests for topics a truncated flashcards completion never reached
+DEFAULT_CONTINUATIONS = 2
+# Output budget for a single topic's flashcards (vs 65_535 for the whole deck)
+FANOUT_MAX_TOKENS = 16_384
+
+# A streaming completion sends a prompt, calls `on_text(delta, attempt)` for every chunk
+# (attempt increases when the provider call is retried) and returns the full text.
+OnText = Callable[[str, int], None]
+StreamComplete = Callable[[str, OnText], Awaitable[str]]
+# Receives each card as soon as it is complete: (topic, subtopic, card)
+CardSink = Callable[[str, Optional[str], Card], None]
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local token estimate used for budgeting and routing, not billing."""
+    tokens = (len(text) + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+    if not text.isascii():
+        # Non-Latin scripts take several times more tokens per character; their extra
+        # UTF-8 bytes are a cheap proxy (about one more token per CJK character)
+        tokens += (len(text.encode("utf-8")) - len(text)) // 2
+    return tokens
+
+
+def split_transcript(transcript: str, chunk_tokens: int, overlap_tokens: int = DEFAULT_CHUNK_OVERLAP_TOKENS) -> list[str]:
+    """
+    Split a transcript into windows of about `chunk_tokens`, each overlapping the previous
+    one by about `overlap_tokens` so topics spanning a boundary are seen whole at least once.
+
+    Window ends snap back to a sentence end or whitespace when one is near.
+    """
+    window = max(1, chunk_tokens) * _CHARS_PER_TOKEN
+    overlap = min(max(0, overlap_tokens) * _CHARS_PER_TOKEN, window // 2)
+    if len(transcript) <= window:
+        return [transcript]
+
+    chunks: list[str] = []
+    start = 0
+    while start < len(transcript):
+        end = min(start + window, len(transcript))
+        if end < len(transcript):
+            # Search the last 10% of the window for a natural break
+            floor = end - window // 10
+            cut = max(transcript.rfind(". ", floor, end), transcript.rfind("\n", floor, end))
+            if cut == -1:
+                cut = transcript.rfind(" ", floor, end)
+            if cut > start:
+                end = cut + 1
+        chunks.append(transcript[start:end].strip())
+        if end >= len(transcript):
+            break
+        next_start = max(end - overlap, start + 1)
+        # Start the next window on a word boundary
+        space = transcript.find(" ", next_start, end)
+        start = space + 1 if space != -1 and overlap else next_start
+    return [c for c in chunks if c]
+
+
+def _norm(title: str) -> str:
+    return re.sub(r"[\W_]+", " ", title).strip().casefold()
+
+
+def merge_topics(responses: Iterable[TopicsResponse]) -> TopicsResponse:
+    """
+    Merge per-window topic lists into one response.
+
+    Topics and subtopics with the same normalized title are combined (first appearance
+    wins for order and summary); key points are unioned without duplicates.
+    """
+    topics: dict[str, Topic] = {}
+    subtopics: dict[tuple[str, str], Subtopic] = {}
+    for response in responses:
+        for topic in response.topics:
+            topic_key = _norm(topic.title)
+            merged = topics.get(topic_key)
+            if merged is None:
+                merged = Topic(title=topic.title.strip(), subtopics=[])
+                topics[topic_key] = merged
+            for sub in topic.subtopics:
+                sub_key = (topic_key, _norm(sub.title))
+                existing = subtopics.get(sub_key)
+                if existing is None:
+                    existing = Subtopic(title=sub.title.strip(), summary=sub.summary, key_points=[])
+                    subtopics[sub_key] = existing
+                    merged.subtopics.append(existing)
+                elif not existing.summary and sub.summary:
+                    existing.summary = sub.summary
+                seen = {_norm(p) for p in existing.key_points or []}
+                for point in sub.key_points or []:
+                    if _norm(point) not in seen:
+                        seen.add(_norm(point))
+                        existing.key_points.append(point)
+    for sub in subtopics.values():
+        if not sub.key_points:
+            sub.key_points = None
+    return TopicsResponse(topics=list(topics.values()))
+
+
+def chunking_settings(
+    chunk_tokens: Optional[int] = None,
+    parallelism: Optional[int] = None,
+) -> tuple[Optional[int], int]:
+    """Resolve chunked-topics settings from arguments or `LLM_TOPICS_CHUNK_TOKENS`/`LLM_TOPICS_CHUNK_PARALLELISM`."""
+    if chunk_tokens is None and os.getenv("LLM_TOPICS_CHUNK_TOKENS"):
+        chunk_tokens = int(os.environ["LLM_TOPICS_CHUNK_TOKENS"])
+    if parallelism is None:
+        parallelism = int(os.getenv("LLM_TOPICS_CHUNK_PARALLELISM") or DEFAULT_CHUNK_PARALLELISM)
+    return chunk_tokens, max(1, parallelism)
+
+
+async def extract_topics_chunked(
+    transcript: str,
+    complete: Callable[[str], Awaitable[str]],
+    parse: Callable[[str], dict],
+    chunk_tokens: int,
+    parallelism: int = DEFAULT_CHUNK_PARALLELISM,
+    overlap_tokens: int = DEFAULT_CHUNK_OVERLAP_TOKENS,
+) -> TopicsResponse:
+    """
+    Map-reduce topic extraction: one topics request per transcript window, run concurrently
+    (at most `parallelism` at once), then merged with `merge_topics`.
+
+    `complete` sends a prompt to the provider and returns the completion text; `parse`
+    turns that text into a dict (the client's JSON extraction).
+    """
+    chunks = split_transcript(transcript, chunk_tokens, overlap_tokens)
+    semaphore = asyncio.Semaphore(parallelism)
+
+    async def one(chunk: str) -> TopicsResponse:
+        async with semaphore:
+            text = await complete(_topics_prompt(chunk))
+        return validate_completion(TOPICS_ADAPTER, text, parse)
+
+    responses = await asyncio.gather(*(one(chunk) for chunk in chunks))
+    return merge_topics(responses)
+
+
+class Salvaged(NamedTuple):
+    """Decks that closed before a completion was cut off, plus the cards of the deck it stopped in."""
+
+    complete: list[DeckCards]
+    partial: Optional[DeckCards]
+
+
+def _valid_cards(raw_cards: Any) -> list:
+    cards = []
+    for raw in raw_cards if isinstance(raw_cards, list) else []:
+        try:
+            cards.append(CARD_ADAPTER.validate_python(raw))
+        except ValidationError:
+            continue
+    return cards
+
+
+def salvage_flashcards(text: str) -> Optional[Salvaged]:
+    """
+    Recover what a truncated flashcards completion already produced.
+
+    Returns None when `text` holds a complete JSON document, is not strict JSON at all,
+    or stopped before a single valid card, so the regular parser handles it (and reports
+    prose or empty replies as errors). Otherwise returns every deck that closed and the
+    valid cards of the deck the output stopped in (when its topic is known).
+    """
+    parser = IncrementalJSONParser([("decks", "*", "cards", "*"), ("decks", "*")])
+    try:
+        items = parser.feed(text)
+    except ValueError:
+        return None
+    if parser.done or not items:
+        return None
+    closed: dict[int, DeckCards] = {}
+    open_decks: dict[int, tuple[dict, list]] = {}
+    for item in items:
+        index = item.path[1]
+        if len(item.path) == 2:
+            open_decks.pop(index, None)
+            value = item.value if isinstance(item.value, dict) else {}
+            cards = _valid_cards(value.get("cards"))
+            if value.get("topic") and cards:
+                closed[index] = DeckCards(topic=str(value["topic"]), subtopic=value.get("subtopic"), cards=cards)
+        else:
+            open_decks.setdefault(index, (item.context, []))[1].extend(_valid_cards([item.value]))
+    partial = None
+    for fields, cards in open_decks.values():
+        if fields.get("topic") and cards:
+            partial = DeckCards(topic=str(fields["topic"]), subtopic=fields.get("subtopic"), cards=cards)
+    if not closed and partial is None:
+        return None
+    return Salvaged([closed[i] for i in sorted(closed)], partial)
+
+
+def missing_topics(topics: TopicsResponse, decks: Iterable[DeckCards]) -> TopicsResponse:
+    """Topics/subtopics that no deck in `decks` covers (a topic-level deck covers all its subtopics)."""
+    covered_topics: set[str] = set()
+    covered: set[tuple[str, str]] = set()
+    for deck in decks:
+        if deck.subtopic:
+            covered.add((_norm(deck.topic), _norm(deck.subtopic)))
+        else:
+            covered_topics.add(_norm(deck.topic))
+    missing: list[Topic] = []
+    for topic in topics.topics:
+        key = _norm(topic.title)
+        if key in covered_topics:
+            continue
+        if topic.subtopics:
+            subtopics = [sub for sub in topic.subtopics if (key, _norm(sub.title)) not in covered]
+            if subtopics:
+                missing.append(Topic(title=topic.title, subtopics=subtopics))
+        elif not any(t == key for t, _ in covered):
+            missing.append(topic)
+    return TopicsResponse(topics=missing)
+
+
+def _card_key(topic: str, subtopic: Optional[str], card: Card) -> tuple[str, str, str]:
+    question = getattr(card, "question", None) or card.model_dump_json()
+    return _norm(topic), _norm(subtopic or ""), _norm(question)
+
+
+def merge_decks(decks: list[DeckCards], more: Iterable[DeckCards]) -> list[DeckCards]:
+    """Add `more` to `decks`, joining decks with the same topic/subtopic and skipping repeated questions."""
+    by_name = {(_norm(d.topic), _norm(d.subtopic or "")): d for d in decks}
+    seen = {_card_key(d.topic, d.subtopic, c) for d in decks for c in d.cards}
+    merged = list(decks)
+    for deck in more:
+        cards = [c for c in deck.cards if _card_key(deck.topic, deck.subtopic, c) not in seen]
+        seen.update(_card_key(deck.topic, deck.subtopic, c) for c in cards)
+        target = by_name.get((_norm(deck.topic), _norm(deck.subtopic or "")))
+        if target is not None:
+            target.cards.extend(cards)
+        elif cards:
+            deck = DeckCards(topic=deck.topic, subtopic=deck.subtopic, cards=cards)
+            by_name[(_norm(deck.topic), _norm(deck.subtopic or ""))] = deck
+            merged.append(deck)
+    return merged
+
+
+async def generate_flashcards_with_recovery(
+    topics: TopicsResponse,
+    prompt_for: Callable[[dict], str],
+    complete: Callable[[str], Awaitable[str]],
+    parse: Callable[[str], dict],
+    continuations: int = DEFAULT_CONTINUATIONS,
+) -> FlashcardsResponse:
+    """
+    One flashcards request for all `topics`; if the output is cut off (max tokens), keep
+    every complete deck and card and ask again only for the topics still missing.
+
+    `prompt_for(topics_json)` builds the flashcards prompt for a topics subset.
+    """
+    text = await complete(prompt_for(topics.model_dump(exclude_none=True)))
+    salvaged = salvage_flashcards(text)
+    if salvaged is None:
+        return validate_completion(FLASHCARDS_ADAPTER, text, parse)
+    decks = salvaged.complete + ([salvaged.partial] if salvaged.partial else [])
+    missing = missing_topics(topics, salvaged.complete)
+    logger.warning(
+        "Flashcards output was truncated: kept %d cards, %d topics still missing",
+        sum(len(d.cards) for d in decks),
+        len(missing.topics),
+    )
+    if not missing.topics or continuations <= 0:
+        return FlashcardsResponse(decks=decks)
+    more = await generate_flashcards_with_recovery(missing, prompt_for, complete, parse, continuations - 1)
+    return FlashcardsResponse(decks=merge_decks(decks, more.decks))
+
+
+def fanout_settings(
+    per_topic: Optional[bool] = None,
+    parallelism: Optional[int] = None,
+) -> tuple[bool, int]:
+    """Resolve per-topic flashcard settings from arguments or `LLM_FLASHCARDS_PER_TOPIC`/`LLM_FLASHCARDS_PARALLELISM`."""
+    if per_topic is None:
+        per_topic = (os.getenv("LLM_FLASHCARDS_PER_TOPIC") or "").strip().lower() in ("1", "true", "yes", "on")
+    if parallelism is None:
+        parallelism = int(os.getenv("LLM_FLASHCARDS_PARALLELISM") or DEFAULT_FANOUT_PARALLELISM)
+    return per_topic, max(1, parallelism)
+
+
+def topic_units(topics: TopicsResponse) -> list[tuple[str, Optional[Subtopic]]]:
+    """One (topic, subtopic) work unit per subtopic, or per topic when it has none, in topic order."""
+    units: list[tuple[str, Optional[Subtopic]]] = []
+    for topic in topics.topics:
+        if topic.subtopics:
+            units.extend((topic.title, sub) for sub in topic.subtopics)
+        else:
+            units.append((topic.title, None))
+    return units
+
+
+async def _with_retries(run: Callable[[], Awaitable[list[DeckCards]]], retries: int) -> list[DeckCards]:
+    for attempt in range(retries + 1):
+        try:
+            return await run()
+        except Exception:
+            if attempt == retries:
+                raise
+            await asyncio.sleep(0.5 * (2**attempt) * (0.5 + random.random()))
+    return []
+
+
+def _merge_unit_results(
+    units: list[tuple[str, Optional[Subtopic]]], results: list, retries: int
+) -> FlashcardsResponse:
+    decks: list[DeckCards] = []
+    failures = 0
+    for (topic, subtopic), result in zip(units, results):
+        if isinstance(result, BaseException):
+            failures += 1
+            logger.warning(
+                "Flashcards for %r failed after %d attempts: %s",
+                f"{topic}::{subtopic.title}" if subtopic else topic,
+                retries + 1,
+                result,
+            )
+            continue
+        decks.extend(result)
+    if units and failures == len(units):
+        raise next(r for r in results if isinstance(r, BaseException))
+    return FlashcardsResponse(decks=decks)
+
+
+def _unit_prompt(topic: str, subtopic: Optional[Subtopic], transcript: Optional[str]) -> str:
+    return _topic_flashcards_prompt(topic, subtopic.model_dump(exclude_none=True) if subtopic else None, transcript)
+
+
+async def generate_flashcards_per_topic(
+    topics: TopicsResponse,
+    complete: Callable[[str], Awaitable[str]],
+    parse: Callable[[str], dict],
+    transcript: Optional[str] = None,
+    parallelism: int = DEFAULT_FANOUT_PARALLELISM,
+    retries: int = DEFAULT_FANOUT_RETRIES,
+) -> FlashcardsResponse:
+    """
+    Fan out one flashcards request per topic/subtopic, at most `parallelism` at a time.
+
+    Decks are merged in topic order regardless of completion order. A failing unit is
+    retried on its own (up to `retries` extra attempts); if it still fails it is left
+    out and logged, unless every unit failed.
+    `transcript` is embedded in each prompt; pass None when the provider has it cached.
+    """
+    units = topic_units(topics)
+    semaphore = asyncio.Semaphore(parallelism)
+
+    async def one(topic: str, subtopic: Optional[Subtopic]) -> list[DeckCards]:
+        prompt = _unit_prompt(topic, subtopic, transcript)
+
+        async def run() -> list[DeckCards]:
+            async with semaphore:
+                text = await complete(prompt)
+            salvaged = salvage_flashcards(text)
+            if salvaged is not None:
+                # Cut off at the token limit: a retry would stop at the same place
+                logger.warning("Flashcards for %r were truncated; keeping the complete cards", topic)
+                decks = salvaged.complete + ([salvaged.partial] if salvaged.partial else [])
+            else:
+                decks = validate_completion(FLASHCARDS_ADAPTER, text, parse).decks
+            # Pin names to the requested unit so decks land where the topics say
+            for deck in decks:
+                deck.topic = topic
+                deck.subtopic = subtopic.title if subtopic else deck.subtopic
+            return decks
+
+        return await _with_retries(run, retries)
+
+    results = await asyncio.gather(*(one(t, s) for t, s in units), return_exceptions=True)
+    return _merge_unit_results(units, results, retries)
+
+
+def streaming_settings(stream: Optional[bool] = None) -> bool:
+    """Resolve streaming mode from the argument or env `LLM_STREAM`."""
+    if stream is None:
+        stream = (os.getenv("LLM_STREAM") or "").strip().lower() in ("1", "true", "yes", "on")
+    return stream
+
+
+def emit_cards(flashcards: FlashcardsResponse, on_card: Optional[CardSink]) -> None:
+    """Hand every card of a finished response to `on_card` (the non-streaming equivalent)."""
+    if on_card is None:
+        return
+    for deck in flashcards.decks:
+        for card in deck.cards:
+            on_card(deck.topic, deck.subtopic, card)
+
+
+class _ItemStream:
+    """
+    Feeds streamed deltas to an `IncrementalJSONParser`, starting over when the provider
+    call is retried. Paths already handled are remembered, so a retried stream only adds
+    values past them.
+    """
+
+    def __init__(self, patterns: list[tuple], on_item: Callable[[StreamItem], None]) -> None:
+        self.patterns = patterns
+        self.on_item = on_item
+        self.seen: set[tuple] = set()
+        self.parser: Optional[IncrementalJSONParser] = None
+        self.attempt = -1
+        self.broken = False
+
+    def __call__(self, delta: str, attempt: int) -> None:
+        if attempt != self.attempt:
+            self.attempt = attempt
+            self.parser = IncrementalJSONParser(self.patterns)
+            self.broken = False
+        if self.broken or self.parser is None:
+            return
+        try:
+            items = self.parser.feed(delta)
+        except ValueError:
+            # Not strict JSON; the caller parses the full text at the end
+            self.broken = True
+            return
+        for item in items:
+            if item.path not in self.seen:
+                self.seen.add(item.path)
+                self.on_item(item)
+
+    @property
+    def complete(self) -> bool:
+        """The document closed and yielded values (one that yielded nothing was likely not the answer)."""
+        return self.parser is not None and self.parser.done and not self.broken and bool(self.seen)
+
+    @property
+    def truncated(self) -> bool:
+        """The stream was valid JSON so far but ended before the document closed."""
+        return self.parser is not None and not self.parser.done and not self.broken
+
+
+async def stream_flashcards(
+    prompt: str,
+    complete_stream: StreamComplete,
+    parse: Callable[[str], dict],
+    on_card: Optional[CardSink] = None,
+    pin: Optional[tuple[str, Optional[str]]] = None,
+    topics: Optional[TopicsResponse] = None,
+    prompt_for: Optional[Callable[[dict], str]] = None,
+    continuations: int = DEFAULT_CONTINUATIONS,
+) -> list[DeckCards]:
+    """
+    Stream one flashcards completion and hand each card to `on_card` as soon as it closes.
+
+    Cards whose deck topic is not known yet (the model wrote `cards` before `topic`) are
+    held until their deck closes. `pin` forces (topic, subtopic) for per-topic requests.
+    If the stream was not strict JSON, the full text is parsed with `parse` and any cards
+    not yet delivered are emitted then.
+    If it was cut off, the cards already streamed are kept and, given `topics` and
+    `prompt_for`, a continuation is streamed for the topics still missing.
+    """
+    decks: dict[int, DeckCards] = {}
+    closed: set[int] = set()
+    held: dict[int, list[Any]] = {}
+
+    def deck_for(index: int, fields: dict) -> DeckCards:
+        deck = decks.get(index)
+        if deck is None:
+            topic, subtopic = fields.get("topic"), fields.get("subtopic")
+            if pin is not None:
+                topic, subtopic = pin[0], pin[1] or subtopic
+            deck = DeckCards(topic=str(topic or "General"), subtopic=subtopic, cards=[])
+            decks[index] = deck
+        return deck
+
+    def add(index: int, fields: dict, raw: Any) -> None:
+        try:
+            card = CARD_ADAPTER.validate_python(raw)
+        except ValidationError as exc:
+            logger.debug("Skipping invalid streamed card: %s", exc)
+            return
+        deck = deck_for(index, fields)
+        deck.cards.append(card)
+        if on_card is not None:
+            on_card(deck.topic, deck.subtopic, card)
+
+    def on_item(item: StreamItem) -> None:
+        index = item.path[1]
+        if len(item.path) == 4:
+            if pin is None and "topic" not in item.context and index not in decks:
+                held.setdefault(index, []).append(item.value)
+            else:
+                add(index, item.context, item.value)
+        else:
+            closed.add(index)
+            fields = item.value if isinstance(item.value, dict) else {}
+            for raw in held.pop(index, []):
+                add(index, fields, raw)
+
+    stream = _ItemStream([("decks", "*", "cards", "*"), ("decks", "*")], on_item)
+    text = await complete_stream(prompt, stream)
+    can_continue = topics is not None and prompt_for is not None and continuations > 0
+
+    # Only a stream that already delivered cards counts as cut off; anything else is parsed below
+    if stream.truncated and decks:
+        streamed = [decks[i] for i in sorted(decks)]
+        missing = missing_topics(topics, [decks[i] for i in sorted(closed) if i in decks]) if can_continue else None
+        logger.warning(
+            "Flashcards stream was truncated: kept %d cards, %d topics still missing",
+            sum(len(d.cards) for d in streamed),
+            len(missing.topics) if missing else 0,
+        )
+        if not missing or not missing.topics:
+            return streamed
+        delivered = {_card_key(d.topic, d.subtopic, c) for d in streamed for c in d.cards}
+
+        def on_new_card(topic: str, subtopic: Optional[str], card: Card) -> None:
+            # The continuation may repeat cards from the deck the stream stopped in
+            key = _card_key(topic, subtopic, card)
+            if key not in delivered:
+                delivered.add(key)
+                if on_card is not None:
+                    on_card(topic, subtopic, card)
+
+        more = await stream_flashcards(
+            prompt_for(missing.model_dump(exclude_none=True)),
+            complete_stream,
+            parse,
+            on_new_card,
+            pin,
+            missing,
+            prompt_for,
+            continuations - 1,
+        )
+        return merge_decks(streamed, more)
+
+    if not stream.complete:
+        try:
+            full = validate_completion(FLASHCARDS_ADAPTER, text, parse)
+        except Exception:
+            if not decks:
+                raise
+            logger.warning("Flashcards stream ended early; keeping %d streamed decks", len(decks))
+        else:
+            for index, deck in enumerate(full.decks):
+                fields = {"topic": deck.topic, "subtopic": deck.subtopic}
+                for position, card in enumerate(deck.cards):
+                    if ("decks", index, "cards", position) not in stream.seen:
+                        add(index, fields, card.model_dump())
+    return [decks[i] for i in sorted(decks)]
+
+
+class _StreamingFanOut:
+    """Starts per-topic streaming flashcard requests as topics become known."""
+
+    def __init__(
+        self,
+        complete_stream: StreamComplete,
+        parse: Callable[[str], dict],
+        on_card: Optional[CardSink],
+        transcript: Optional[str],
+        parallelism: int,
+        retries: int,
+    ) -> None:
+        self.complete_stream = complete_stream
+        self.parse = parse
+        self.on_card = on_card
+        self.transcript = transcript
+        self.retries = retries
+        self.semaphore = asyncio.Semaphore(parallelism)
+        self.units: list[tuple[str, Optional[Subtopic]]] = []
+        self.tasks: list[asyncio.Task] = []
+
+    def start(self, topic: Topic) -> None:
+        for title, subtopic in topic_units(TopicsResponse(topics=[topic])):
+            self.units.append((title, subtopic))
+            self.tasks.append(asyncio.create_task(self._unit(title, subtopic)))
+
+    async def _unit(self, topic: str, subtopic: Optional[Subtopic]) -> list[DeckCards]:
+        prompt = _unit_prompt(topic, subtopic, self.transcript)
+        pin = (topic, subtopic.title if subtopic else None)
+        delivered = 0
+
+        async def run() -> list[DeckCards]:
+            position = 0
+
+            def on_card(deck_topic: str, deck_subtopic: Optional[str], card: Card) -> None:
+                # A retried unit streams its cards again; only pass on the ones past
+                # what an earlier attempt already delivered
+                nonlocal position, delivered
+                position += 1
+                if position > delivered:
+                    delivered = position
+                    if self.on_card is not None:
+                        self.on_card(deck_topic, deck_subtopic, card)
+
+            async with self.semaphore:
+                return await stream_flashcards(prompt, self.complete_stream, self.parse, on_card, pin)
+
+        return await _with_retries(run, self.retries)
+
+    async def finish(self) -> FlashcardsResponse:
+        results = await asyncio.gather(*self.tasks, return_exceptions=True)
+        return _merge_unit_results(self.units, list(results), self.retries)
+
+    def cancel(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+
+
+async def stream_flashcards_per_topic(
+    topics: TopicsResponse,
+    complete_stream: StreamComplete,
+    parse: Callable[[str], dict],
+    on_card: Optional[CardSink] = None,
+    transcript: Optional[str] = None,
+    parallelism: int = DEFAULT_FANOUT_PARALLELISM,
+    retries: int = DEFAULT_FANOUT_RETRIES,
+) -> FlashcardsResponse:
+    """Streaming variant of `generate_flashcards_per_topic` for topics that are already known."""
+    fanout = _StreamingFanOut(complete_stream, parse, on_card, transcript, parallelism, retries)
+    try:
+        for topic in topics.topics:
+            fanout.start(topic)
+        return await fanout.finish()
+    except BaseException:
+        fanout.cancel()
+        raise
+
+
+async def stream_topics_and_flashcards(
+    topics_prompt: str,
+    complete_stream: StreamComplete,
+    parse: Callable[[str], dict],
+    on_card: Optional[CardSink] = None,
+    transcript: Optional[str] = None,
+    parallelism: int = DEFAULT_FANOUT_PARALLELISM,
+    retries: int = DEFAULT_FANOUT_RETRIES,
+) -> tuple[TopicsResponse, FlashcardsResponse]:
+    """
+    Stream the topics completion and start each topic's flashcard requests as soon as
+    that topic closes, instead of waiting for the whole topics list.
+    """
+    topics: list[Topic] = []
+    fanout = _StreamingFanOut(complete_stream, parse, on_card, transcript, parallelism, retries)
+
+    def on_item(item: StreamItem) -> None:
+        try:
+            topic = Topic.model_validate(item.value)
+        except ValidationError as exc:
+            logger.debug("Skipping invalid streamed topic: %s", exc)
+            return
+        topics.append(topic)
+        fanout.start(topic)
+
+    stream = _ItemStream([("topics", "*")], on_item)
+    try:
+        text = await complete_stream(topics_prompt, stream)
+        if not stream.complete:
+            full = validate_completion(TOPICS_ADAPTER, text, parse)
+            for index, topic in enumerate(full.topics):
+                if ("topics", index) not in stream.seen:
+                    topics.append(topic)
+                    fanout.start(topic)
+        flashcards = await fanout.finish()
+    except BaseException:
+        fanout.cancel()
+        raise
+    return TopicsResponse(topics=topics), flashcards
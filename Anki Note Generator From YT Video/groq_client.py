@@ -1,93 +1,291 @@
 import asyncio
-import json
+import logging
 import os
-import re
 from typing import Tuple
 
-from groq import Groq
+import httpx
+from groq import AsyncGroq, DefaultAsyncHttpxClient
 
+from generation import (
+    FANOUT_MAX_TOKENS,
+    CardSink,
+    OnText,
+    chunking_settings,
+    emit_cards,
+    estimate_tokens,
+    extract_topics_chunked,
+    fanout_settings,
+    generate_flashcards_per_topic,
+    generate_flashcards_with_recovery,
+    stream_flashcards,
+    stream_flashcards_per_topic,
+    stream_topics_and_flashcards,
+    streaming_settings,
+)
+from json_extract import extract_json
 from prompts import _topics_prompt, _flashcards_prompt
-from schemas import TopicsResponse, FlashcardsResponse
+from rate_limiter import get_scheduler
+from response_cache import get_response_cache
+from schemas import TOPICS_ADAPTER, TopicsResponse, FlashcardsResponse, validate_completion
+import tracing
 
 
 def _strip_to_json(text: str) -> dict:
-    text = text.strip()
-
-    # If response is fenced as a code block, extract the fenced content
-    fence_match = re.search(r"```(?:json)?\s*([\s\S]*?)```", text, re.IGNORECASE)
-    if fence_match:
-        text = fence_match.group(1).strip()
-
-    # Try direct strict JSON
-    try:
-        return json.loads(text)
-    except Exception:
-        pass
-
-    # Try extracting the largest braced object
-    start = text.find("{")
-    end = text.rfind("}")
-    if start != -1 and end != -1 and end > start:
-        candidate = text[start : end + 1]
-        try:
-            return json.loads(candidate)
-        except Exception:
-            pass
-
-    # Fall back to JSON5 for non-strict JSON (single quotes, trailing commas, etc.)
-    try:
-        import json5  # type: ignore
-
-        parsed = json5.loads(text)
-        # Re-serialize to strict JSON and load again to ensure standard structure
-        return json.loads(json.dumps(parsed))
-    except Exception as exc:
-        # Re-try with candidate slice in JSON5
-        if start != -1 and end != -1 and end > start:
-            try:
-                import json5  # type: ignore
-
-                parsed = json5.loads(candidate)
-                return json.loads(json.dumps(parsed))
-            except Exception:
-                pass
-        # Bubble up with context for troubleshooting
-        raise json.JSONDecodeError("Failed to parse model JSON output", text, 0) from exc
-
-
-def _get_groq_client() -> Groq:
-    api_key = os.getenv("GROQ_API_KEY") or os.getenv("GROQ_API_TOKEN")
-    if not api_key:
-        raise RuntimeError("GROQ_API_KEY is not set")
-    return Groq(api_key=api_key)
-
-
-async def generate_topics_and_flashcards(transcript: str, model: str | None = None) -> Tuple[TopicsResponse, FlashcardsResponse]:
+    """Parse the JSON document in a completion; raises json.JSONDecodeError when there is none."""
+    return extract_json(text.strip()).value
+
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_MODEL = "openai/gpt-oss-120b"
+
+# One pooled async client per process (per event loop), shared across videos
+_CLIENT: AsyncGroq | None = None
+_CLIENT_LOOP: asyncio.AbstractEventLoop | None = None
+
+
+def _http_limits() -> httpx.Limits:
+    max_connections = int(os.getenv("LLM_MAX_CONNECTIONS") or 32)
+    return httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections,
+        keepalive_expiry=60,
+    )
+
+
+def _get_groq_client() -> AsyncGroq:
+    """Return the shared client, creating it on first use in the running event loop."""
+    global _CLIENT, _CLIENT_LOOP
+    loop = asyncio.get_running_loop()
+    if _CLIENT is None or _CLIENT_LOOP is not loop:
+        api_key = os.getenv("GROQ_API_KEY") or os.getenv("GROQ_API_TOKEN")
+        if not api_key:
+            raise RuntimeError("GROQ_API_KEY is not set")
+        # Connections are bound to the loop they were opened on; a client left over from
+        # an earlier asyncio.run() is simply dropped.
+        # SDK retries are disabled: the rate-limit scheduler owns retry policy
+        _CLIENT = AsyncGroq(
+            api_key=api_key,
+            max_retries=0,
+            http_client=DefaultAsyncHttpxClient(limits=_http_limits()),
+        )
+        _CLIENT_LOOP = loop
+    return _CLIENT
+
+
+async def open_client() -> AsyncGroq:
+    """Create (or reuse) the shared client ahead of the first request."""
+    return _get_groq_client()
+
+
+async def close_client() -> None:
+    """Close the shared client and its connection pool."""
+    global _CLIENT, _CLIENT_LOOP
+    client, _CLIENT, _CLIENT_LOOP = _CLIENT, None, None
+    if client is not None:
+        close = getattr(client, "close", None)
+        if close is not None:
+            await close()
+
+
+def _usage_tokens(resp) -> int | None:
+    return getattr(getattr(resp, "usage", None), "total_tokens", None)
+
+
+async def _chat_completion(prompt: str, max_tokens: int, model: str | None = None) -> str:
     client = _get_groq_client()
+    model_name = model or os.getenv("GROQ_MODEL", _DEFAULT_MODEL)
 
-    def _chat_completion(prompt: str, max_tokens: int) -> str:
-        resp = client.chat.completions.create(
-            model=(model or os.getenv("GROQ_MODEL", "openai/gpt-oss-120b")),
+    async def request():
+        return await client.chat.completions.create(
+            model=model_name,
             messages=[{"role": "user", "content": prompt}],
             temperature=0,
             max_tokens=max_tokens,
         )
-        return resp.choices[0].message.content or ""
 
-    loop = asyncio.get_event_loop()
-    topics_text = await loop.run_in_executor(
-        None, lambda: _chat_completion(_topics_prompt(transcript), 65_535)
-    )
-    topics_json = _strip_to_json(topics_text)
-    topics = TopicsResponse.model_validate(topics_json)
+    async def uncached() -> str:
+        sp.set(cached=False)
+        # Rate limiting and retries (429/5xx) are handled by the shared scheduler
+        resp = await get_scheduler().call(
+            "groq", model_name, request, estimated_tokens=estimate_tokens(prompt), actual_tokens=_usage_tokens
+        )
+        choice = resp.choices[0]
+        if getattr(choice, "finish_reason", None) == "length":
+            logger.warning("Completion hit max_tokens=%d and was truncated", max_tokens)
+        return choice.message.content or ""
 
-    flash_text = await loop.run_in_executor(
-        None,
-        lambda: _chat_completion(_flashcards_prompt(topics_json, transcript), 65_535),
-    )
-    flash_json = _strip_to_json(flash_text)
-    flashcards = FlashcardsResponse.model_validate(flash_json)
+    with tracing.span("llm", provider="groq", model=model_name, cached=True) as sp:
+        sp.add_bytes_in(prompt)
+        # temperature=0: identical inputs give the same completion, so serve repeats from disk
+        text = await get_response_cache().get_or_call("groq", model_name, prompt, uncached, max_tokens=max_tokens)
+        sp.add_bytes_out(text)
+        return text
+
+
+async def _chat_completion_stream(prompt: str, max_tokens: int, on_text: OnText, model: str | None = None) -> str:
+    """Like `_chat_completion`, but passes each delta to `on_text(delta, attempt)` as it arrives."""
+    client = _get_groq_client()
+    model_name = model or os.getenv("GROQ_MODEL", _DEFAULT_MODEL)
+    attempts = 0
+
+    async def request() -> str:
+        nonlocal attempts
+        attempt, attempts = attempts, attempts + 1
+        stream = await client.chat.completions.create(
+            model=model_name,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0,
+            max_tokens=max_tokens,
+            stream=True,
+        )
+        parts = []
+        async for chunk in stream:
+            if chunk.choices and getattr(chunk.choices[0], "finish_reason", None) == "length":
+                logger.warning("Completion hit max_tokens=%d and was truncated", max_tokens)
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+                on_text(delta, attempt)
+        return "".join(parts)
+
+    async def uncached() -> str:
+        sp.set(cached=False)
+        return await get_scheduler().call("groq", model_name, request, estimated_tokens=estimate_tokens(prompt))
 
+    with tracing.span("llm", provider="groq", model=model_name, cached=True, stream=True) as sp:
+        sp.add_bytes_in(prompt)
+        # Shares entries with `_chat_completion`; a hit is delivered as a single delta
+        text = await get_response_cache().get_or_call("groq", model_name, prompt, uncached, max_tokens=max_tokens)
+        sp.add_bytes_out(text)
+    if not attempts:
+        on_text(text, 0)
+    return text
+
+
+async def generate_topics_and_flashcards(
+    transcript: str,
+    model: str | None = None,
+    chunk_tokens: int | None = None,
+    chunk_parallelism: int | None = None,
+    per_topic: bool | None = None,
+    flashcard_parallelism: int | None = None,
+    stream: bool | None = None,
+    on_card: CardSink | None = None,
+) -> Tuple[TopicsResponse, FlashcardsResponse]:
+    """
+    Generate topics, then flashcards, for a transcript.
+
+    When `chunk_tokens` (or env `LLM_TOPICS_CHUNK_TOKENS`) is set and the transcript is
+    larger, topics are extracted per overlapping window and merged (see `generation`).
+    With `per_topic` (or env `LLM_FLASHCARDS_PER_TOPIC`), flashcards are requested
+    concurrently per topic/subtopic instead of in one large call.
+    With `stream` (or env `LLM_STREAM`), completions are streamed: `on_card(topic,
+    subtopic, card)` receives each card as soon as it is complete, and per-topic requests
+    start as soon as their topic closes. Without streaming, `on_card` gets every card at
+    the end.
+    """
+    chunk_tokens, chunk_parallelism = chunking_settings(chunk_tokens, chunk_parallelism)
+    per_topic, flashcard_parallelism = fanout_settings(per_topic, flashcard_parallelism)
+    chunked = bool(chunk_tokens and estimate_tokens(transcript) > chunk_tokens)
+
+    if streaming_settings(stream):
+        return await _generate_streaming(
+            transcript, model, chunked, chunk_tokens, chunk_parallelism, per_topic, flashcard_parallelism, on_card
+        )
+
+    if chunked:
+
+        async def complete(prompt: str) -> str:
+            return await _chat_completion(prompt, 65_535, model)
+
+        topics = await extract_topics_chunked(
+            transcript, complete, _strip_to_json, chunk_tokens, parallelism=chunk_parallelism
+        )
+    else:
+        topics_text = await _chat_completion(_topics_prompt(transcript), 65_535, model)
+        topics = validate_completion(TOPICS_ADAPTER, topics_text, _strip_to_json)
+
+    if per_topic:
+
+        async def complete_topic(prompt: str) -> str:
+            return await _chat_completion(prompt, FANOUT_MAX_TOKENS, model)
+
+        flashcards = await generate_flashcards_per_topic(
+            topics, complete_topic, _strip_to_json, transcript=transcript, parallelism=flashcard_parallelism
+        )
+    else:
+
+        async def complete_deck(prompt: str) -> str:
+            return await _chat_completion(prompt, 65_535, model)
+
+        # Output cut off at max_tokens is kept; only the missing topics are requested again
+        flashcards = await generate_flashcards_with_recovery(
+            topics, lambda topics_json: _flashcards_prompt(topics_json, transcript), complete_deck, _strip_to_json
+        )
+
+    emit_cards(flashcards, on_card)
     return topics, flashcards
 
 
+async def _generate_streaming(
+    transcript: str,
+    model: str | None,
+    chunked: bool,
+    chunk_tokens: int | None,
+    chunk_parallelism: int,
+    per_topic: bool,
+    flashcard_parallelism: int,
+    on_card: CardSink | None,
+) -> Tuple[TopicsResponse, FlashcardsResponse]:
+    def stream_with(max_tokens: int):
+        async def complete_stream(prompt: str, on_text: OnText) -> str:
+            return await _chat_completion_stream(prompt, max_tokens, on_text, model)
+
+        return complete_stream
+
+    if per_topic and not chunked:
+        return await stream_topics_and_flashcards(
+            _topics_prompt(transcript),
+            stream_with(65_535),
+            _strip_to_json,
+            on_card,
+            transcript=transcript,
+            parallelism=flashcard_parallelism,
+        )
+
+    if chunked:
+
+        async def complete(prompt: str) -> str:
+            return await _chat_completion(prompt, 65_535, model)
+
+        topics = await extract_topics_chunked(
+            transcript, complete, _strip_to_json, chunk_tokens, parallelism=chunk_parallelism
+        )
+    else:
+        topics_text = await _chat_completion(_topics_prompt(transcript), 65_535, model)
+        topics = validate_completion(TOPICS_ADAPTER, topics_text, _strip_to_json)
+
+    if per_topic:
+        flashcards = await stream_flashcards_per_topic(
+            topics,
+            stream_with(FANOUT_MAX_TOKENS),
+            _strip_to_json,
+            on_card,
+            transcript=transcript,
+            parallelism=flashcard_parallelism,
+        )
+    else:
+        def prompt_for(topics_json: dict) -> str:
+            return _flashcards_prompt(topics_json, transcript)
+
+        decks = await stream_flashcards(
+            prompt_for(topics.model_dump(exclude_none=True)),
+            stream_with(65_535),
+            _strip_to_json,
+            on_card,
+            topics=topics,
+            prompt_for=prompt_for,
+        )
+        flashcards = FlashcardsResponse(decks=decks)
+    return topics, flashcards
@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import math
+import os
+import threading
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional, Sequence, TypeVar
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEDGE_AFTER_SECONDS = 120.0
+DEFAULT_MIN_SAMPLES = 5
+
+# One attempt: called with the card sink it may use (None when the caller gave none)
+Attempt = Callable[[Optional[Callable[..., None]]], Awaitable[T]]
+
+
+class LatencyTracker:
+    """Recent latencies per key (e.g. "groq:openai/gpt-oss-120b"), for percentile thresholds."""
+
+    def __init__(self, window: int = 50, min_samples: int = DEFAULT_MIN_SAMPLES) -> None:
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, key: str, q: float = 0.95) -> Optional[float]:
+        """The `q` quantile of `key`'s latencies, or None with fewer than `min_samples`."""
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, math.ceil(q * len(samples)) - 1)]
+
+
+_TRACKER = LatencyTracker()
+
+
+def get_latency_tracker() -> LatencyTracker:
+    return _TRACKER
+
+
+class _SinkGate:
+    """
+    Lets cards from only one attempt reach the caller's sink.
+
+    The first attempt to emit a card owns the sink from then on; `on_claim(index)` is
+    called once so the other attempt can be cancelled.
+    """
+
+    def __init__(self, sink: Callable[..., None], on_claim: Callable[[int], None]) -> None:
+        self.sink = sink
+        self.on_claim = on_claim
+        self.owner: Optional[int] = None
+
+    def for_attempt(self, index: int) -> Callable[..., None]:
+        def on_card(*args: Any) -> None:
+            if self.owner is None:
+                self.owner = index
+                self.on_claim(index)
+            if self.owner == index:
+                self.sink(*args)
+
+        return on_card
+
+
+async def run_hedged(
+    attempts: Sequence[Attempt],
+    on_card: Optional[Callable[..., None]] = None,
+    hedge_after: Optional[float] = None,
+    timeout: Optional[float] = None,
+) -> tuple[Any, int]:
+    """
+    Run `attempts[0]`, with `attempts[1]` (if any) as hedge and failover; returns
+    (result, index of the attempt that produced it).
+
+    - With `hedge_after` seconds, the second attempt starts when the first has not
+      finished by then; whichever succeeds first wins and the other is cancelled.
+    - When an attempt fails, or exceeds `timeout`, the second one is started at once.
+    - With `on_card`, cards stream from whichever attempt emits first; the other
+      attempt is cancelled then, and a failure after that point is not failed over,
+      since its cards have already been delivered.
+    """
+    loop = asyncio.get_running_loop()
+    tasks: dict[int, asyncio.Task] = {}
+    errors: list[BaseException] = []
+
+    def claim(index: int) -> None:
+        for other, task in tasks.items():
+            if other != index:
+                task.cancel()
+
+    # A lone attempt gets the sink itself
+    gate = _SinkGate(on_card, claim) if on_card is not None and len(attempts) > 1 else None
+
+    def start(index: int) -> None:
+        coro = attempts[index](gate.for_attempt(index) if gate is not None else on_card)
+        if timeout is not None:
+            coro = asyncio.wait_for(coro, timeout)
+        tasks[index] = asyncio.create_task(coro)
+
+    def can_start_backup() -> bool:
+        return len(attempts) > 1 and 1 not in tasks and (gate is None or gate.owner is None)
+
+    start(0)
+    hedge_at = loop.time() + hedge_after if hedge_after is not None else None
+    try:
+        while True:
+            pending = [task for task in tasks.values() if not task.done()]
+            wait = None
+            if hedge_at is not None and can_start_backup():
+                wait = max(0.0, hedge_at - loop.time())
+            if pending:
+                done, _ = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+            else:
+                done = set()
+            if not done and can_start_backup():
+                logger.info("No answer after %.1fs; sending a hedged request", hedge_after)
+                start(1)
+                continue
+            for index, task in tasks.items():
+                if task in done and not task.cancelled():
+                    exc = task.exception()
+                    if exc is None:
+                        return task.result(), index
+                    errors.append(exc)
+                    logger.warning("Attempt %d failed: %s: %s", index, type(exc).__name__, exc)
+            if gate is not None and gate.owner is not None and tasks[gate.owner].done():
+                # The attempt that delivered cards failed; another one cannot replace them
+                raise errors[-1]
+            if can_start_backup():
+                logger.info("Failing over to the backup")
+                start(1)
+                continue
+            if all(task.done() for task in tasks.values()):
+                raise errors[-1]
+    finally:
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+
+def hedge_settings() -> dict:
+    """
+    Options from env: `LLM_HEDGE` ("failover" by default, "hedge" or "off"),
+    `LLM_HEDGE_AFTER` (seconds; default the observed p95, or 120s until there are enough
+    samples), `LLM_HEDGE_TIMEOUT` (seconds per attempt) and `LLM_HEDGE_MODEL`
+    ("provider:model" of the backup; default the other provider's model).
+    """
+    mode = (os.getenv("LLM_HEDGE") or "failover").strip().lower()
+    if mode in ("0", "false", "no", "off"):
+        mode = "off"
+    elif mode != "hedge":
+        mode = "failover"
+    after = os.getenv("LLM_HEDGE_AFTER")
+    timeout = os.getenv("LLM_HEDGE_TIMEOUT")
+    return {
+        "mode": mode,
+        "after": float(after) if after else None,
+        "timeout": float(timeout) if timeout else None,
+        "backup": (os.getenv("LLM_HEDGE_MODEL") or "").strip() or None,
+    }
+
+
+def hedge_delay(key: str, after: Optional[float] = None) -> float:
+    """Seconds to wait before hedging requests for `key`: `after`, else its p95, else the default."""
+    if after is not None:
+        return after
+    p95 = _TRACKER.percentile(key)
+    return p95 if p95 is not None else DEFAULT_HEDGE_AFTER_SECONDS
@@ -0,0 +1,220 @@
+import json
+from typing import Any, NamedTuple, Optional, Sequence
+
+# A path pattern element is an object key, or "*" for any array index
+Pattern = Sequence[str]
+
+
+class StreamItem(NamedTuple):
+    """A value that finished parsing, with its path and the scalar fields of its parent objects."""
+
+    path: tuple
+    value: Any
+    context: dict
+
+
+class _Frame:
+    __slots__ = ("kind", "path", "start", "key", "index", "expect_key", "fields", "selected")
+
+    def __init__(self, kind: str, path: tuple, start: int) -> None:
+        self.kind = kind  # "{" or "["
+        self.path = path
+        self.start = start
+        self.key: Optional[str] = None
+        self.index = -1
+        self.expect_key = kind == "{"
+        self.fields: dict[str, Any] = {}
+        self.selected = False
+
+
+_PRIMITIVE_END = frozenset(",}] \t\r\n")
+
+
+def _matches(path: tuple, pattern: Pattern) -> bool:
+    if len(path) != len(pattern):
+        return False
+    for part, want in zip(path, pattern):
+        if want == "*":
+            if not isinstance(part, int):
+                return False
+        elif part != want:
+            return False
+    return True
+
+
+class IncrementalJSONParser:
+    """
+    Push parser that yields selected values of one JSON document as soon as they close.
+
+    `patterns` select values by path, e.g. `("decks", "*")` for each deck or
+    `("decks", "*", "cards", "*")` for each card. Text before the document (prose, code
+    fences) and after it ends is ignored; when every pattern starts with a key, only a
+    `{` can start the document, so bracketed prose like "[JSON]" is skipped. Each emitted item carries the
+    scalar fields already seen on its enclosing objects, so a card knows its deck's
+    topic when the topic key came first.
+
+    Only strict JSON is understood (malformed input raises ValueError); callers fall back
+    to a full parse of the final text when nothing was emitted.
+    """
+
+    def __init__(self, patterns: Sequence[Pattern]) -> None:
+        self.patterns = [tuple(p) for p in patterns]
+        self.done = False
+        self._buf = ""
+        self._pos = 0
+        self._stack: list[_Frame] = []
+        self._started = False
+        self._string_start = -1
+        self._string_is_key = False
+        self._primitive_start = -1
+        self._roots = "{" if all(p and p[0] != "*" for p in self.patterns) else "{["
+
+    def feed(self, text: str) -> list[StreamItem]:
+        if self.done or not text:
+            return []
+        self._buf += text
+        items: list[StreamItem] = []
+        buf = self._buf
+        n = len(buf)
+        i = self._pos
+
+        if not self._started:
+            starts = [p for p in (buf.find(ch, i) for ch in self._roots) if p != -1]
+            if not starts:
+                self._pos = n
+                return items
+            i = min(starts)
+            self._started = True
+
+        while i < n and not self.done:
+            if self._string_start != -1:
+                # Jump to the next quote, skipping escaped ones
+                j = buf.find('"', i)
+                while j != -1:
+                    backslashes = 0
+                    k = j - 1
+                    while k > self._string_start and buf[k] == "\\":
+                        backslashes += 1
+                        k -= 1
+                    if backslashes % 2 == 0:
+                        break
+                    j = buf.find('"', j + 1)
+                if j == -1:
+                    i = n
+                    break
+                start, self._string_start = self._string_start, -1
+                raw = buf[start : j + 1]
+                if self._string_is_key:
+                    self._stack[-1].key = json.loads(raw)
+                else:
+                    self._value_done(start, j + 1, items, scalar=raw)
+                i = j + 1
+                continue
+
+            if self._primitive_start != -1:
+                ch = buf[i]
+                if ch not in _PRIMITIVE_END:
+                    i += 1
+                    continue
+                start, self._primitive_start = self._primitive_start, -1
+                self._value_done(start, i, items, scalar=buf[start:i])
+                continue
+
+            ch = buf[i]
+            if ch in " \t\r\n:,":
+                if ch == "," and self._stack and self._stack[-1].kind == "{":
+                    self._stack[-1].expect_key = True
+                i += 1
+                continue
+            if ch == "}" or ch == "]":
+                if not self._stack or self._stack[-1].kind != ("{" if ch == "}" else "["):
+                    raise ValueError(f"Unexpected {ch!r} at offset {i}")
+                frame = self._stack.pop()
+                self._value_done(frame.start, i + 1, items, path=frame.path, selected=frame.selected)
+                i += 1
+                continue
+
+            if self._stack and self._stack[-1].kind == "{" and self._stack[-1].expect_key and ch != '"':
+                raise ValueError(f"Expected an object key at offset {i}, got {ch!r}")
+            if ch == '"':
+                frame = self._stack[-1] if self._stack else None
+                self._string_is_key = frame is not None and frame.kind == "{" and frame.expect_key
+                if self._string_is_key:
+                    frame.expect_key = False
+                self._string_start = i
+                i += 1
+                continue
+            if ch == "{" or ch == "[":
+                path = self._child_path()
+                frame = _Frame(ch, path, i)
+                frame.selected = any(_matches(path, p) for p in self.patterns)
+                self._stack.append(frame)
+                i += 1
+                continue
+            self._primitive_start = i
+            i += 1
+
+        self._pos = i
+        self._trim()
+        return items
+
+    def _trim(self) -> None:
+        # Keep only text that an open selected value (or the current token) still needs
+        keep = self._pos
+        for frame in self._stack:
+            if frame.selected:
+                keep = min(keep, frame.start)
+                break
+        for start in (self._string_start, self._primitive_start):
+            if start != -1:
+                keep = min(keep, start)
+        if keep <= 0:
+            return
+        self._buf = self._buf[keep:]
+        self._pos -= keep
+        for frame in self._stack:
+            frame.start -= keep
+        if self._string_start != -1:
+            self._string_start -= keep
+        if self._primitive_start != -1:
+            self._primitive_start -= keep
+
+    def _child_path(self) -> tuple:
+        if not self._stack:
+            return ()
+        frame = self._stack[-1]
+        if frame.kind == "[":
+            frame.index += 1
+            return frame.path + (frame.index,)
+        return frame.path + (frame.key,)
+
+    def _value_done(
+        self,
+        start: int,
+        end: int,
+        items: list[StreamItem],
+        path: Optional[tuple] = None,
+        scalar: Optional[str] = None,
+        selected: Optional[bool] = None,
+    ) -> None:
+        if path is None:
+            # Strings and primitives get their path when they close
+            path = self._child_path()
+        parent = self._stack[-1] if self._stack else None
+        value: Any = None
+        parsed = False
+        if scalar is not None and parent is not None and parent.kind == "{":
+            value, parsed = json.loads(scalar), True
+            parent.fields[parent.key] = value
+        if selected is None:
+            selected = any(_matches(path, p) for p in self.patterns)
+        if selected:
+            if not parsed:
+                value = json.loads(self._buf[start:end])
+            context: dict = {}
+            for frame in self._stack:
+                if frame.kind == "{":
+                    context.update(frame.fields)
+            items.append(StreamItem(path, value, context))
+        if not self._stack:
+            self.done = True
@@ -0,0 +1,179 @@
+import json
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import IO, Iterable, Iterator, NamedTuple
+
+_DECODER = json.JSONDecoder()
+_WS = " \t\r\n"
+
+
+class Segment(NamedTuple):
+    start_ms: int
+    duration_ms: int
+    text: str
+
+
+class _Reader:
+    """Sliding text buffer over a file that decodes one JSON value at a time."""
+
+    def __init__(self, f: IO[str], chunk_size: int) -> None:
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # Drop consumed text so the buffer stays around one chunk in size
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character ("" at end of input), without consuming it."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WS:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise ValueError(f"Malformed json3: expected {char!r} at offset {self.pos}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = _DECODER.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # Most likely the value continues in the next chunk
+                if self._fill():
+                    continue
+                raise
+            # A number at the very end of the buffer may be cut short
+            if end == len(self.buf) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return obj
+
+
+def iter_json3_segments(file_path: str, chunk_size: int = 1 << 16) -> Iterator[Segment]:
+    """
+    Yield timed segments from a YouTube json3 subtitle file without loading it whole.
+
+    Only the current event and one read chunk are held in memory at a time. Events
+    without text are skipped; an event's segments are joined into one `Segment`.
+    """
+    with open(file_path, "r", encoding="utf-8") as f:
+        reader = _Reader(f, chunk_size)
+        reader.expect("{")
+        if reader.peek() == "}":
+            return
+        while True:
+            key = reader.value()
+            reader.expect(":")
+            if key == "events" and reader.peek() == "[":
+                reader.expect("[")
+                if reader.peek() == "]":
+                    reader.pos += 1
+                else:
+                    while True:
+                        event = reader.value()
+                        if isinstance(event, dict):
+                            text = "".join(
+                                seg.get("utf8") or "" for seg in event.get("segs") or [] if isinstance(seg, dict)
+                            )
+                            if text:
+                                yield Segment(
+                                    int(event.get("tStartMs") or 0),
+                                    int(event.get("dDurationMs") or 0),
+                                    text,
+                                )
+                        sep = reader.peek()
+                        reader.pos += 1
+                        if sep == "]":
+                            break
+                        if sep != ",":
+                            raise ValueError("Malformed json3: bad separator in events array")
+            else:
+                reader.value()
+            sep = reader.peek()
+            reader.pos += 1
+            if sep == "}":
+                return
+            if sep != ",":
+                raise ValueError("Malformed json3: bad separator in top-level object")
+
+
+class Transcript:
+    """
+    Compact timed transcript: one text buffer plus parallel index arrays.
+
+    `offsets[i]` is the character offset where segment i starts in `text`, with
+    `starts_ms[i]`/`durations_ms[i]` its timing. Ranges are resolved with binary search
+    on the arrays, so only the requested slice of text is ever materialised.
+    """
+
+    __slots__ = ("text", "offsets", "starts_ms", "durations_ms")
+
+    def __init__(self, text: str, offsets: array, starts_ms: array, durations_ms: array) -> None:
+        self.text = text
+        self.offsets = offsets
+        self.starts_ms = starts_ms
+        self.durations_ms = durations_ms
+
+    @classmethod
+    def from_segments(cls, segments: Iterable[Segment]) -> "Transcript":
+        parts: list[str] = []
+        offsets, starts, durations = array("q"), array("q"), array("q")
+        pos = 0
+        for seg in segments:
+            offsets.append(pos)
+            starts.append(seg.start_ms)
+            durations.append(seg.duration_ms)
+            parts.append(seg.text)
+            pos += len(seg.text)
+        return cls("".join(parts), offsets, starts, durations)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __str__(self) -> str:
+        return self.text
+
+    def segment(self, index: int) -> Segment:
+        end = self.offsets[index + 1] if index + 1 < len(self.offsets) else len(self.text)
+        return Segment(self.starts_ms[index], self.durations_ms[index], self.text[self.offsets[index]:end])
+
+    def char_range(self, start_ms: int, end_ms: int) -> tuple[int, int]:
+        """Character range covering every segment that starts within [start_ms, end_ms)."""
+        first = bisect_left(self.starts_ms, start_ms)
+        last = bisect_left(self.starts_ms, end_ms)
+        if first >= len(self.offsets):
+            return len(self.text), len(self.text)
+        end = self.offsets[last] if last < len(self.offsets) else len(self.text)
+        return self.offsets[first], end
+
+    def time_at(self, char_offset: int) -> int:
+        """Start time (ms) of the segment containing `char_offset`."""
+        index = bisect_right(self.offsets, char_offset) - 1
+        return self.starts_ms[max(index, 0)] if len(self.offsets) else 0
+
+    def slice_time(self, start_ms: int, end_ms: int) -> str:
+        start, end = self.char_range(start_ms, end_ms)
+        return self.text[start:end]
+
+    def slice_chars(self, start: int, end: int) -> str:
+        return self.text[start:end]
+
+
+def load_json3_transcript(file_path: str) -> Transcript:
+    return Transcript.from_segments(iter_json3_segments(file_path))
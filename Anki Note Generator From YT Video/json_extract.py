@@ -0,0 +1,132 @@
+import json
+import logging
+import re
+from typing import Any, NamedTuple, Optional
+
+try:  # optional speed-up, not a dependency
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+_FENCE_RE = re.compile(r"```(?:json5?)?[ \t]*\n?", re.IGNORECASE)
+_DECODER = json.JSONDecoder()
+
+# One regex pass for common LLM breakage. Strings are matched first so nothing inside
+# them is touched (except raw control characters, which strict JSON forbids).
+_REPAIR_RE = re.compile(
+    r'"[^"\\]*(?:\\.[^"\\]*)*"'  # string literal
+    r"|//[^\n]*"  # line comment
+    r"|/\*.*?\*/"  # block comment
+    r"|,(\s*[}\]])"  # trailing comma
+    r"|\b(True|False|None)\b",  # Python literals
+    re.DOTALL,
+)
+_PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_CONTROL_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+_CONTROL_RE = re.compile(r"[\n\r\t]")
+
+
+class ExtractResult(NamedTuple):
+    """Parsed value and the strategy that produced it: orjson, raw_decode, repaired or json5."""
+
+    value: Any
+    strategy: str
+
+
+def _start_positions(text: str) -> list[int]:
+    """Where a JSON document may start: inside a code fence first, then the first brace/bracket."""
+    starts: list[int] = []
+    fence = _FENCE_RE.search(text)
+    if fence:
+        m = re.search(r"[{\[]", text[fence.end() :])
+        if m:
+            starts.append(fence.end() + m.start())
+    for ch in "{[":
+        pos = text.find(ch)
+        if pos != -1 and pos not in starts:
+            starts.append(pos)
+    return starts
+
+
+def _decode_at(text: str, start: int) -> Optional[ExtractResult]:
+    closer = "}" if text[start] == "{" else "]"
+    end = text.rfind(closer)
+    if orjson is not None and end > start:
+        # Common case: the document runs to the last closer (maybe followed by a fence)
+        try:
+            return ExtractResult(orjson.loads(text[start : end + 1]), "orjson")
+        except orjson.JSONDecodeError:
+            pass
+    try:
+        value, _ = _DECODER.raw_decode(text, start)
+        return ExtractResult(value, "raw_decode")
+    except json.JSONDecodeError:
+        return None
+
+
+def _repair_token(m: re.Match) -> str:
+    token = m.group(0)
+    if token[0] == '"':
+        return _CONTROL_RE.sub(lambda c: _CONTROL_ESCAPES[c.group(0)], token)
+    if token[0] == "/":
+        return ""
+    if m.group(1) is not None:
+        return m.group(1)
+    return _PY_LITERALS[token]
+
+
+def repair_json(text: str) -> str:
+    """Fix comments, trailing commas, Python literals and raw newlines in strings in one pass."""
+    return _REPAIR_RE.sub(_repair_token, text)
+
+
+def extract_json(text: str) -> ExtractResult:
+    """
+    Extract the first JSON document from LLM output in as few passes as possible.
+
+    1. Decode in place at the fenced block or first brace (orjson when installed, else
+       `raw_decode`), ignoring surrounding prose and fences.
+    2. One regex repair pass for common breakage, then decode again.
+    3. json5 on the candidate region, as the slow last resort.
+
+    Raises json.JSONDecodeError when nothing parses.
+    """
+    result = _extract(text)
+    logger.debug("Parsed %d chars of model output via %s", len(text), result.strategy)
+    return result
+
+
+def _extract(text: str) -> ExtractResult:
+    starts = _start_positions(text)
+    for start in starts:
+        result = _decode_at(text, start)
+        if result is not None:
+            return result
+
+    if starts:
+        repaired = repair_json(text[starts[0] :])
+        result = _decode_at(repaired, 0)
+        if result is not None:
+            return ExtractResult(result.value, "repaired")
+
+    try:
+        import json5  # type: ignore
+    except ImportError:
+        json5 = None
+    if json5 is not None:
+        candidates = []
+        if starts:
+            start = starts[0]
+            end = text.rfind("}" if text[start] == "{" else "]")
+            if end > start:
+                candidates.append(text[start : end + 1])
+        candidates.append(text.strip())
+        for candidate in candidates:
+            try:
+                return ExtractResult(json5.loads(candidate), "json5")
+            except Exception:
+                continue
+    raise json.JSONDecodeError("Failed to parse model JSON output", text, 0)
+
@@ -1,32 +1,101 @@
 import asyncio
 import os
 from typing import Optional
-from questionary import select
 
-from transcript_extractor import extract_transcript
-from model_selection import list_models, get_generator
-from anki_creator import create_anki_deck
-from yt_title import fetch_video_title
+# Everything else is imported where it is used, so each path (interactive prompt,
+# single video, batch) only pays for the modules it needs; see tests/test_startup.py.
 
 
 async def run(video_url: str, output_path: str, deck_name: Optional[str] = None) -> str:
-    transcript = extract_transcript(video_url, language_preference=["en", "en-US", "en-GB"])
+    import tracing
+
+    with tracing.span("run", url=video_url):
+        return await _run(video_url, output_path, deck_name)
+
+
+async def _run(video_url: str, output_path: str, deck_name: Optional[str] = None) -> str:
+    from anki_creator import DeckBuilder, create_anki_deck
+    from batch import DEFAULT_LANGUAGES, video_source_id
+    from compaction import compact_transcript, compaction_settings
+    from dedupe import CardDeduper, dedupe_settings, get_dedupe_index, save_dedupe_index, summarize
+    from generation import streaming_settings
+    from model_selection import close_clients, get_generator
+    from tracing import span
+    from transcript_extractor import extract_transcript_async
+    from yt_title import fetch_video_title
+
+    async def fetch_transcript() -> str:
+        with span("transcript") as sp:
+            text = await extract_transcript_async(video_url, language_preference=DEFAULT_LANGUAGES)
+            sp.add_bytes_out(text)
+            return text
+
+    async def fetch_deck_name() -> str:
+        with span("title"):
+            return deck_name or await asyncio.to_thread(fetch_video_title, video_url) or "Generated Deck"
+
+    # The title only depends on the URL, so it is fetched alongside the transcript
+    transcript, deck_name = await asyncio.gather(fetch_transcript(), fetch_deck_name())
+    compaction = compaction_settings()
+    if compaction != "off":
+        compacted = compact_transcript(transcript, strip_fillers=compaction == "fillers")
+        transcript = compacted.text
+        print(compacted.report())
     provider = (os.environ.get("LLM_PROVIDER") or "groq").strip().lower()
     model = os.environ.get("LLM_MODEL")
     generator = get_generator(provider)
-    topics, flashcards = await generator(transcript, model)
-    deck_name = deck_name or fetch_video_title(video_url) or "Generated Deck"
-    apkg_path = create_anki_deck(flashcards, deck_name=deck_name, output_path=output_path)
-    return apkg_path
+    source_id = video_source_id(video_url)
+    dedupe_mode = dedupe_settings()
+    deduper = CardDeduper(get_dedupe_index(), source_id or video_url, dedupe_mode) if dedupe_mode != "off" else None
+    try:
+        if streaming_settings():
+            builder = DeckBuilder(deck_name, source_id=source_id)
+            on_card = deduper.filter(builder.add_card) if deduper is not None else builder.add_card
+            try:
+                with span("generate", provider=provider) as sp:
+                    sp.add_bytes_in(transcript)
+                    await generator(transcript, model, on_card=on_card)
+            finally:
+                await close_clients()
+            with span("package"):
+                return builder.write(output_path)
+        try:
+            with span("generate", provider=provider) as sp:
+                sp.add_bytes_in(transcript)
+                topics, flashcards = await generator(transcript, model)
+        finally:
+            await close_clients()
+        if deduper is not None:
+            with span("dedupe"):
+                flashcards = deduper.dedupe(flashcards)
+        with span("package") as sp:
+            apkg_path = create_anki_deck(flashcards, deck_name=deck_name, output_path=output_path, source_id=source_id)
+            sp.add_bytes_out(os.path.getsize(apkg_path) if os.path.exists(apkg_path) else 0)
+        return apkg_path
+    except BaseException:
+        # No package was written, so its cards must not drop duplicates in later runs
+        if deduper is not None:
+            deduper.rollback()
+        raise
+    finally:
+        if deduper is not None:
+            save_dedupe_index()
+            print(summarize(deduper.removed))
 
 
 def _input_url() -> str:
-    url = input("Enter YouTube video URL: ").strip()
+    from model_selection import prefetch_models
+
+    # Look up models while the user types; the picker then shows without waiting
+    models = prefetch_models()
+    url = input("Enter YouTube video URL, playlist URL or file of URLs: ").strip()
     output_path = input("Enter output path: ").strip()
     # allow interactive provider/model selection (use questionary for arrow-key selection if available)
     try:
-        available = list_models()
+        available = models.result()
         try:
+            from questionary import select
+
             provider_choice = select(
                 "Choose provider:", choices=list(available.keys()), default="groq"
             ).ask()
@@ -66,12 +135,50 @@ def _input_url() -> str:
     return url, output_path
 
 
+def _run_batch(source: str, output_path: Optional[str]) -> None:
+    from batch import collect_urls, run_batch
+    from compaction import summarize as summarize_compaction
+    from dedupe import dedupe_settings, summarize
+
+    urls = collect_urls(source)
+    output_dir = output_path or os.getcwd()
+    print(f"Processing {len(urls)} videos into {output_dir}")
+
+    def _report(result) -> None:
+        if result.ok:
+            print(f"[{result.index + 1}/{len(urls)}] {result.url} -> {result.apkg_path}")
+        else:
+            print(f"[{result.index + 1}/{len(urls)}] {result.url} failed: {result.error}")
+
+    results = asyncio.run(run_batch(urls, output_dir, on_result=_report))
+    failed = sum(1 for r in results if not r.ok)
+    print(f"Batch finished: {len(results) - failed} succeeded, {failed} failed.")
+    compactions = [r.compaction for r in results if r.compaction is not None]
+    if compactions:
+        print(summarize_compaction(compactions))
+    if dedupe_settings() != "off":
+        print(summarize(d for r in results for d in r.duplicates))
+
+
 def main():
-    url = os.environ.get("YOUTUBE_URL")
+    import tracing
+    from batch import is_batch_source
+
+    url = os.environ.get("YOUTUBE_URL") or os.environ.get("YOUTUBE_URLS_FILE")
+    output_path = os.environ.get("OUTPUT_PATH")
     if not url:
         url, output_path = _input_url()
-    apkg_path = asyncio.run(run(url, output_path))
-    print(f"Anki deck created successfully at: {apkg_path}")
+    tracing.configure_from_env()
+    try:
+        if is_batch_source(url):
+            _run_batch(url, output_path)
+            return
+        apkg_path = asyncio.run(run(url, output_path))
+        print(f"Anki deck created successfully at: {apkg_path}")
+    finally:
+        report = tracing.finish()
+        if report is not None:
+            print(report)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "anki-yt-notes", "models.json")
+_DEFAULT_TTL_SECONDS = 24 * 3600
+_DEFAULT_TIMEOUT_SECONDS = 3.0
+
+Fetcher = Callable[[], List[str]]
+
+
+class ModelCatalog:
+    """
+    On-disk cache of each provider's model list.
+
+    - Entries are keyed by provider and a fingerprint of its API key, so switching
+      accounts does not serve another account's models.
+    - A fresh entry is returned as is. A stale one is returned immediately while a
+      background thread refreshes it for next time.
+    - Missing entries are fetched from all providers concurrently; a provider that
+      does not answer within `timeout` gets its fallback list (its fetch keeps running
+      in the background and fills the cache when it finishes).
+    """
+
+    def __init__(
+        self,
+        fetchers: Dict[str, Fetcher],
+        fallbacks: Dict[str, List[str]],
+        key_for: Callable[[str], str],
+        path: str = _DEFAULT_PATH,
+        ttl_seconds: float = _DEFAULT_TTL_SECONDS,
+        timeout: float = _DEFAULT_TIMEOUT_SECONDS,
+    ) -> None:
+        self.fetchers = fetchers
+        self.fallbacks = fallbacks
+        self.key_for = key_for
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._refreshing: dict[str, threading.Thread] = {}
+        # Results of this instance's fetches, in case the file cannot be written
+        self._fetched: dict[str, tuple[str, List[str]]] = {}
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _store(self, provider: str, key: str, models: List[str]) -> None:
+        with self._lock:
+            data = self._load()
+            data[provider] = {"key": key, "models": models, "fetched_at": time.time()}
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+
+    def _fetch(self, provider: str, key: str) -> None:
+        try:
+            models = self.fetchers[provider]()
+        except Exception as exc:
+            logger.info("Could not list %s models: %s", provider, exc)
+            return
+        finally:
+            self._refreshing.pop(provider, None)
+        if models:
+            self._fetched[provider] = (key, models)
+            try:
+                self._store(provider, key, models)
+            except OSError as exc:
+                logger.info("Could not write model catalog %s: %s", self.path, exc)
+
+    def _start_fetch(self, provider: str, key: str) -> threading.Thread:
+        thread = self._refreshing.get(provider)
+        if thread is None:
+            # Daemon threads: a hung provider must never delay interpreter exit
+            thread = threading.Thread(target=self._fetch, args=(provider, key), daemon=True)
+            self._refreshing[provider] = thread
+            thread.start()
+        return thread
+
+    def list_models(self) -> Dict[str, List[str]]:
+        cached = self._load()
+        now = time.time()
+        result: Dict[str, List[str]] = {}
+        waiting: dict[str, threading.Thread] = {}
+        for provider in self.fetchers:
+            key = self.key_for(provider)
+            entry = cached.get(provider)
+            if isinstance(entry, dict) and entry.get("key") == key and entry.get("models"):
+                result[provider] = list(entry["models"])
+                if now - float(entry.get("fetched_at", 0)) > self.ttl_seconds:
+                    self._start_fetch(provider, key)
+                continue
+            waiting[provider] = self._start_fetch(provider, key)
+
+        deadline = time.monotonic() + self.timeout
+        for provider, thread in waiting.items():
+            thread.join(max(0.0, deadline - time.monotonic()))
+        for provider in waiting:
+            key, models = self._fetched.get(provider, ("", []))
+            if models and key == self.key_for(provider):
+                result[provider] = list(models)
+            else:
+                result[provider] = list(self.fallbacks.get(provider, []))
+        return {provider: result[provider] for provider in self.fetchers}
+
+
+def api_key_fingerprint(*env_names: str) -> str:
+    """Short hash of the first API key set among `env_names` ("" when none is)."""
+    for name in env_names:
+        value = os.getenv(name)
+        if value:
+            return hashlib.sha256(value.encode("utf-8")).hexdigest()[:16]
+    return ""
+
+
+def catalog_settings() -> dict:
+    """Catalog options from env `MODEL_CATALOG_PATH`, `MODEL_CATALOG_TTL` and `MODEL_CATALOG_TIMEOUT` (seconds)."""
+    return {
+        "path": os.path.expanduser(os.getenv("MODEL_CATALOG_PATH") or _DEFAULT_PATH),
+        "ttl_seconds": float(os.getenv("MODEL_CATALOG_TTL") or _DEFAULT_TTL_SECONDS),
+        "timeout": float(os.getenv("MODEL_CATALOG_TIMEOUT") or _DEFAULT_TIMEOUT_SECONDS),
+    }
@@ -1,68 +1,341 @@
+import asyncio
+import json
+import logging
 import os
-from typing import Callable, Dict, List, Optional, Tuple
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, NamedTuple, Optional, Tuple
 
-from schemas import TopicsResponse, FlashcardsResponse
+from hedging import get_latency_tracker, hedge_delay, hedge_settings, run_hedged
+from model_catalog import ModelCatalog, api_key_fingerprint, catalog_settings
+import tracing
 
+if TYPE_CHECKING:
+    from schemas import FlashcardsResponse, TopicsResponse
 
-def _safe_list_groq_models() -> List[str]:
-    try:
-        from groq import Groq
-
-        api_key = os.getenv("GROQ_API_KEY") or os.getenv("GROQ_API_TOKEN")
-        if not api_key:
-            raise RuntimeError("no groq key")
-        client = Groq(api_key=api_key)
-        models = getattr(getattr(client, "models", None), "list", None)
-        if callable(models):
-            resp = models()
-            names: List[str] = []
-            for m in getattr(resp, "data", []) or []:
-                name = getattr(m, "id", None) or getattr(m, "name", None)
-                if isinstance(name, str):
-                    names.append(name)
-            if names:
-                return sorted(names)
-    except Exception:
-        pass
-    return ["openai/gpt-oss-120b"]
-
-
-def _safe_list_gemini_models() -> List[str]:
-    try:
-        from google import genai
-
-        api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise RuntimeError("no gemini key")
-        client = genai.Client(api_key=api_key)
-        names: List[str] = []
-        for model in client.models.list():
-            for action in model.supported_actions:
-                if action == "generateContent":
-                    names.append(model.name)
-                    break
-        return sorted(list(dict.fromkeys(names)))
-    except Exception:
-        pass
-    return ["gemini-1.5-pro", "gemini-1.5-flash"]
+logger = logging.getLogger(__name__)
+
+_API_KEY_ENV = {
+    "groq": ("GROQ_API_KEY", "GROQ_API_TOKEN"),
+    "gemini": ("GOOGLE_API_KEY", "GEMINI_API_KEY"),
+}
+_FALLBACK_MODELS = {
+    "groq": ["openai/gpt-oss-120b"],
+    "gemini": ["gemini-1.5-pro", "gemini-1.5-flash"],
+}
+
+# Sync SDK clients for listing models, created once per process
+_LIST_CLIENTS: Dict[str, Any] = {}
+_LIST_CLIENTS_LOCK = threading.Lock()
+
+
+def _list_client(provider: str, factory: Callable[[str], Any]) -> Any:
+    api_key = next((os.getenv(name) for name in _API_KEY_ENV[provider] if os.getenv(name)), None)
+    if not api_key:
+        raise RuntimeError(f"no {provider} key")
+    with _LIST_CLIENTS_LOCK:
+        cached = _LIST_CLIENTS.get(provider)
+        if cached is None or cached[0] != api_key:
+            cached = _LIST_CLIENTS[provider] = (api_key, factory(api_key))
+        return cached[1]
+
+
+def _fetch_groq_models() -> List[str]:
+    from groq import Groq
+
+    client = _list_client("groq", lambda key: Groq(api_key=key))
+    names: List[str] = []
+    for m in getattr(client.models.list(), "data", []) or []:
+        name = getattr(m, "id", None) or getattr(m, "name", None)
+        if isinstance(name, str):
+            names.append(name)
+    return sorted(names)
+
+
+def _fetch_gemini_models() -> List[str]:
+    from google import genai
+
+    client = _list_client("gemini", lambda key: genai.Client(api_key=key))
+    names: List[str] = []
+    for model in client.models.list():
+        for action in model.supported_actions:
+            if action == "generateContent":
+                names.append(model.name)
+                break
+    return sorted(list(dict.fromkeys(names)))
+
+
+_FETCHERS = {"groq": _fetch_groq_models, "gemini": _fetch_gemini_models}
 
 
 def list_models() -> Dict[str, List[str]]:
-    return {
-        "groq": _safe_list_groq_models(),
-        "gemini": _safe_list_gemini_models(),
-    }
+    """
+    Models per provider, from the on-disk catalog when possible.
+
+    Providers are queried concurrently and only when their entry is missing or stale
+    (stale entries are shown at once and refreshed in the background); see
+    `model_catalog.ModelCatalog`.
+    """
+    catalog = ModelCatalog(
+        fetchers=_FETCHERS,
+        fallbacks=_FALLBACK_MODELS,
+        key_for=lambda provider: api_key_fingerprint(*_API_KEY_ENV[provider]),
+        **catalog_settings(),
+    )
+    return catalog.list_models()
+
+
+def prefetch_models() -> "Future[Dict[str, List[str]]]":
+    """Start `list_models` in the background (e.g. while the user types a URL)."""
+    future: "Future[Dict[str, List[str]]]" = Future()
+
+    def run() -> None:
+        try:
+            future.set_result(list_models())
+        except BaseException as exc:
+            future.set_exception(exc)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+class ModelInfo(NamedTuple):
+    """Context window and maximum output in tokens, and typical output speed in tokens per second."""
+
+    context_window: int
+    max_output: int
+    tokens_per_second: float
+
+
+# Keyed like LLM_RATE_LIMITS ("provider:model"); extend or override with env LLM_MODEL_INFO
+MODEL_INFO: Dict[str, ModelInfo] = {
+    "groq:openai/gpt-oss-120b": ModelInfo(131_072, 65_536, 500),
+    "groq:openai/gpt-oss-20b": ModelInfo(131_072, 65_536, 1_000),
+    "groq:llama-3.3-70b-versatile": ModelInfo(131_072, 32_768, 280),
+    "groq:llama-3.1-8b-instant": ModelInfo(131_072, 131_072, 560),
+    "groq:moonshotai/kimi-k2-instruct": ModelInfo(131_072, 16_384, 200),
+    "gemini:gemini-1.5-pro": ModelInfo(2_097_152, 8_192, 60),
+    "gemini:gemini-1.5-flash": ModelInfo(1_048_576, 8_192, 180),
+    "gemini:gemini-2.0-flash": ModelInfo(1_048_576, 8_192, 200),
+    "gemini:gemini-2.5-pro": ModelInfo(1_048_576, 65_536, 80),
+    "gemini:gemini-2.5-flash": ModelInfo(1_048_576, 65_536, 200),
+}
+# Assumed for models missing from the table
+_PROVIDER_MODEL_INFO = {
+    "groq": ModelInfo(131_072, 8_192, 200),
+    "gemini": ModelInfo(1_048_576, 8_192, 100),
+}
+
+# Room left for the topics JSON in the flashcards prompt
+_TOPICS_JSON_RESERVE = 2_048
+# Topics are extracted per window once the transcript fills more than this share of the context
+_CHUNK_FRACTION = 0.5
+_DEFAULT_OUTPUT_RESERVE = 16_384
+
+
+class Route(NamedTuple):
+    """How a transcript is sent: "direct", "chunked" (topics per window) or "switch" (another model)."""
+
+    action: str
+    provider: str
+    model: str
+    prompt_tokens: int
+    context_window: int
+    chunk_tokens: Optional[int]
+
+
+class ContextWindowError(ValueError):
+    """The transcript does not fit the context window of any usable model."""
 
 
-def get_generator(provider: str) -> Callable[[str, Optional[str]], Tuple[TopicsResponse, FlashcardsResponse]]:
-    normalized = (provider or "").strip().lower()
-    if normalized == "gemini":
+def _model_table() -> Dict[str, ModelInfo]:
+    table = dict(MODEL_INFO)
+    # e.g. {"groq:my-model": {"context_window": 32768, "max_output": 8192, "tokens_per_second": 300}}
+    raw = os.getenv("LLM_MODEL_INFO")
+    if raw:
+        for key, info in json.loads(raw).items():
+            base = table.get(key) or _PROVIDER_MODEL_INFO.get(key.split(":", 1)[0], _PROVIDER_MODEL_INFO["groq"])
+            table[key] = base._replace(**info)
+    return table
+
+
+def model_info(provider: str, model: str) -> ModelInfo:
+    table = _model_table()
+    name = model[len("models/") :] if model.startswith("models/") else model
+    return table.get(f"{provider}:{name}") or table.get(f"{provider}:{model}") or _PROVIDER_MODEL_INFO[provider]
+
+
+def default_model(provider: str) -> str:
+    return os.getenv(f"{provider.upper()}_MODEL") or _FALLBACK_MODELS[provider][0]
+
+
+def routing_settings() -> bool:
+    """Automatic routing is on unless env `LLM_ROUTING` is "off"."""
+    return (os.getenv("LLM_ROUTING") or "auto").strip().lower() not in ("0", "false", "no", "off")
+
+
+def plan_route(transcript: str, provider: str, model: Optional[str] = None, chunk_tokens: Optional[int] = None) -> Route:
+    """
+    Decide, before any request, how a transcript should be sent.
+
+    The largest single request (the flashcards prompt, which carries the whole
+    transcript and the topics JSON) plus an output reserve (env
+    `LLM_ROUTE_OUTPUT_RESERVE`) must fit the model's context window:
+
+    - it fits: send directly, or extract topics per window when the transcript fills
+      more than half the window (unless chunking is already configured);
+    - it does not: switch to the fastest model that fits, preferring the same provider
+      and only considering providers with an API key;
+    - nothing fits: raise `ContextWindowError` instead of failing after the upload.
+    """
+    from generation import chunking_settings, estimate_tokens
+    from prompts import _flashcards_prompt
+
+    model = model or default_model(provider)
+    chunk_tokens = chunking_settings(chunk_tokens)[0]
+    reserve = int(os.getenv("LLM_ROUTE_OUTPUT_RESERVE") or _DEFAULT_OUTPUT_RESERVE)
+    transcript_tokens = estimate_tokens(transcript)
+    prompt_tokens = transcript_tokens + estimate_tokens(_flashcards_prompt({}, "")) + _TOPICS_JSON_RESERVE
+
+    def fits(info: ModelInfo) -> bool:
+        return prompt_tokens + min(reserve, info.max_output) <= info.context_window
+
+    def route(action: str, route_provider: str, route_model: str, info: ModelInfo) -> Route:
+        chunk = chunk_tokens
+        if chunk is None and transcript_tokens > info.context_window * _CHUNK_FRACTION:
+            chunk = info.context_window // 4
+            action = "chunked" if action == "direct" else action
+        return Route(action, route_provider, route_model, prompt_tokens, info.context_window, chunk)
+
+    info = model_info(provider, model)
+    if fits(info):
+        return route("direct", provider, model, info)
+
+    candidates = []
+    for key, other in _model_table().items():
+        other_provider, other_model = key.split(":", 1)
+        if other_provider not in _API_KEY_ENV or not fits(other):
+            continue
+        if other_provider != provider and not any(os.getenv(name) for name in _API_KEY_ENV[other_provider]):
+            continue
+        candidates.append((other_provider != provider, -other.tokens_per_second, other_provider, other_model, other))
+    if not candidates:
+        raise ContextWindowError(
+            f"Transcript needs about {prompt_tokens} tokens plus {reserve} for output, more than "
+            f"{provider}:{model} ({info.context_window}) or any other configured model accepts"
+        )
+    _, _, other_provider, other_model, other = min(candidates)
+    return route("switch", other_provider, other_model, other)
+
+
+def _provider_generator(provider: str) -> Callable[..., Any]:
+    if provider == "gemini":
         from gemini_client import generate_topics_and_flashcards as gen
 
         return gen
-    # default to groq
     from groq_client import generate_topics_and_flashcards as gen
 
     return gen
 
 
+def backup_route(transcript: str, primary: Route, backup: Optional[str] = None, chunk_tokens: Optional[int] = None) -> Optional[Route]:
+    """
+    Where hedged and failed-over requests go: `backup` ("provider:model"), else the other
+    provider when it has an API key. None when there is no usable backup.
+    """
+    if backup:
+        provider, _, model = backup.partition(":")
+    else:
+        provider = "gemini" if primary.provider == "groq" else "groq"
+        model = ""
+        if not any(os.getenv(name) for name in _API_KEY_ENV[provider]):
+            return None
+    if provider not in _API_KEY_ENV:
+        return None
+    try:
+        route = plan_route(transcript, provider, model or None, chunk_tokens)
+    except ContextWindowError:
+        return None
+    if (route.provider, route.model) == (primary.provider, primary.model):
+        return None
+    return route
+
+
+def get_generator(provider: str) -> Callable[[str, Optional[str]], Tuple["TopicsResponse", "FlashcardsResponse"]]:
+    """
+    The `generate_topics_and_flashcards` of `provider` (default groq).
+
+    Unless env `LLM_ROUTING` is "off", it is wrapped so every transcript is first routed
+    by its estimated size (see `plan_route`); the decision is logged and recorded on the
+    current tracing span. The wrapper also fails over to a backup provider/model on
+    errors and, with env `LLM_HEDGE=hedge`, sends a duplicate request once the primary
+    is slower than its observed p95 (see `hedging.run_hedged` and `backup_route`).
+    """
+    normalized = "gemini" if (provider or "").strip().lower() == "gemini" else "groq"
+    if not routing_settings():
+        return _provider_generator(normalized)
+
+    async def generate(
+        transcript: str,
+        model: Optional[str] = None,
+        chunk_tokens: Optional[int] = None,
+        on_card: Optional[Callable[..., None]] = None,
+        **kwargs,
+    ):
+        route = plan_route(transcript, normalized, model, chunk_tokens)
+        logger.info(
+            "Routing %s:%s -> %s (%s:%s): ~%d prompt tokens, context %d, chunk tokens %s",
+            normalized,
+            model or default_model(normalized),
+            route.action,
+            route.provider,
+            route.model,
+            route.prompt_tokens,
+            route.context_window,
+            route.chunk_tokens,
+        )
+        span = tracing.current_span()
+        span.set(route=route.action, route_model=f"{route.provider}:{route.model}", prompt_tokens=route.prompt_tokens)
+
+        settings = hedge_settings()
+        backup = backup_route(transcript, route, settings["backup"], chunk_tokens) if settings["mode"] != "off" else None
+        routes = [route] + ([backup] if backup is not None else [])
+
+        def attempt(target: Route):
+            async def run(sink):
+                started = time.monotonic()
+                gen = _provider_generator(target.provider)
+                try:
+                    result = await gen(transcript, target.model, chunk_tokens=target.chunk_tokens, on_card=sink, **kwargs)
+                except asyncio.CancelledError:
+                    # A slow attempt that lost the race or timed out still counts, as a lower
+                    # bound; leaving it out would pull the p95 (and so the hedge delay) down
+                    get_latency_tracker().record(f"{target.provider}:{target.model}", time.monotonic() - started)
+                    raise
+                get_latency_tracker().record(f"{target.provider}:{target.model}", time.monotonic() - started)
+                return result
+
+            return run
+
+        hedge_after = None
+        if backup is not None and settings["mode"] == "hedge":
+            hedge_after = hedge_delay(f"{route.provider}:{route.model}", settings["after"])
+        result, winner = await run_hedged(
+            [attempt(target) for target in routes], on_card, hedge_after=hedge_after, timeout=settings["timeout"]
+        )
+        if winner:
+            logger.info("Answer came from the backup %s:%s", backup.provider, backup.model)
+        span.set(answered_by=f"{routes[winner].provider}:{routes[winner].model}")
+        return result
+
+    return generate
+
+
+async def close_clients() -> None:
+    """Close the shared provider clients that were opened during this process."""
+    for module_name in ("groq_client", "gemini_client"):
+        module = sys.modules.get(module_name)
+        if module is not None:
+            await module.close_client()
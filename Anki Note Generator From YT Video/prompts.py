@@ -1,4 +1,10 @@
 import json
+from typing import Optional
+
+_FLASHCARDS_SCHEMA = (
+    "{\n  \"decks\": [\n    {\n      \"topic\": string,\n      \"subtopic\": string?,\n      \"cards\": [\n        { \n          \"type\": \"qa\", \n          \"question\": string, \n          \"answer\": string, \n          \"explanation\": string? \n        } | { \n          \"type\": \"single_choice\", \n          \"question\": string, \n          \"options\": string[], \n          \"correct_option\": number, \n          \"explanation\": string? \n        } | { \n          \"type\": \"multiple_choice\", \n          \"question\": string, \n          \"options\": string[], \n          \"correct_options\": number[], \n          \"explanation\": string? \n        } | { \n          \"type\": \"matching\", \n          \"question\": string?, \n          \"pairs\": [ { \"left\": string, \"right\": string } ] \n        }\n      ]\n    }\n  ]\n}"
+)
+
 
 def _topics_prompt(transcript: str) -> str:
     return (
@@ -19,7 +25,27 @@ def _flashcards_prompt(topics_json: dict, transcript: str) -> str:
         "Card types allowed: qa, single_choice, multiple_choice, matching. "
         "For choice questions, include options and the correct index(es). "
         "Return ONLY valid JSON matching this schema: "
-        "{\n  \"decks\": [\n    {\n      \"topic\": string,\n      \"subtopic\": string?,\n      \"cards\": [\n        { \n          \"type\": \"qa\", \n          \"question\": string, \n          \"answer\": string, \n          \"explanation\": string? \n        } | { \n          \"type\": \"single_choice\", \n          \"question\": string, \n          \"options\": string[], \n          \"correct_option\": number, \n          \"explanation\": string? \n        } | { \n          \"type\": \"multiple_choice\", \n          \"question\": string, \n          \"options\": string[], \n          \"correct_options\": number[], \n          \"explanation\": string? \n        } | { \n          \"type\": \"matching\", \n          \"question\": string?, \n          \"pairs\": [ { \"left\": string, \"right\": string } ] \n        }\n      ]\n    }\n  ]\n}"
-        f"\nTopics JSON:\n{json.dumps(topics_json, ensure_ascii=False)}"
+        + _FLASHCARDS_SCHEMA
+        + f"\nTopics JSON:\n{json.dumps(topics_json, ensure_ascii=False)}"
         f"\nTranscript:\n{transcript}"
-    )
\ No newline at end of file
+    )
+
+
+def _topic_flashcards_prompt(topic: str, subtopic: Optional[dict], transcript: Optional[str] = None) -> str:
+    """Flashcards for a single topic/subtopic; without `transcript` the model uses the cached one."""
+    source = "the transcript below" if transcript is not None else "the cached transcript"
+    prompt = (
+        "You are an assistant that returns strict JSON. "
+        f"Create Anki flashcards from {source} for ONE topic only. Create as many flashcards as possible for it, up to 50. "
+        "Do not create flashcards for the course description, instructor, or any other non-learning content. "
+        "Card types allowed: qa, single_choice, multiple_choice, matching. "
+        "For choice questions, include options and the correct index(es). "
+        "Return ONLY valid JSON with exactly one deck whose topic and subtopic match the ones given, matching this schema: "
+        + _FLASHCARDS_SCHEMA
+        + f"\nTopic: {topic}"
+    )
+    if subtopic:
+        prompt += f"\nSubtopic JSON:\n{json.dumps(subtopic, ensure_ascii=False)}"
+    if transcript is not None:
+        prompt += f"\nTranscript:\n{transcript}"
+    return prompt
@@ -0,0 +1,233 @@
+import asyncio
+import json
+import os
+import random
+import re
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import tracing
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+_RETRYABLE_ERROR_NAMES = {"APIConnectionError", "APITimeoutError", "ConnectError", "ReadTimeout", "ConnectTimeout"}
+
+
+class TokenBucket:
+    """
+    Async token bucket refilled continuously at `per_minute` tokens per minute.
+
+    Waiters are served in FIFO order. Requests larger than the capacity are clamped to it,
+    so an oversized request waits for a full bucket instead of forever. `block(seconds)`
+    pauses the bucket for everyone (used for Retry-After).
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None) -> None:
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def adjust(self, delta: float) -> None:
+        """Charge (positive) or refund (negative) tokens once the real cost is known."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+    def block(self, seconds: float) -> None:
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+class _Limits:
+    def __init__(self, rpm: Optional[float], tpm: Optional[float]) -> None:
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+
+    def block(self, seconds: float) -> None:
+        for bucket in (self.requests, self.tokens):
+            if bucket is not None:
+                bucket.block(seconds)
+
+
+def status_code(exc: BaseException) -> Optional[int]:
+    for attr in ("status_code", "code", "status"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(exc, "response", None)
+    value = getattr(response, "status_code", None) or getattr(response, "status", None)
+    return value if isinstance(value, int) else None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    code = status_code(exc)
+    if code is not None:
+        return code in RETRYABLE_STATUS
+    return isinstance(exc, (asyncio.TimeoutError, ConnectionError)) or type(exc).__name__ in _RETRYABLE_ERROR_NAMES
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Server-requested delay from a Retry-After header or a Gemini `retryDelay` detail."""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if headers is not None:
+        try:
+            value = headers.get("retry-after")
+        except Exception:
+            value = None
+        if value:
+            try:
+                return max(0.0, float(value))
+            except ValueError:
+                pass
+    details = getattr(exc, "details", None)
+    if details:
+        m = re.search(r"retryDelay['\"]?\s*:\s*['\"]?(\d+(?:\.\d+)?)s", str(details))
+        if m:
+            return float(m.group(1))
+    return None
+
+
+class RateLimitScheduler:
+    """
+    Shared gate for all LLM calls: per-provider/per-model request and token buckets plus
+    retries for 429/5xx/connection errors.
+
+    A 429 pauses the whole (provider, model) bucket for the Retry-After period, so
+    concurrent callers back off together instead of hammering the quota. Other
+    retryable errors use full-jitter exponential backoff.
+    """
+
+    def __init__(
+        self,
+        limits: Optional[dict[str, dict[str, float]]] = None,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+    ) -> None:
+        # keys: "provider" or "provider:model"; values: {"rpm": ..., "tpm": ...}
+        self.limits_config = limits or {}
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._limits: dict[tuple[str, str], _Limits] = {}
+        self.retries = 0
+
+    def configure(self, provider: str, model: Optional[str] = None, rpm: Optional[float] = None, tpm: Optional[float] = None) -> None:
+        key = f"{provider}:{model}" if model else provider
+        self.limits_config[key] = {"rpm": rpm, "tpm": tpm}
+        # Rebuild this provider's buckets lazily with the new settings
+        self._limits = {k: v for k, v in self._limits.items() if k[0] != provider}
+
+    def _limits_for(self, provider: str, model: str) -> _Limits:
+        limits = self._limits.get((provider, model))
+        if limits is None:
+            conf = self.limits_config.get(f"{provider}:{model}") or self.limits_config.get(provider) or {}
+            limits = _Limits(conf.get("rpm"), conf.get("tpm"))
+            self._limits[(provider, model)] = limits
+        return limits
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2**attempt)))
+
+    async def call(
+        self,
+        provider: str,
+        model: str,
+        fn: Callable[[], Awaitable[T]],
+        estimated_tokens: int = 0,
+        actual_tokens: Optional[Callable[[T], Optional[int]]] = None,
+        on_retry: Optional[Callable[[int, BaseException], None]] = None,
+    ) -> T:
+        """
+        Run `fn` once capacity is available, retrying retryable failures.
+
+        `actual_tokens(result)` may report real usage so the token bucket is corrected.
+        """
+        limits = self._limits_for(provider, model)
+        # What `acquire` actually takes, so the correction below refunds no more than that
+        charged = min(estimated_tokens, limits.tokens.capacity) if limits.tokens is not None else 0
+        attempt = 0
+        while True:
+            if limits.requests is not None:
+                await limits.requests.acquire(1)
+            if limits.tokens is not None and charged:
+                await limits.tokens.acquire(charged)
+            try:
+                result = await fn()
+            except Exception as exc:
+                if attempt >= self.max_retries or not is_retryable(exc):
+                    raise
+                delay = retry_after(exc)
+                if status_code(exc) == 429:
+                    delay = delay if delay is not None else self.backoff(attempt + 2)
+                    limits.block(delay)
+                elif delay is None:
+                    delay = self.backoff(attempt)
+                attempt += 1
+                self.retries += 1
+                tracing.add_retry()
+                if on_retry is not None:
+                    on_retry(attempt, exc)
+                await asyncio.sleep(delay)
+                continue
+            if limits.tokens is not None and actual_tokens is not None:
+                used = actual_tokens(result)
+                if used is not None:
+                    limits.tokens.adjust(used - charged)
+            return result
+
+
+def _limits_from_env() -> dict[str, dict[str, float]]:
+    limits: dict[str, dict[str, float]] = {}
+    for provider in ("groq", "gemini"):
+        rpm = os.getenv(f"{provider.upper()}_RPM")
+        tpm = os.getenv(f"{provider.upper()}_TPM")
+        if rpm or tpm:
+            limits[provider] = {"rpm": float(rpm) if rpm else None, "tpm": float(tpm) if tpm else None}
+    # Per-model overrides, e.g. {"groq:openai/gpt-oss-120b": {"rpm": 30, "tpm": 8000}}
+    raw = os.getenv("LLM_RATE_LIMITS")
+    if raw:
+        limits.update(json.loads(raw))
+    return limits
+
+
+_SCHEDULER: Optional[RateLimitScheduler] = None
+_SCHEDULER_LOOP: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_scheduler() -> RateLimitScheduler:
+    """
+    Scheduler shared by every call in the running event loop, configured from
+    `GROQ_RPM`/`GROQ_TPM`/`GEMINI_RPM`/`GEMINI_TPM`/`LLM_RATE_LIMITS`.
+    """
+    global _SCHEDULER, _SCHEDULER_LOOP
+    loop = asyncio.get_running_loop()
+    # asyncio locks are bound to one loop, so a new asyncio.run() gets fresh buckets
+    if _SCHEDULER is None or _SCHEDULER_LOOP is not loop:
+        _SCHEDULER_LOOP = loop
+        _SCHEDULER = RateLimitScheduler(
+            limits=_limits_from_env(),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES") or 5),
+        )
+    return _SCHEDULER
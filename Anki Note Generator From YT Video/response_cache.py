@@ -0,0 +1,204 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+_DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "anki-yt-notes", "llm_responses.sqlite3")
+_DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+_DEFAULT_MAX_AGE_SECONDS = 30 * 24 * 3600
+
+MODES = ("on", "off", "refresh")
+# Expired entries are only ever skipped on lookup, so they are swept every this many puts
+_SWEEP_EVERY = 256
+
+
+def _schema_fingerprint(schema: Any) -> str:
+    if schema is None:
+        return ""
+    to_json_schema = getattr(schema, "model_json_schema", None)
+    if callable(to_json_schema):
+        return json.dumps(to_json_schema(), sort_keys=True)
+    return repr(schema)
+
+
+def cache_key(
+    provider: str,
+    model: str,
+    prompt: str,
+    schema: Any = None,
+    max_tokens: Optional[int] = None,
+    context: str = "",
+) -> str:
+    """
+    Hash of everything that determines a temperature-0 completion.
+
+    `context` covers inputs that are not part of the prompt text, such as a transcript
+    held in a provider-side context cache.
+    """
+    h = hashlib.sha256()
+    for part in (provider, model, _schema_fingerprint(schema), str(max_tokens), context, prompt):
+        h.update(part.encode("utf-8"))
+        h.update(b"\x1f")
+    return h.hexdigest()
+
+
+class ResponseCache:
+    """
+    Persistent SQLite cache of LLM completion texts.
+
+    - `mode="refresh"` skips lookups but stores fresh results; `mode="off"` does neither.
+    - Entries older than `max_age_seconds` are dropped; beyond `max_bytes`, least
+      recently used entries are evicted. The total size is kept as a running count and
+      only summed in SQL when evicting.
+    - `hits`/`misses` count lookups for this process.
+    """
+
+    def __init__(
+        self,
+        path: str = _DEFAULT_PATH,
+        max_bytes: int = _DEFAULT_MAX_BYTES,
+        max_age_seconds: float = _DEFAULT_MAX_AGE_SECONDS,
+        mode: str = "on",
+    ) -> None:
+        if mode not in MODES:
+            raise ValueError(f"Unknown cache mode: {mode}")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._size = 0
+        self._puts = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+                " created REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses(last_used)")
+            self._size = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        if self.mode != "on":
+            return None
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.max_age_seconds:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, value: str) -> None:
+        if self.mode == "off" or not value:
+            return
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            conn = self._connect()
+            replaced = conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._size += size - (replaced[0] if replaced else 0)
+            self._puts += 1
+            if self._size > self.max_bytes or self._puts % _SWEEP_EVERY == 0:
+                self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute("DELETE FROM responses WHERE created < ?", (now - self.max_age_seconds,))
+        # Recounted here, as other processes may share the file
+        total = self._size = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        doomed: list[str] = []
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_used ASC"):
+            doomed.append(key)
+            excess -= size
+            if excess <= 0:
+                break
+        conn.executemany("DELETE FROM responses WHERE key = ?", [(k,) for k in doomed])
+        self._size = excess + self.max_bytes
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    async def get_or_call(
+        self,
+        provider: str,
+        model: str,
+        prompt: str,
+        call: Callable[[], Awaitable[str]],
+        schema: Any = None,
+        max_tokens: Optional[int] = None,
+        context: str = "",
+    ) -> str:
+        """Return the cached completion for these inputs, or await `call()` and store it."""
+        if self.mode == "off":
+            return await call()
+        key = cache_key(provider, model, prompt, schema, max_tokens, context)
+        cached = await asyncio.to_thread(self.get, key)
+        if cached is not None:
+            return cached
+        text = await call()
+        try:
+            await asyncio.to_thread(self.put, key, text)
+        except sqlite3.Error:
+            # A broken cache must never fail generation
+            pass
+        return text
+
+
+def cache_settings(mode: Optional[str] = None) -> str:
+    """Resolve the cache mode from the argument or env `LLM_CACHE` (on, off or refresh)."""
+    mode = (mode or os.getenv("LLM_CACHE") or "on").strip().lower()
+    if mode in ("0", "false", "no"):
+        mode = "off"
+    return mode if mode in MODES else "on"
+
+
+_DEFAULT_CACHE: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    """Process-wide cache configured from `LLM_CACHE` (see `cache_settings`), `LLM_CACHE_PATH`,
+    `LLM_CACHE_MAX_MB` and `LLM_CACHE_MAX_AGE_DAYS`."""
+    global _DEFAULT_CACHE
+    mode = cache_settings()
+    if _DEFAULT_CACHE is None or _DEFAULT_CACHE.mode != mode:
+        if _DEFAULT_CACHE is not None:
+            _DEFAULT_CACHE.close()
+        _DEFAULT_CACHE = ResponseCache(
+            path=os.getenv("LLM_CACHE_PATH") or _DEFAULT_PATH,
+            max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB") or _DEFAULT_MAX_BYTES / 1024 / 1024) * 1024 * 1024),
+            max_age_seconds=float(os.getenv("LLM_CACHE_MAX_AGE_DAYS") or 30) * 24 * 3600,
+            mode=mode,
+        )
+    return _DEFAULT_CACHE
@@ -1,5 +1,7 @@
-from typing import List, Literal, Optional
-from pydantic import BaseModel, Field
+from typing import Annotated, Any, Callable, List, Literal, Optional, Union
+from pydantic import BaseModel, Discriminator, Field, Tag, TypeAdapter, ValidationError
+
+import tracing
 
 
 class Subtopic(BaseModel):
@@ -51,7 +53,32 @@ class CardMatching(BaseModel):
     pairs: List[MatchingPair]
 
 
-Card = CardQA | CardSingleChoice | CardMultipleChoice | CardMatching
+def _card_type(value: Any) -> str:
+    """Discriminator value for a card; infers it from the fields when `type` is missing."""
+    if isinstance(value, dict):
+        card_type = value.get("type")
+        if card_type:
+            return card_type
+        if "pairs" in value:
+            return "matching"
+        if "correct_options" in value:
+            return "multiple_choice"
+        if "correct_option" in value:
+            return "single_choice"
+        return "qa"
+    return getattr(value, "type", "qa")
+
+
+# Dispatch on `type` instead of trying every variant in turn
+Card = Annotated[
+    Union[
+        Annotated[CardQA, Tag("qa")],
+        Annotated[CardSingleChoice, Tag("single_choice")],
+        Annotated[CardMultipleChoice, Tag("multiple_choice")],
+        Annotated[CardMatching, Tag("matching")],
+    ],
+    Discriminator(_card_type),
+]
 
 
 class DeckCards(BaseModel):
@@ -64,3 +91,44 @@ class FlashcardsResponse(BaseModel):
     decks: List[DeckCards] = Field(default_factory=list)
 
 
+class _SchemaDeckCards(BaseModel):
+    topic: str
+    subtopic: Optional[str] = None
+    cards: List[Union[CardQA, CardSingleChoice, CardMultipleChoice, CardMatching]]
+
+
+class FlashcardsSchema(BaseModel):
+    """
+    `FlashcardsResponse` as a provider response schema. The callable discriminator on
+    `Card` emits `oneOf`, which Gemini rejects; a plain union emits `anyOf`. Completions
+    are still validated with `FLASHCARDS_ADAPTER`.
+    """
+
+    decks: List[_SchemaDeckCards] = Field(default_factory=list)
+
+
+# Built once; constructing adapters per call rebuilds the validator
+CARD_ADAPTER: TypeAdapter = TypeAdapter(Card)
+TOPICS_ADAPTER: TypeAdapter = TypeAdapter(TopicsResponse)
+FLASHCARDS_ADAPTER: TypeAdapter = TypeAdapter(FlashcardsResponse)
+
+
+def validate_completion(adapter: TypeAdapter, text: str, parse: Callable[[str], Any]) -> Any:
+    """
+    Validate a model completion with `adapter`.
+
+    Clean JSON is validated straight from the text in one pass (no intermediate dict);
+    anything else (fences, prose, broken JSON) goes through `parse` first.
+    """
+    with tracing.span("parse") as sp:
+        sp.add_bytes_in(text if isinstance(text, str) else None)
+        stripped = text.strip() if isinstance(text, str) else ""
+        if stripped[:1] == "{" and stripped[-1:] == "}":
+            try:
+                result = adapter.validate_json(stripped)
+                sp.set(strategy="direct")
+                return result
+            except ValidationError:
+                pass
+        sp.set(strategy="extract")
+        return adapter.validate_python(parse(text))
@@ -0,0 +1,19 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+
+@pytest.fixture(autouse=True)
+def _no_persistent_llm_cache(monkeypatch, tmp_path):
+    # Tests count provider calls; never serve them from the user's on-disk cache
+    import response_cache
+
+    monkeypatch.setenv("LLM_CACHE", "off")
+    monkeypatch.setattr(response_cache, "_DEFAULT_CACHE", None)
+    monkeypatch.setenv("MODEL_CATALOG_PATH", str(tmp_path / "models.json"))
@@ -0,0 +1,80 @@
+import sys
+import json
+import sqlite3
+import zipfile
+from pathlib import Path
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from anki_creator import CoursePackageWriter, DeckBuilder
+from apkg_writer import field_checksum
+from schemas import CardQA, FlashcardsResponse
+
+
+def _collection(apkg_path, tmp_path):
+    with zipfile.ZipFile(apkg_path) as z:
+        z.extract("collection.anki2", tmp_path)
+    return sqlite3.connect(tmp_path / "collection.anki2")
+
+
+def test_course_writer_streams_notes_into_one_package(tmp_path):
+    writer = CoursePackageWriter(str(tmp_path), deck_name="Course")
+    writer._writer.batch_size = 7
+    for video in range(3):
+        staged = writer.video(f"Video {video}", f"vid{video}")
+        for i in range(10):
+            staged.add_card("Topic", None, CardQA(question=f"Q{i}", answer="A"))
+        writer.commit(staged)
+    path = writer.close()
+
+    assert path.endswith("Course.apkg")
+    conn = _collection(path, tmp_path)
+    assert conn.execute("SELECT COUNT(*), COUNT(DISTINCT guid), COUNT(DISTINCT mid) FROM notes").fetchone() == (30, 30, 1)
+    assert conn.execute("SELECT COUNT(*) FROM cards").fetchone()[0] == 30
+    decks = json.loads(conn.execute("SELECT decks FROM col").fetchone()[0])
+    names = {d["name"] for d in decks.values()}
+    assert {"Course", "Course::Video 0::Topic", "Course::Video 2::Topic"} <= names
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert "ix_cards_nid" in indexes
+
+
+def test_course_writer_matches_genanki_rows(tmp_path):
+    cards = FlashcardsResponse.model_validate(
+        {"decks": [{"topic": "T", "subtopic": "S", "cards": [{"question": "Q", "answer": "A", "explanation": "E"}]}]}
+    )
+    builder = DeckBuilder("Course::Video", source_id="vid")
+    builder.add_flashcards(cards)
+    legacy = _collection(builder.write(str(tmp_path / "legacy.apkg")), tmp_path / "legacy")
+
+    writer = CoursePackageWriter(str(tmp_path / "course.apkg"), deck_name="Course")
+    writer.add_flashcards("Video", "vid", cards)
+    streamed = _collection(writer.close(), tmp_path / "streamed")
+
+    query = "SELECT guid, flds, sfld, tags FROM notes"
+    assert streamed.execute(query).fetchall() == legacy.execute(query).fetchall()
+
+
+def test_course_writer_skips_repeated_guids_and_uncommitted_videos(tmp_path):
+    writer = CoursePackageWriter(str(tmp_path), deck_name="Course")
+    done = writer.video("Video", "vid")
+    for question in ["Q1", "Q1", "Q2"]:
+        done.add_card("Topic", None, CardQA(question=question, answer="A"))
+    failed = writer.video("Broken", "bad")
+    failed.add_card("Topic", None, CardQA(question="Never written", answer="A"))
+    writer.commit(done)
+    # The same video committed again (e.g. retried) adds nothing
+    again = writer.video("Video", "vid")
+    again.add_card("Topic", None, CardQA(question="Q2", answer="A"))
+    writer.commit(again)
+    conn = _collection(writer.close(), tmp_path)
+
+    rows = conn.execute("SELECT sfld, csum FROM notes ORDER BY sfld").fetchall()
+    assert [sfld for sfld, _ in rows] == ["Q1", "Q2"]
+    assert all(csum == field_checksum(sfld) != 0 for sfld, csum in rows)
+    assert field_checksum("<b>Q1</b>") == field_checksum("Q1")
+    assert conn.execute("SELECT COUNT(*) FROM cards").fetchone()[0] == 2
+    assert writer.note_count == 2
+    assert "ix_writer_guid" not in {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
@@ -0,0 +1,127 @@
+import sys
+import asyncio
+from pathlib import Path
+from types import SimpleNamespace
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+
+def _patch_stages(monkeypatch, events, fail_urls=()):
+    import batch
+
+    async def fake_extract(url, language_preference=None):
+        events.append(("transcript", url))
+        await asyncio.sleep(0.01)
+        if url in fail_urls:
+            raise Exception("no transcript")
+        return f"transcript of {url}"
+
+    async def fake_generator(transcript, model=None):
+        events.append(("llm_start", transcript))
+        await asyncio.sleep(0.05)
+        events.append(("llm_end", transcript))
+        return None, SimpleNamespace(decks=[])
+
+    def fake_create(flashcards, deck_name, output_path, source_id=None):
+        return f"{output_path}/{deck_name}.apkg"
+
+    monkeypatch.setattr(batch, "extract_transcript_async", fake_extract)
+    monkeypatch.setattr(batch, "fetch_video_title", lambda url: url.rsplit("=", 1)[-1])
+    monkeypatch.setattr(batch, "get_generator", lambda provider: fake_generator)
+    monkeypatch.setattr(batch, "create_anki_deck", fake_create)
+    return batch
+
+
+def test_run_batch_returns_results_in_input_order(monkeypatch):
+    events = []
+    batch = _patch_stages(monkeypatch, events)
+    urls = [f"https://www.youtube.com/watch?v=vid{i}" for i in range(5)]
+
+    results = asyncio.run(batch.run_batch(urls, "/out", transcript_concurrency=2, llm_concurrency=2))
+
+    assert [r.url for r in results] == urls
+    assert all(r.ok for r in results)
+    assert results[3].apkg_path == "/out/vid3.apkg"
+
+
+def test_run_batch_overlaps_transcripts_with_llm(monkeypatch):
+    events = []
+    batch = _patch_stages(monkeypatch, events)
+    urls = [f"https://www.youtube.com/watch?v=vid{i}" for i in range(3)]
+
+    asyncio.run(batch.run_batch(urls, "/out", transcript_concurrency=1, llm_concurrency=1))
+
+    first_llm_end = events.index(("llm_end", f"transcript of {urls[0]}"))
+    second_transcript = events.index(("transcript", urls[1]))
+    assert second_transcript < first_llm_end
+
+
+def test_run_batch_isolates_failures(monkeypatch):
+    events = []
+    bad = "https://www.youtube.com/watch?v=vid1"
+    batch = _patch_stages(monkeypatch, events, fail_urls={bad})
+    urls = [f"https://www.youtube.com/watch?v=vid{i}" for i in range(3)]
+    reported = []
+
+    results = asyncio.run(batch.run_batch(urls, "/out", on_result=reported.append))
+
+    assert [r.ok for r in results] == [True, False, True]
+    assert "no transcript" in results[1].error
+    assert len(reported) == 3
+
+
+def test_run_batch_writes_one_course_package(monkeypatch, tmp_path):
+    events = []
+    batch = _patch_stages(monkeypatch, events)
+    monkeypatch.setenv("ANKI_COURSE_DECK", "Course")
+    urls = [f"https://www.youtube.com/watch?v=vid{i}" for i in range(3)]
+
+    results = asyncio.run(batch.run_batch(urls, str(tmp_path)))
+
+    assert {r.apkg_path for r in results} == {str(tmp_path / "Course.apkg")}
+    assert (tmp_path / "Course.apkg").exists()
+
+
+def test_streaming_course_package_leaves_out_failed_videos(monkeypatch, tmp_path):
+    import sqlite3
+    import zipfile
+
+    from schemas import CardQA
+
+    batch = _patch_stages(monkeypatch, [])
+
+    async def streaming_generator(transcript, model=None, on_card=None):
+        on_card("Topic", None, CardQA(question=f"Q about {transcript}", answer="A"))
+        await asyncio.sleep(0.01)
+        if transcript.endswith("vid1"):
+            raise Exception("generation failed")
+        return None, SimpleNamespace(decks=[])
+
+    monkeypatch.setattr(batch, "get_generator", lambda provider: streaming_generator)
+    monkeypatch.setenv("ANKI_COURSE_DECK", "Course")
+    monkeypatch.setenv("LLM_STREAM", "1")
+    urls = [f"https://www.youtube.com/watch?v=vid{i}" for i in range(3)]
+
+    results = asyncio.run(batch.run_batch(urls, str(tmp_path)))
+
+    assert [r.ok for r in results] == [True, False, True]
+    with zipfile.ZipFile(tmp_path / "Course.apkg") as z:
+        z.extract("collection.anki2", tmp_path)
+    conn = sqlite3.connect(tmp_path / "collection.anki2")
+    questions = sorted(row[0] for row in conn.execute("SELECT sfld FROM notes"))
+    assert questions == [f"Q about transcript of {urls[0]}", f"Q about transcript of {urls[2]}"]
+
+
+def test_collect_urls_reads_file_and_skips_comments(tmp_path):
+    import batch
+
+    url_file = tmp_path / "urls.txt"
+    url_file.write_text(
+        "# lecture series\nhttps://youtu.be/aaaaaaaaaaa\n\nhttps://youtu.be/bbbbbbbbbbb\nhttps://youtu.be/aaaaaaaaaaa\n"
+    )
+    assert batch.collect_urls(str(url_file)) == ["https://youtu.be/aaaaaaaaaaa", "https://youtu.be/bbbbbbbbbbb"]
+    assert batch.is_playlist_url("https://www.youtube.com/playlist?list=PL123")
+    assert not batch.is_playlist_url("https://www.youtube.com/watch?v=aaaaaaaaaaa&list=PL123")
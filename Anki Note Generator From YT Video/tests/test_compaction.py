@@ -0,0 +1,65 @@
+import sys
+import time
+from pathlib import Path
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from compaction import compact_transcript, compaction_settings, remove_rolling_overlaps, summarize
+
+
+def test_rolling_caption_lines_are_deduplicated():
+    rolling = (
+        "so today we are going to talk\n"
+        "so today we are going to talk\nabout gradient descent and why\n"
+        "about gradient descent and why\nit follows the slope downhill.\n"
+        "It follows the slope downhill.\n\n"
+    )
+    result = compact_transcript(rolling)
+
+    assert result.text == (
+        "so today we are going to talk about gradient descent and why it follows the slope downhill."
+    )
+    assert result.tokens_after < result.tokens_before
+    assert result.saved == result.tokens_before - result.tokens_after
+
+
+def test_ordinary_repetition_is_kept():
+    words = "it is very very important , no no , really".split()
+    assert remove_rolling_overlaps(words) == words
+    # Partial overlap at a caption boundary: only the repeated tail goes
+    assert remove_rolling_overlaps("a b c d e c d e f".split()) == "a b c d e f".split()
+    assert remove_rolling_overlaps("a b c d e c d e f".split(), min_overlap=4) == "a b c d e c d e f".split()
+
+
+def test_fillers_are_stripped_only_on_request():
+    text = "[Music] >> So um the uh model, hmm, learns [Applause]"
+    assert compact_transcript(text).text == text
+    assert compact_transcript(text, strip_fillers=True).text == "So the model, learns"
+
+
+def test_compaction_is_linear_on_long_transcripts():
+    line = "the quick brown fox jumps over the lazy dog and the cat"
+    text = "\n".join(f"{line} {i}\n{line} {i}" for i in range(10_000))
+
+    start = time.perf_counter()
+    result = compact_transcript(text)
+    elapsed = time.perf_counter() - start
+
+    assert result.text.count("quick") == 10_000
+    assert elapsed < 2.0
+
+
+def test_settings_and_batch_summary(monkeypatch):
+    monkeypatch.delenv("TRANSCRIPT_COMPACT", raising=False)
+    assert compaction_settings() == "on"
+    monkeypatch.setenv("TRANSCRIPT_COMPACT", "off")
+    assert compaction_settings() == "off"
+    assert compaction_settings("Fillers") == "fillers"
+
+    a = compact_transcript("one two three four one two three four")
+    b = compact_transcript("five six")
+    assert summarize([a, b]).startswith(f"Transcripts compacted: {a.tokens_before + b.tokens_before} -> ")
+    assert "over 2 videos" in summarize([a, b])
@@ -0,0 +1,125 @@
+import sys
+import asyncio
+import time
+from pathlib import Path
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from context_cache import ContextCacheRegistry, inline_is_cheaper, min_cacheable_tokens
+
+
+def test_cost_model_prefers_inline_for_a_single_request(monkeypatch):
+    monkeypatch.delenv("GEMINI_CACHE_MIN_TOKENS", raising=False)
+    assert inline_is_cheaper(50_000, expected_requests=1)
+    assert not inline_is_cheaper(50_000, expected_requests=3)
+    assert min_cacheable_tokens("models/gemini-1.5-pro") == 32_768
+    assert min_cacheable_tokens("gemini-2.5-flash") == 1_024
+
+
+def test_registry_shares_one_cache_between_concurrent_users(monkeypatch):
+    monkeypatch.setenv("GEMINI_CONTEXT_CACHE", "always")
+    registry = ContextCacheRegistry(ttl_seconds=60)
+    created = []
+
+    async def create(ttl):
+        await asyncio.sleep(0.01)
+        created.append(ttl)
+        return f"caches/{len(created)}"
+
+    async def update(name, ttl):
+        pass
+
+    async def user(transcript):
+        async with registry.use("m", transcript, "sys", 3, create, update) as name:
+            await asyncio.sleep(0.01)
+            return name
+
+    async def main():
+        names = await asyncio.gather(user("t"), user("t"), user("other"))
+        deleted = []
+
+        async def delete(name):
+            deleted.append(name)
+
+        await registry.close(delete)
+        return names, deleted
+
+    names, deleted = asyncio.run(main())
+    assert names[0] == names[1] != names[2]
+    assert created == [60, 60]
+    assert sorted(deleted) == sorted(set(names))
+
+
+def test_registry_extends_ttl_while_in_use(monkeypatch):
+    monkeypatch.setenv("GEMINI_CONTEXT_CACHE", "always")
+    registry = ContextCacheRegistry(ttl_seconds=3)
+    updates = []
+
+    async def create(ttl):
+        return "caches/1"
+
+    async def update(name, ttl):
+        updates.append((name, ttl))
+
+    async def main():
+        async with registry.use("m", "t", "sys", 3, create, update):
+            await asyncio.sleep(2.2)
+        # Idle caches are no longer extended
+        await asyncio.sleep(1.2)
+
+    start = time.monotonic()
+    asyncio.run(main())
+    assert time.monotonic() - start >= 3.4
+    assert updates == [("caches/1", 3)]
+
+
+def test_registry_falls_back_to_inline_when_creation_fails(monkeypatch):
+    monkeypatch.setenv("GEMINI_CONTEXT_CACHE", "always")
+    registry = ContextCacheRegistry()
+
+    async def create(ttl):
+        raise RuntimeError("cached content is too small")
+
+    async def update(name, ttl):
+        pass
+
+    async def main():
+        async with registry.use("m", "t", "sys", 3, create, update) as name:
+            return name
+
+    assert asyncio.run(main()) is None
+
+
+def test_replaced_cache_is_deleted_once_released(monkeypatch):
+    monkeypatch.setenv("GEMINI_CONTEXT_CACHE", "always")
+    registry = ContextCacheRegistry(ttl_seconds=60)
+    created = []
+    deleted = []
+
+    async def create(ttl):
+        created.append(ttl)
+        return f"caches/{len(created)}"
+
+    async def update(name, ttl):
+        raise RuntimeError("update failed")
+
+    async def delete(name):
+        deleted.append(name)
+
+    async def main():
+        async with registry.use("m", "t", "sys", 3, create, update, delete) as first:
+            # The first cache is about to expire while still in use, so a second one replaces it
+            registry._entries[registry.key("m", "t", "sys")].expires_at = time.time() + 1
+            async with registry.use("m", "t", "sys", 3, create, update, delete) as second:
+                assert deleted == []
+            assert deleted == []
+        assert deleted == [first]
+        await registry.close(delete)
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first != second
+    assert deleted == [first, second]
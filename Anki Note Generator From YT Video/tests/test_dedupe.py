@@ -0,0 +1,105 @@
+import sys
+from pathlib import Path
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from dedupe import CardDeduper, NearDuplicateIndex
+from schemas import FlashcardsResponse
+
+_TEXT = "What does the mitochondria produce in a eukaryotic cell during aerobic respiration and why"
+
+
+def _cards(*qa, topic="Biology"):
+    cards = [dict(zip(("question", "answer", "explanation"), card)) for card in qa]
+    return FlashcardsResponse.model_validate({"decks": [{"topic": topic, "cards": cards}]})
+
+
+def test_signature_similarity_tracks_overlap():
+    index = NearDuplicateIndex()
+    base = index.signature(_TEXT)
+    index.add(base, "v", "base")
+
+    assert index.similarity(index.signature(_TEXT.upper() + "?"), 0) == 1.0
+    assert index.query(index.signature(_TEXT.replace("why", "how"))) is not None
+    assert index.query(index.signature("Name the capital city of France and its river")) is None
+    assert index.signature("?!") is None
+
+
+def test_deduper_drops_across_videos_and_merges_within_one():
+    index = NearDuplicateIndex()
+    first = CardDeduper(index, "video1")
+    kept = first.dedupe(_cards((_TEXT, "ATP"), ("Unrelated question about plants", "Photosynthesis")))
+    assert sum(len(d.cards) for d in kept.decks) == 2
+
+    second = CardDeduper(index, "video2", mode="merge")
+    result = second.dedupe(
+        _cards(
+            (_TEXT + "?", "ATP"),
+            ("How do plate tectonics shape the continents over time", "Slowly, through convection"),
+            ("How do plate tectonics shape the continents over time?", "Slowly through convection", "Heat from the core"),
+        )
+    )
+    cards = [c for d in result.decks for c in d.cards]
+    assert [c.answer for c in cards] == ["Slowly, through convection"]
+    assert cards[0].explanation == "Heat from the core"
+    assert [r.action for r in second.removed] == ["dropped", "merged"]
+    assert second.removed[0].duplicate_of.startswith("video1::")
+
+
+def test_rerunning_a_video_does_not_match_its_own_cards():
+    index = NearDuplicateIndex()
+    CardDeduper(index, "video1").dedupe(_cards((_TEXT, "ATP")))
+    again = CardDeduper(index, "video1")
+    assert sum(len(d.cards) for d in again.dedupe(_cards((_TEXT, "ATP"))).decks) == 1
+    assert again.removed == []
+
+
+def test_index_persists_and_rebuilds(tmp_path):
+    path = str(tmp_path / "dedupe.idx")
+    index = NearDuplicateIndex()
+    for i in range(5000):
+        index.check_and_add(f"card number {i} about topic {i * 7} with detail {i * 13}", "v", f"card {i}")
+    index.save(path)
+
+    loaded = NearDuplicateIndex.load(path)
+    assert len(loaded) == 5000
+    card_id, similarity = loaded.check_and_add("card number 1234 about topic 8638 with detail 16042", "w", "copy")
+    assert similarity == 1.0 and loaded.label(card_id) == "v::card 1234"
+    assert len(NearDuplicateIndex.load(path, num_perm=32, bands=8)) == 0
+
+
+def test_rollback_forgets_a_failed_video_and_restores_its_previous_run():
+    index = NearDuplicateIndex()
+    CardDeduper(index, "video1").dedupe(_cards((_TEXT, "ATP")))
+
+    failed = CardDeduper(index, "video1")
+    failed.dedupe(_cards(("How do plate tectonics shape the continents over time", "Slowly")))
+    failed.rollback()
+
+    other = CardDeduper(index, "video2")
+    kept = other.dedupe(_cards(("How do plate tectonics shape the continents over time", "Slowly"), (_TEXT, "ATP")))
+    assert [c.question for d in kept.decks for c in d.cards] == ["How do plate tectonics shape the continents over time"]
+    assert other.removed[0].duplicate_of.startswith("video1::")
+
+
+def test_load_reads_band_tables_without_rehashing(tmp_path, monkeypatch):
+    path = str(tmp_path / "dedupe.idx")
+    index = NearDuplicateIndex()
+    for i in range(300):
+        index.check_and_add(f"card number {i} about topic {i * 7} with detail {i * 13}", "v", f"card {i}")
+    CardDeduper(index, "gone").dedupe(_cards(("Something only the removed video said", "x")))
+    index.remove_source("gone")
+    index.save(path)
+
+    def no_rehash(self, sig):
+        raise AssertionError("band keys recomputed on load")
+
+    monkeypatch.setattr(NearDuplicateIndex, "_band_keys", no_rehash)
+    loaded = NearDuplicateIndex.load(path)
+    assert len(loaded) == 300
+    assert [tuple(map(list, t)) for t in loaded._frozen] == [tuple(map(list, t)) for t in index._frozen]
+    monkeypatch.undo()
+    assert loaded.check_and_add("card number 42 about topic 294 with detail 546", "w", "copy")[1] == 1.0
@@ -65,3 +65,67 @@ def test_flashcards_response_and_deck(tmp_path: Path):
     assert os.path.getsize(path) > 0
 
 
+def _deck(topic_answers):
+    return FlashcardsResponse.model_validate(
+        {
+            "decks": [
+                {"topic": topic, "cards": [{"type": "qa", "question": f"What is {topic}?", "answer": answer}]}
+                for topic, answer in topic_answers
+            ]
+        }
+    )
+
+
+def test_note_guids_are_stable_across_formatting():
+    from anki_creator import note_guid
+    from schemas import CardQA
+
+    a = note_guid("vid", "Algebra", CardQA(question="What is  x?", answer="A variable"))
+    b = note_guid("vid", "algebra", CardQA(question="what is x?\n", answer="a variable"))
+    assert a == b
+    assert a != note_guid("other", "Algebra", CardQA(question="What is x?", answer="A variable"))
+
+
+def test_incremental_write_packages_only_changed_topics(tmp_path):
+    import sqlite3
+    import zipfile
+
+    from anki_creator import DeckBuilder, load_manifest, update_path
+
+    def note_count(path):
+        db = tmp_path / "collection.anki2"
+        with zipfile.ZipFile(path) as z:
+            db.write_bytes(z.read("collection.anki2"))
+        with sqlite3.connect(db) as conn:
+            return conn.execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+
+    out = str(tmp_path / "deck.apkg")
+    first = DeckBuilder("Deck", source_id="vid")
+    first.add_flashcards(_deck([("A", "1"), ("B", "2")]))
+    first.write(out, incremental=True)
+    assert sorted(first.changed) == ["A", "B"]
+    assert set(load_manifest(out)["topics"]) == {"A", "B"}
+    assert first.update_path is None and not os.path.exists(update_path(out))
+
+    second = DeckBuilder("Deck", source_id="vid")
+    second.add_flashcards(_deck([("B", "2"), ("A", "changed"), ("C", "3")]))
+    mtime = os.path.getmtime(out)
+    assert second.write(out, incremental=True) == second.update_path
+    assert sorted(second.changed) == ["A", "C"]
+    # Only the delta is written, next to the package, which is left alone
+    assert second.update_path == update_path(out) == str(tmp_path / "deck.update.apkg")
+    assert (note_count(out), note_count(second.update_path)) == (2, 2)
+    assert os.path.getmtime(out) == mtime
+    assert set(load_manifest(out)["topics"]) == {"A", "B", "C"}
+
+    mtime = os.path.getmtime(out)
+    third = DeckBuilder("Deck", source_id="vid")
+    third.add_flashcards(_deck([("C", "3"), ("A", "changed"), ("B", "2")]))
+    third.write(out, incremental=True)
+    assert third.changed == []
+    assert os.path.getmtime(out) == mtime
+
+    fourth = DeckBuilder("Deck", source_id="vid")
+    fourth.add_flashcards(_deck([("C", "3"), ("A", "changed"), ("B", "2"), ("D", "4")]))
+    assert fourth.write(out, incremental=True, rebuild_full=True) == out
+    assert (note_count(out), note_count(fourth.update_path)) == (4, 1)
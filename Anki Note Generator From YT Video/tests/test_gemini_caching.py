@@ -17,23 +17,32 @@ class _DummyGenerateContentConfig:
 class _FakeCaches:
     def __init__(self):
         self.last_create_kwargs = None
+        self.created = 0
+        self.deleted = []
 
     def create(self, **kwargs):
         self.last_create_kwargs = kwargs
+        self.created += 1
         # Return an object carrying a name attribute like the real API
         return SimpleNamespace(name="projects/demo/locations/us/cachedContents/123")
 
+    def update(self, *, name, config):
+        return SimpleNamespace(name=name)
+
+    def delete(self, *, name):
+        self.deleted.append(name)
+
 
 class _FakeModels:
     def __init__(self):
         self.calls = []
 
-    def generate_content(self, *, model, contents, config=None, cached_content=None):
-        # record the arguments for assertions
+    def generate_content(self, *, model, contents, config=None):
+        # record the arguments for assertions; the cache name travels in the config
         self.calls.append({
             "model": model,
             "contents": contents,
-            "cached_content": cached_content,
+            "cached_content": (getattr(config, "kwargs", None) or {}).get("cached_content"),
         })
 
         # Create a minimal response object with .text like google.genai returns
@@ -54,18 +63,54 @@ class _FakeModels:
         return SimpleNamespace(text=text)
 
 
+class _AsyncView:
+    """Mirror of the sync fakes under `client.aio` with awaitable methods."""
+
+    def __init__(self, target):
+        self._target = target
+
+    def __getattr__(self, name):
+        method = getattr(self._target, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+
+        return call
+
+
 class _FakeGenAIClient:
     def __init__(self, *_, **__):
         self.caches = _FakeCaches()
         self.models = _FakeModels()
+        self.aio = SimpleNamespace(caches=_AsyncView(self.caches), models=_AsyncView(self.models))
 
 
-def test_gemini_uses_context_cache_and_omits_transcript(monkeypatch):
-    import gemini_client as gc
+def _patch_client(monkeypatch, gc, cache_mode="always"):
+    import context_cache
 
     # Monkeypatch the google.genai client and types
     monkeypatch.setattr(gc, "genai", SimpleNamespace(Client=_FakeGenAIClient))
-    monkeypatch.setattr(gc, "types", SimpleNamespace(GenerateContentConfig=_DummyGenerateContentConfig))
+    monkeypatch.setattr(gc, "_CLIENT", None)
+    monkeypatch.setattr(
+        gc,
+        "types",
+        SimpleNamespace(
+            GenerateContentConfig=_DummyGenerateContentConfig,
+            CreateCachedContentConfig=_DummyGenerateContentConfig,
+            UpdateCachedContentConfig=_DummyGenerateContentConfig,
+        ),
+    )
+    monkeypatch.setattr(context_cache, "_REGISTRY", None)
+    monkeypatch.setenv("GOOGLE_API_KEY", "test-key")
+    # Test transcripts are far below the real minimum cacheable size
+    monkeypatch.setenv("GEMINI_CONTEXT_CACHE", cache_mode)
+
+
+def test_gemini_uses_context_cache_and_omits_transcript(monkeypatch):
+    import gemini_client as gc
+
+    _patch_client(monkeypatch, gc)
+    monkeypatch.delenv("LLM_TOPICS_CHUNK_TOKENS", raising=False)
 
     # Ensure environment is set so code path selects gemini and model name
     transcript = "THIS IS THE TRANSCRIPT. DO NOT ECHO THIS INTO PROMPTS."
@@ -82,8 +127,8 @@ def test_gemini_uses_context_cache_and_omits_transcript(monkeypatch):
 
     # 1) Cache was created with 5 minute TTL and contains the transcript
     assert client.caches.last_create_kwargs is not None
-    create_kwargs = client.caches.last_create_kwargs
-    assert create_kwargs.get("model") == "models/test-model"
+    assert client.caches.last_create_kwargs.get("model") == "models/test-model"
+    create_kwargs = client.caches.last_create_kwargs["config"].kwargs
     # ttl could be provided as string or seconds field; accept either
     assert (create_kwargs.get("ttl") == "300s") or (create_kwargs.get("ttlSeconds") == 300)
 
@@ -100,3 +145,68 @@ def test_gemini_uses_context_cache_and_omits_transcript(monkeypatch):
         assert "THIS IS THE TRANSCRIPT" not in (call.get("contents") or "")
 
 
+def test_gemini_client_is_shared_across_calls_until_closed(monkeypatch):
+    import gemini_client as gc
+
+    _patch_client(monkeypatch, gc)
+
+    async def main():
+        first = await gc.open_client()
+        await gc.generate_topics_and_flashcards("transcript", model="models/test-model")
+        await gc.generate_topics_and_flashcards("transcript", model="models/test-model")
+        shared = gc._CLIENT
+        await gc.close_client()
+        return first, shared
+
+    first, shared = asyncio.run(main())
+    assert first is shared
+    assert len(shared.models.calls) == 4
+    assert gc._CLIENT is None
+    # The second pass reused the live context cache, and closing deleted it
+    assert shared.caches.created == 1
+    assert shared.caches.deleted == ["projects/demo/locations/us/cachedContents/123"]
+
+
+def test_gemini_sends_small_transcripts_inline(monkeypatch):
+    import gemini_client as gc
+
+    _patch_client(monkeypatch, gc, cache_mode="auto")
+    monkeypatch.delenv("GEMINI_CACHE_MIN_TOKENS", raising=False)
+    monkeypatch.delenv("LLM_TOPICS_CHUNK_TOKENS", raising=False)
+
+    topics, _ = asyncio.run(gc.generate_topics_and_flashcards("SHORT TRANSCRIPT", model="models/gemini-2.5-pro"))
+
+    client = gc._LAST_FAKE_CLIENT
+    assert topics.topics[0].title == "A"
+    assert client.caches.created == 0
+    assert all(call["cached_content"] is None for call in client.models.calls)
+    assert all("SHORT TRANSCRIPT" in call["contents"] for call in client.models.calls)
+
+
+def test_flashcards_response_schema_builds_a_real_gemini_request(monkeypatch):
+    # Real SDK client: the request is built and validated, then stopped before any network I/O
+    from google import genai
+
+    import gemini_client as gc
+    from schemas import FlashcardsSchema, TopicsResponse
+
+    class _Sent(Exception):
+        pass
+
+    client = genai.Client(api_key="test")
+
+    async def fake_request(http_method, path, request_dict, http_options=None):
+        raise _Sent(request_dict)
+
+    monkeypatch.setattr(client._api_client, "async_request", fake_request)
+
+    for schema in (TopicsResponse, FlashcardsSchema):
+        config = gc._generate_config(1024, schema, None)
+        try:
+            asyncio.run(client.aio.models.generate_content(model="gemini-2.5-flash", contents="x", config=config))
+        except _Sent as sent:
+            request = sent.args[0]
+        assert "responseSchema" in request["generationConfig"]
+
+    cards = request["generationConfig"]["responseSchema"]["properties"]["decks"]["items"]["properties"]["cards"]
+    assert "any_of" in cards["items"]
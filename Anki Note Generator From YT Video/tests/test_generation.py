@@ -0,0 +1,368 @@
+import sys
+import asyncio
+import json
+from pathlib import Path
+from types import SimpleNamespace
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import pytest
+
+from generation import extract_topics_chunked, merge_topics, split_transcript
+from schemas import TopicsResponse
+
+
+def test_split_transcript_windows_overlap_and_cover_everything():
+    words = [f"w{i}" for i in range(2000)]
+    transcript = " ".join(words)
+
+    chunks = split_transcript(transcript, chunk_tokens=500, overlap_tokens=50)
+
+    assert len(chunks) > 1
+    assert all(len(c) <= 500 * 4 for c in chunks)
+    # Consecutive windows share text and together contain every word
+    assert chunks[0].split()[-1] in chunks[1]
+    seen = set()
+    for chunk in chunks:
+        seen.update(chunk.split())
+    assert seen == set(words)
+    assert split_transcript("short text", chunk_tokens=500) == ["short text"]
+
+
+def test_merge_topics_deduplicates_by_normalized_title():
+    a = TopicsResponse.model_validate(
+        {"topics": [{"title": "Linear Algebra", "subtopics": [{"title": "Vectors", "key_points": ["add", "scale"]}]}]}
+    )
+    b = TopicsResponse.model_validate(
+        {
+            "topics": [
+                {"title": "linear algebra!", "subtopics": [{"title": "vectors", "summary": "s", "key_points": ["Scale", "dot"]}]},
+                {"title": "Calculus", "subtopics": []},
+            ]
+        }
+    )
+
+    merged = merge_topics([a, b])
+
+    assert [t.title for t in merged.topics] == ["Linear Algebra", "Calculus"]
+    vectors = merged.topics[0].subtopics[0]
+    assert vectors.summary == "s"
+    assert vectors.key_points == ["add", "scale", "dot"]
+
+
+def test_extract_topics_chunked_respects_parallelism():
+    active = 0
+    peak = 0
+
+    async def complete(prompt: str) -> str:
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return json.dumps({"topics": [{"title": "Shared", "subtopics": [{"title": f"part {len(prompt) % 3}"}]}]})
+
+    transcript = " ".join(f"word{i}" for i in range(5000))
+    topics = asyncio.run(extract_topics_chunked(transcript, complete, json.loads, chunk_tokens=1000, parallelism=2))
+
+    assert peak == 2
+    assert [t.title for t in topics.topics] == ["Shared"]
+
+
+def test_groq_client_uses_chunked_topics(monkeypatch):
+    import groq_client
+
+    prompts = []
+
+    async def create(*, model, messages, temperature, max_tokens):
+        prompt = messages[0]["content"]
+        prompts.append(prompt)
+        if "Topics JSON:" in prompt:
+            content = '{"decks":[{"topic":"A","cards":[{"type":"qa","question":"q","answer":"a"}]}]}'
+        else:
+            content = '{"topics":[{"title":"A","subtopics":[]}]}'
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    fake = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(groq_client, "_get_groq_client", lambda: fake)
+
+    transcript = " ".join(f"word{i}" for i in range(3000))
+    topics, flashcards = asyncio.run(
+        groq_client.generate_topics_and_flashcards(transcript, "m", chunk_tokens=1000, chunk_parallelism=3)
+    )
+
+    topic_prompts = [p for p in prompts if "Topics JSON:" not in p]
+    assert len(topic_prompts) > 1
+    assert [t.title for t in topics.topics] == ["A"]
+    assert flashcards.decks[0].topic == "A"
+
+
+def test_per_topic_fanout_keeps_topic_order_and_retries_failed_unit():
+    from generation import generate_flashcards_per_topic
+
+    topics = TopicsResponse.model_validate(
+        {
+            "topics": [
+                {"title": "A", "subtopics": [{"title": "A1"}, {"title": "A2"}]},
+                {"title": "B", "subtopics": []},
+            ]
+        }
+    )
+    attempts = {}
+
+    async def complete(prompt: str) -> str:
+        unit = "A2" if '"A2"' in prompt else "A1" if '"A1"' in prompt else "B"
+        attempts[unit] = attempts.get(unit, 0) + 1
+        # Finish in reverse order, and fail A2 once
+        await asyncio.sleep({"A1": 0.03, "A2": 0.02, "B": 0.01}[unit])
+        if unit == "A2" and attempts[unit] == 1:
+            raise RuntimeError("rate limited")
+        return json.dumps({"decks": [{"topic": "x", "cards": [{"type": "qa", "question": unit, "answer": "a"}]}]})
+
+    flashcards = asyncio.run(generate_flashcards_per_topic(topics, complete, json.loads, parallelism=3, retries=1))
+
+    assert [(d.topic, d.subtopic, d.cards[0].question) for d in flashcards.decks] == [
+        ("A", "A1", "A1"),
+        ("A", "A2", "A2"),
+        ("B", None, "B"),
+    ]
+    assert attempts == {"A1": 1, "A2": 2, "B": 1}
+
+
+def _chunked_stream(texts_by_prompt, events, delay=0.005):
+    """Fake streaming completion that yields the response a few characters at a time."""
+
+    async def complete_stream(prompt, on_text):
+        text = texts_by_prompt(prompt)
+        for i in range(0, len(text), 8):
+            await asyncio.sleep(delay)
+            on_text(text[i : i + 8], 0)
+        events.append(("done", prompt[:20]))
+        return text
+
+    return complete_stream
+
+
+def test_stream_flashcards_delivers_cards_before_completion_ends():
+    from generation import stream_flashcards
+
+    events = []
+    text = json.dumps(
+        {
+            "decks": [
+                {"topic": "A", "cards": [{"type": "qa", "question": "q1", "answer": "a"}, {"type": "qa", "question": "q2", "answer": "a"}]},
+                # Topic written after the cards: held until the deck closes
+                {"cards": [{"type": "qa", "question": "q3", "answer": "a"}], "topic": "B", "subtopic": "b"},
+            ]
+        }
+    )
+
+    def on_card(topic, subtopic, card):
+        events.append(("card", topic, subtopic, card.question))
+
+    decks = asyncio.run(stream_flashcards("prompt", _chunked_stream(lambda p: text, events), json.loads, on_card))
+
+    assert events == [
+        ("card", "A", None, "q1"),
+        ("card", "A", None, "q2"),
+        ("card", "B", "b", "q3"),
+        ("done", "prompt"),
+    ]
+    assert [(d.topic, len(d.cards)) for d in decks] == [("A", 2), ("B", 1)]
+
+
+def test_stream_flashcards_falls_back_to_full_parse_for_non_strict_json():
+    from generation import stream_flashcards
+
+    events = []
+    text = "{'decks': [{'topic': 'A', 'cards': [{'type': 'qa', 'question': 'q', 'answer': 'a'}]}]}"
+    cards = []
+
+    def parse(raw):
+        return json.loads(raw.replace("'", '"'))
+
+    decks = asyncio.run(
+        stream_flashcards("p", _chunked_stream(lambda p: text, events), parse, lambda t, s, c: cards.append(c.question))
+    )
+    assert cards == ["q"]
+    assert decks[0].topic == "A"
+
+
+def test_stream_flashcards_reparses_a_document_that_yielded_nothing():
+    from generation import stream_flashcards
+    from json_extract import extract_json
+
+    events = []
+    # An earlier object closes first, so the stream completes without a single card
+    text = 'Format: {"note": "json"}\n```json\n' + json.dumps({"decks": [_deck("A", "q")]}) + "\n```"
+    cards = []
+
+    decks = asyncio.run(
+        stream_flashcards(
+            "p",
+            _chunked_stream(lambda p: text, events),
+            lambda raw: extract_json(raw).value,
+            lambda t, s, c: cards.append(c.question),
+        )
+    )
+    assert cards == ["q"]
+    assert decks[0].topic == "A"
+
+
+def test_topics_stream_starts_flashcards_before_topics_finish():
+    from generation import stream_topics_and_flashcards
+
+    events = []
+    topics_text = json.dumps(
+        {"topics": [{"title": "First", "subtopics": []}] + [{"title": f"T{i}", "subtopics": []} for i in range(1, 4)]}
+    )
+
+    def respond(prompt):
+        if prompt.startswith("TOPICS"):
+            return topics_text
+        topic = prompt.split("\nTopic: ", 1)[1].split("\n", 1)[0]
+        return json.dumps({"decks": [{"topic": "x", "cards": [{"type": "qa", "question": topic, "answer": "a"}]}]})
+
+    def on_card(topic, subtopic, card):
+        events.append(("card", topic))
+
+    topics, flashcards = asyncio.run(
+        stream_topics_and_flashcards("TOPICS", _chunked_stream(respond, events), json.loads, on_card, parallelism=4)
+    )
+
+    assert [t.title for t in topics.topics] == ["First", "T1", "T2", "T3"]
+    # Decks keep topic order and are pinned to their topic
+    assert [d.topic for d in flashcards.decks] == ["First", "T1", "T2", "T3"]
+    assert events.index(("card", "First")) < events.index(("done", "TOPICS"))
+
+
+def test_groq_streaming_passes_cards_to_sink(monkeypatch):
+    import groq_client
+
+    content = '{"decks":[{"topic":"A","cards":[{"type":"qa","question":"q","answer":"a"}]}]}'
+
+    class _Stream:
+        def __init__(self, text):
+            self.chunks = [text[i : i + 5] for i in range(0, len(text), 5)]
+
+        def __aiter__(self):
+            return self._gen()
+
+        async def _gen(self):
+            for piece in self.chunks:
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))])
+
+    async def create(*, model, messages, temperature, max_tokens, stream=False):
+        prompt = messages[0]["content"]
+        text = content if "Topics JSON:" in prompt else '{"topics":[{"title":"A","subtopics":[]}]}'
+        if stream:
+            return _Stream(text)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+    fake = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(groq_client, "_get_groq_client", lambda: fake)
+    monkeypatch.delenv("LLM_TOPICS_CHUNK_TOKENS", raising=False)
+    cards = []
+
+    topics, flashcards = asyncio.run(
+        groq_client.generate_topics_and_flashcards(
+            "transcript", "m", per_topic=False, stream=True, on_card=lambda t, s, c: cards.append((t, c.question))
+        )
+    )
+
+    assert cards == [("A", "q")]
+    assert flashcards.decks[0].cards[0].question == "q"
+
+
+def _deck(topic, *questions, subtopic=None):
+    return {"topic": topic, "subtopic": subtopic, "cards": [{"type": "qa", "question": q, "answer": "a"} for q in questions]}
+
+
+_THREE_TOPICS = TopicsResponse.model_validate(
+    {"topics": [{"title": "A", "subtopics": []}, {"title": "B", "subtopics": []}, {"title": "C", "subtopics": []}]}
+)
+
+
+def _truncated_first_response():
+    full = json.dumps({"decks": [_deck("A", "a1", "a2"), _deck("B", "b1", "b2")]})
+    # Cut inside B's second card
+    return full[: full.index("b2") - 5]
+
+
+def test_salvage_keeps_complete_decks_and_finished_cards():
+    from generation import salvage_flashcards
+
+    salvaged = salvage_flashcards(_truncated_first_response())
+
+    assert [(d.topic, [c.question for c in d.cards]) for d in salvaged.complete] == [("A", ["a1", "a2"])]
+    assert salvaged.partial.topic == "B" and [c.question for c in salvaged.partial.cards] == ["b1"]
+    assert salvage_flashcards(json.dumps({"decks": []})) is None
+
+
+def test_truncated_flashcards_continue_only_for_missing_topics():
+    from generation import generate_flashcards_with_recovery
+
+    prompts = []
+
+    async def complete(prompt):
+        prompts.append(prompt)
+        if len(prompts) == 1:
+            return _truncated_first_response()
+        return json.dumps({"decks": [_deck("B", "b1", "b2"), _deck("C", "c1")]})
+
+    flashcards = asyncio.run(
+        generate_flashcards_with_recovery(_THREE_TOPICS, lambda topics_json: json.dumps(topics_json), complete, json.loads)
+    )
+
+    assert len(prompts) == 2
+    assert [t["title"] for t in json.loads(prompts[1])["topics"]] == ["B", "C"]
+    assert [(d.topic, [c.question for c in d.cards]) for d in flashcards.decks] == [
+        ("A", ["a1", "a2"]),
+        ("B", ["b1", "b2"]),
+        ("C", ["c1"]),
+    ]
+
+
+def test_prose_or_cut_off_preamble_is_not_treated_as_truncated():
+    from generation import generate_flashcards_with_recovery, salvage_flashcards
+
+    for text in ["I cannot help with that.", "", '{"decks": [{"topic": "A", "cards": [']:
+        prompts = []
+
+        async def complete(prompt):
+            prompts.append(prompt)
+            return text
+
+        assert salvage_flashcards(text) is None
+        with pytest.raises(ValueError):
+            asyncio.run(
+                generate_flashcards_with_recovery(
+                    _THREE_TOPICS, lambda topics_json: json.dumps(topics_json), complete, json.loads
+                )
+            )
+        assert len(prompts) == 1
+
+
+def test_truncated_stream_continues_without_repeating_cards():
+    from generation import stream_flashcards
+
+    events = []
+    responses = [_truncated_first_response(), json.dumps({"decks": [_deck("B", "b1", "b2"), _deck("C", "c1")]})]
+    cards = []
+
+    decks = asyncio.run(
+        stream_flashcards(
+            "first",
+            _chunked_stream(lambda prompt: responses.pop(0), events, delay=0),
+            json.loads,
+            lambda topic, subtopic, card: cards.append((topic, card.question)),
+            topics=_THREE_TOPICS,
+            prompt_for=lambda topics_json: json.dumps(topics_json),
+        )
+    )
+
+    assert cards == [("A", "a1"), ("A", "a2"), ("B", "b1"), ("B", "b2"), ("C", "c1")]
+    assert [d.topic for d in decks] == ["A", "B", "C"]
@@ -0,0 +1,167 @@
+import sys
+import asyncio
+from pathlib import Path
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import pytest
+
+import hedging
+from hedging import LatencyTracker, hedge_delay, run_hedged
+
+
+def _attempt(result, delay=0.0, error=None, cards=(), card_delay=0.0, log=None):
+    async def run(sink):
+        try:
+            await asyncio.sleep(card_delay)
+            for card in cards:
+                sink("topic", None, card)
+            await asyncio.sleep(delay)
+            if error is not None:
+                raise error
+            return result
+        except asyncio.CancelledError:
+            if log is not None:
+                log.append(f"{result} cancelled")
+            raise
+
+    return run
+
+
+def test_fails_over_when_the_primary_errors():
+    result = asyncio.run(run_hedged([_attempt("a", error=RuntimeError("503")), _attempt("b")]))
+    assert result == ("b", 1)
+
+
+def test_errors_propagate_when_every_attempt_fails():
+    with pytest.raises(ValueError):
+        asyncio.run(run_hedged([_attempt("a", error=RuntimeError("503")), _attempt("b", error=ValueError("bad"))]))
+    with pytest.raises(RuntimeError):
+        asyncio.run(run_hedged([_attempt("a", error=RuntimeError("503"))]))
+
+
+def test_hedges_a_slow_primary_and_cancels_the_loser():
+    log = []
+    result = asyncio.run(
+        run_hedged([_attempt("a", delay=5, log=log), _attempt("b", delay=0.01, log=log)], hedge_after=0.05)
+    )
+    assert result == ("b", 1)
+    assert log == ["a cancelled"]
+
+
+def test_fast_primary_never_starts_the_backup():
+    started = []
+
+    async def backup(sink):
+        started.append(1)
+        return "b"
+
+    assert asyncio.run(run_hedged([_attempt("a", delay=0.01), backup], hedge_after=0.2)) == ("a", 0)
+    assert started == []
+
+
+def test_timeout_fails_over():
+    assert asyncio.run(run_hedged([_attempt("a", delay=5), _attempt("b")], timeout=0.05)) == ("b", 1)
+
+
+def test_cards_come_from_the_first_attempt_to_emit():
+    cards = []
+    log = []
+
+    def sink(topic, subtopic, card):
+        cards.append(card)
+
+    result = asyncio.run(
+        run_hedged(
+            [
+                _attempt("a", cards=["a1", "a2"], card_delay=0.2, delay=0.1, log=log),
+                _attempt("b", cards=["b1", "b2"], card_delay=0.02, delay=0.05, log=log),
+            ],
+            on_card=sink,
+            hedge_after=0.01,
+        )
+    )
+    assert result == ("b", 1)
+    assert cards == ["b1", "b2"]
+    assert log == ["a cancelled"]
+
+
+def test_no_failover_after_cards_were_delivered():
+    cards = []
+    attempts = [_attempt("a", cards=["a1"], error=RuntimeError("stream broke")), _attempt("b", cards=["b1"])]
+    with pytest.raises(RuntimeError):
+        asyncio.run(run_hedged(attempts, on_card=lambda *args: cards.append(args[2])))
+    assert cards == ["a1"]
+
+
+def test_hedge_delay_uses_observed_p95(monkeypatch):
+    tracker = LatencyTracker(min_samples=5)
+    monkeypatch.setattr(hedging, "_TRACKER", tracker)
+    assert hedge_delay("groq:m") == hedging.DEFAULT_HEDGE_AFTER_SECONDS
+    for seconds in range(1, 21):
+        tracker.record("groq:m", float(seconds))
+    assert tracker.percentile("groq:m") == 19.0
+    assert hedge_delay("groq:m") == 19.0
+    assert hedge_delay("groq:m", after=3.0) == 3.0
+
+
+def test_generator_fails_over_to_the_other_provider(monkeypatch):
+    import model_selection
+
+    for name in ("GROQ_MODEL", "GEMINI_MODEL", "LLM_TOPICS_CHUNK_TOKENS", "LLM_ROUTING", "LLM_HEDGE", "LLM_HEDGE_MODEL"):
+        monkeypatch.delenv(name, raising=False)
+    calls = []
+
+    def fake_provider(provider):
+        async def gen(transcript, model=None, **kwargs):
+            calls.append((provider, model))
+            if provider == "groq":
+                raise RuntimeError("groq is down")
+            return "topics", "flashcards"
+
+        return gen
+
+    monkeypatch.setattr(model_selection, "_provider_generator", fake_provider)
+    monkeypatch.delenv("GOOGLE_API_KEY", raising=False)
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    with pytest.raises(RuntimeError):
+        asyncio.run(model_selection.get_generator("groq")("transcript"))
+
+    calls.clear()
+    monkeypatch.setenv("GOOGLE_API_KEY", "k")
+    result = asyncio.run(model_selection.get_generator("groq")("transcript"))
+    assert result == ("topics", "flashcards")
+    assert calls == [("groq", "openai/gpt-oss-120b"), ("gemini", "gemini-1.5-pro")]
+
+    calls.clear()
+    monkeypatch.setenv("LLM_HEDGE", "off")
+    with pytest.raises(RuntimeError):
+        asyncio.run(model_selection.get_generator("groq")("transcript"))
+    assert calls == [("groq", "openai/gpt-oss-120b")]
+
+
+def test_cancelled_primary_still_records_its_latency(monkeypatch):
+    import model_selection
+
+    for name in ("GROQ_MODEL", "GEMINI_MODEL", "LLM_TOPICS_CHUNK_TOKENS", "LLM_ROUTING", "LLM_HEDGE_MODEL"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("GOOGLE_API_KEY", "k")
+    monkeypatch.setenv("LLM_HEDGE", "hedge")
+    monkeypatch.setenv("LLM_HEDGE_AFTER", "0.05")
+    tracker = LatencyTracker(min_samples=1)
+    monkeypatch.setattr(hedging, "_TRACKER", tracker)
+
+    def fake_provider(provider):
+        async def gen(transcript, model=None, **kwargs):
+            await asyncio.sleep(5 if provider == "groq" else 0.1)
+            return provider, "flashcards"
+
+        return gen
+
+    monkeypatch.setattr(model_selection, "_provider_generator", fake_provider)
+    assert asyncio.run(model_selection.get_generator("groq")("transcript"))[0] == "gemini"
+    assert tracker.percentile("groq:openai/gpt-oss-120b") >= 0.1
+    assert tracker.percentile("gemini:gemini-1.5-pro") >= 0.1
@@ -0,0 +1,86 @@
+import sys
+import json
+from pathlib import Path
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import pytest
+
+from incremental_json import IncrementalJSONParser
+
+
+DOC = {
+    "decks": [
+        {
+            "topic": 'Quotes "inside" and \\ backslashes',
+            "subtopic": None,
+            "cards": [
+                {"type": "qa", "question": "q1", "answer": "a", "extra": [1, 2.5e3, True, None]},
+                {"type": "qa", "question": "brackets }] in text", "answer": "é"},
+            ],
+        },
+        {"cards": [{"type": "qa", "question": "q3", "answer": "x"}], "topic": "B"},
+    ]
+}
+
+
+@pytest.mark.parametrize("step", [1, 3, 17, 10_000])
+def test_emits_each_value_as_it_closes_for_any_chunking(step):
+    text = "Here you go:\n```json\n" + json.dumps(DOC, indent=2) + "\n```\ntrailing prose {"
+    parser = IncrementalJSONParser([("decks", "*", "cards", "*"), ("decks", "*")])
+    items = []
+    for i in range(0, len(text), step):
+        items.extend(parser.feed(text[i : i + step]))
+
+    assert [item.path for item in items] == [
+        ("decks", 0, "cards", 0),
+        ("decks", 0, "cards", 1),
+        ("decks", 0),
+        ("decks", 1, "cards", 0),
+        ("decks", 1),
+    ]
+    assert items[1].value == DOC["decks"][0]["cards"][1]
+    assert items[0].context["topic"] == DOC["decks"][0]["topic"]
+    # The second deck's topic comes after its cards, so it is not known yet
+    assert "topic" not in items[3].context
+    assert items[4].value == DOC["decks"][1]
+    assert parser.done
+
+
+def test_first_card_is_available_before_the_document_ends():
+    text = json.dumps(DOC)
+    cut = text.index("brackets")
+    parser = IncrementalJSONParser([("decks", "*", "cards", "*")])
+    first = parser.feed(text[:cut])
+    assert [item.value["question"] for item in first] == ["q1"]
+    assert not parser.done
+
+
+def test_buffer_only_keeps_the_open_value():
+    parser = IncrementalJSONParser([("decks", "*")])
+    parser.feed('{"decks": [')
+    for i in range(200):
+        parser.feed(json.dumps({"topic": f"t{i}", "cards": []}) + ",")
+    assert len(parser._buf) < 100
+
+
+def test_malformed_input_raises_value_error():
+    parser = IncrementalJSONParser([("decks", "*")])
+    with pytest.raises(ValueError):
+        parser.feed("{'decks': [{'topic': 'single quotes'}]}")
+
+
+def test_bracketed_preamble_is_not_taken_for_the_document():
+    text = "Here are the cards [JSON]:\n" + json.dumps(DOC)
+    parser = IncrementalJSONParser([("decks", "*")])
+    assert [item.path for item in parser.feed(text)] == [("decks", 0), ("decks", 1)]
+
+
+@pytest.mark.parametrize("text", ['{"decks": ]}', "{the cards}: {}", '{"decks": [}'])
+def test_stray_or_mismatched_tokens_raise_value_error(text):
+    parser = IncrementalJSONParser([("decks", "*")])
+    with pytest.raises(ValueError):
+        parser.feed(text)
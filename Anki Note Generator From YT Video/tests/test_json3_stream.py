@@ -0,0 +1,59 @@
+import sys
+import json
+from pathlib import Path
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from json3_stream import Segment, Transcript, iter_json3_segments
+
+
+def _write_json3(path: Path) -> None:
+    payload = {
+        "wireMagic": "pb3",
+        "pens": [{}],
+        "events": [
+            {"tStartMs": 0, "dDurationMs": 1500, "segs": [{"utf8": "Hello "}, {"utf8": "wörld"}]},
+            {"tStartMs": 1500, "dDurationMs": 10, "aAppend": 1, "segs": [{"utf8": "\n"}]},
+            {"tStartMs": 1600, "dDurationMs": 0},
+            {"tStartMs": 2000, "dDurationMs": 2500, "segs": [{"utf8": "second \"line\""}]},
+            {"tStartMs": 5000, "dDurationMs": 1000, "segs": [{"utf8": "third"}]},
+        ],
+        "trailing": {"nested": [1, 2, 3]},
+    }
+    path.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+
+
+def test_streaming_reader_matches_full_parse_across_chunk_boundaries(tmp_path):
+    path = tmp_path / "subs.en.json3"
+    _write_json3(path)
+
+    for chunk_size in (3, 7, 64, 1 << 16):
+        segments = list(iter_json3_segments(str(path), chunk_size=chunk_size))
+        assert segments == [
+            Segment(0, 1500, "Hello wörld"),
+            Segment(1500, 10, "\n"),
+            Segment(2000, 2500, 'second "line"'),
+            Segment(5000, 1000, "third"),
+        ]
+
+    from transcript_extractor import _parse_json3_to_text
+
+    assert _parse_json3_to_text(str(path)) == 'Hello wörld\nsecond "line"third'
+
+
+def test_transcript_slices_by_time_and_chars(tmp_path):
+    path = tmp_path / "subs.en.json3"
+    _write_json3(path)
+    transcript = Transcript.from_segments(iter_json3_segments(str(path)))
+
+    assert len(transcript) == 4
+    assert transcript.slice_time(2000, 5000) == 'second "line"'
+    assert transcript.slice_time(0, 1600) == "Hello wörld\n"
+    assert transcript.slice_time(6000, 9000) == ""
+    start, end = transcript.char_range(5000, 6000)
+    assert transcript.slice_chars(start, end) == "third"
+    assert transcript.time_at(start) == 5000
+    assert transcript.segment(2) == Segment(2000, 2500, 'second "line"')
@@ -0,0 +1,58 @@
+import sys
+import json
+from pathlib import Path
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import pytest
+
+from json_extract import extract_json, repair_json
+
+
+def test_fast_path_ignores_prose_fences_and_trailing_braces():
+    text = 'Sure! Here it is {see below}:\n```json\n{"topics": [{"title": "A"}]}\n```\nHope this helps {:'
+    result = extract_json(text)
+    assert result.value == {"topics": [{"title": "A"}]}
+    assert result.strategy in ("raw_decode", "orjson")
+
+
+def test_single_repair_pass_handles_common_breakage():
+    text = """```json
+{
+  // topics found
+  "topics": [
+    {"title": "Line one
+line two", "done": True, "note": None, "tags": ["a", "b",],},
+  ],
+}
+```"""
+    result = extract_json(text)
+    assert result.strategy == "repaired"
+    topic = result.value["topics"][0]
+    assert topic["title"] == "Line one\nline two"
+    assert topic["done"] is True and topic["note"] is None
+    assert topic["tags"] == ["a", "b"]
+
+
+def test_repair_leaves_string_contents_alone():
+    text = '{"a": "x, ] // not a comment True", "b": [1,]}'
+    assert json.loads(repair_json(text)) == {"a": "x, ] // not a comment True", "b": [1]}
+
+
+def test_json5_is_the_last_resort():
+    result = extract_json("{ topics: [ { title: 'A', subtopics: [] } ] }")
+    assert result.strategy == "json5"
+    assert result.value == {"topics": [{"title": "A", "subtopics": []}]}
+
+
+def test_wrappers_keep_their_error_semantics():
+    from gemini_client import _strip_to_json as gemini_strip
+    from groq_client import _strip_to_json as groq_strip
+
+    assert gemini_strip("[1, 2]") == {"data": [1, 2]}
+    assert gemini_strip("nothing here") == {}
+    with pytest.raises(json.JSONDecodeError):
+        groq_strip("nothing here")
@@ -0,0 +1,78 @@
+import sys
+import json
+import time
+import threading
+from pathlib import Path
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from model_catalog import ModelCatalog
+
+_FALLBACKS = {"groq": ["groq-default"], "gemini": ["gemini-default"]}
+
+
+def _catalog(tmp_path, fetchers, **kwargs):
+    kwargs.setdefault("timeout", 2.0)
+    return ModelCatalog(fetchers, _FALLBACKS, key_for=lambda p: "key", path=str(tmp_path / "models.json"), **kwargs)
+
+
+def _slow(models, delay, calls=None):
+    def fetch():
+        if calls is not None:
+            calls.append(models)
+        time.sleep(delay)
+        return models
+
+    return fetch
+
+
+def test_providers_are_queried_concurrently_and_cached(tmp_path):
+    calls = []
+    fetchers = {"groq": _slow(["g1"], 0.3, calls), "gemini": _slow(["m1"], 0.3, calls)}
+
+    start = time.perf_counter()
+    assert _catalog(tmp_path, fetchers).list_models() == {"groq": ["g1"], "gemini": ["m1"]}
+    assert time.perf_counter() - start < 0.55
+
+    assert _catalog(tmp_path, fetchers).list_models() == {"groq": ["g1"], "gemini": ["m1"]}
+    assert len(calls) == 2
+
+
+def test_slow_provider_falls_back_and_fills_cache_later(tmp_path):
+    release = threading.Event()
+
+    def hung():
+        release.wait(5)
+        return ["late"]
+
+    catalog = _catalog(tmp_path, {"groq": _slow(["g1"], 0), "gemini": hung}, timeout=0.2)
+    assert catalog.list_models() == {"groq": ["g1"], "gemini": ["gemini-default"]}
+
+    release.set()
+    catalog._refreshing.get("gemini", threading.Thread()).join(timeout=2)
+    time.sleep(0.05)
+    assert json.loads((tmp_path / "models.json").read_text())["gemini"]["models"] == ["late"]
+
+
+def test_stale_entry_is_served_immediately_and_refreshed(tmp_path):
+    (tmp_path / "models.json").write_text(
+        json.dumps({p: {"key": "key", "models": ["old"], "fetched_at": 0} for p in ("groq", "gemini")})
+    )
+    catalog = _catalog(tmp_path, {"groq": _slow(["new"], 0.3), "gemini": _slow(["new"], 0.3)})
+
+    start = time.perf_counter()
+    assert catalog.list_models() == {"groq": ["old"], "gemini": ["old"]}
+    assert time.perf_counter() - start < 0.1
+
+    time.sleep(0.5)
+    assert json.loads((tmp_path / "models.json").read_text())["groq"]["models"] == ["new"]
+
+
+def test_entries_for_another_api_key_are_ignored(tmp_path):
+    (tmp_path / "models.json").write_text(
+        json.dumps({"groq": {"key": "other", "models": ["old"], "fetched_at": time.time()}})
+    )
+    assert _catalog(tmp_path, {"groq": _slow(["mine"], 0)}).list_models() == {"groq": ["mine"]}
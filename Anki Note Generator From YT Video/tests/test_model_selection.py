@@ -1,8 +1,11 @@
 # ruff: noqa
+import asyncio
 from pathlib import Path
 
 import types
 
+import pytest
+
 
 def test_list_models_includes_groq_and_gemini():
     from model_selection import list_models
@@ -24,3 +27,79 @@ def test_get_generator_returns_callable_for_each_provider(tmp_path: Path):
     assert isinstance(gemini_gen, types.FunctionType)
 
 
+@pytest.fixture
+def routing_env(monkeypatch):
+    for name in ("GROQ_MODEL", "GEMINI_MODEL", "LLM_TOPICS_CHUNK_TOKENS", "LLM_MODEL_INFO", "LLM_ROUTING",
+                 "LLM_ROUTE_OUTPUT_RESERVE", "GOOGLE_API_KEY", "GEMINI_API_KEY"):
+        monkeypatch.delenv(name, raising=False)
+    return monkeypatch
+
+
+def test_plan_route_sends_small_transcripts_directly(routing_env):
+    from model_selection import plan_route
+
+    route = plan_route("word " * 1000, "groq")
+
+    assert route.action == "direct"
+    assert (route.provider, route.model, route.chunk_tokens) == ("groq", "openai/gpt-oss-120b", None)
+    assert 1250 < route.prompt_tokens < 1250 + 4000
+    assert route.context_window == 131_072
+
+
+def test_plan_route_chunks_transcripts_filling_most_of_the_window(routing_env):
+    from model_selection import plan_route
+
+    route = plan_route("x" * (80_000 * 4), "groq")
+    assert (route.action, route.model, route.chunk_tokens) == ("chunked", "openai/gpt-oss-120b", 131_072 // 4)
+
+    # Chunking configured by the user is left alone
+    routing_env.setenv("LLM_TOPICS_CHUNK_TOKENS", "20000")
+    assert plan_route("x" * (80_000 * 4), "groq").chunk_tokens == 20_000
+
+
+def test_plan_route_switches_to_a_larger_context_model_or_fails_fast(routing_env):
+    from model_selection import ContextWindowError, plan_route
+
+    huge = "x" * (300_000 * 4)
+    with pytest.raises(ContextWindowError):
+        plan_route(huge, "groq")
+
+    routing_env.setenv("GOOGLE_API_KEY", "k")
+    route = plan_route(huge, "groq")
+    assert (route.action, route.provider) == ("switch", "gemini")
+    assert route.context_window >= 1_048_576 and route.chunk_tokens is None
+
+    # Overrides from env extend the table
+    routing_env.setenv("LLM_MODEL_INFO", '{"groq:big-context": {"context_window": 400000, "tokens_per_second": 50}}')
+    route = plan_route(huge, "groq")
+    assert (route.action, route.provider, route.model) == ("switch", "groq", "big-context")
+    assert route.chunk_tokens == 100_000
+
+
+def test_get_generator_routes_before_calling_the_provider(routing_env):
+    import model_selection
+
+    calls = []
+
+    async def fake_gen(transcript, model=None, **kwargs):
+        calls.append((model, kwargs))
+        return "topics", "flashcards"
+
+    routing_env.setattr(model_selection, "_provider_generator", lambda provider: fake_gen)
+    generator = model_selection.get_generator("groq")
+    assert isinstance(generator, types.FunctionType)
+
+    result = asyncio.run(generator("x" * (80_000 * 4), None, on_card=print))
+
+    assert result == ("topics", "flashcards")
+    assert calls == [("openai/gpt-oss-120b", {"chunk_tokens": 131_072 // 4, "on_card": print})]
+
+    routing_env.setenv("LLM_ROUTING", "off")
+    assert model_selection.get_generator("groq") is fake_gen
+
+
+def test_estimate_tokens_counts_non_latin_text_higher():
+    from generation import estimate_tokens
+
+    assert estimate_tokens("abcd" * 100) == 100
+    assert estimate_tokens("日本語の講義" * 100) >= 600
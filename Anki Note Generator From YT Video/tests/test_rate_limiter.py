@@ -0,0 +1,97 @@
+import sys
+import asyncio
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import pytest
+
+from rate_limiter import RateLimitScheduler, TokenBucket, retry_after
+
+
+class _StatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(status_code=status_code, headers=headers or {})
+
+
+def test_token_bucket_paces_requests_after_burst():
+    async def main():
+        bucket = TokenBucket(per_minute=600, capacity=2)  # 10 per second, burst of 2
+        start = time.monotonic()
+        for _ in range(4):
+            await bucket.acquire(1)
+        return time.monotonic() - start
+
+    elapsed = asyncio.run(main())
+    assert 0.15 <= elapsed < 1.0
+
+
+def test_scheduler_honors_retry_after_on_429():
+    scheduler = RateLimitScheduler(max_retries=3)
+    calls = []
+
+    async def request():
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise _StatusError(429, {"retry-after": "0.2"})
+        return "ok"
+
+    assert asyncio.run(scheduler.call("groq", "m", request)) == "ok"
+    assert len(calls) == 2
+    assert calls[1] - calls[0] >= 0.2
+    assert scheduler.retries == 1
+
+
+def test_scheduler_retries_5xx_and_raises_client_errors():
+    scheduler = RateLimitScheduler(max_retries=2, base_delay=0.01)
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise _StatusError(503)
+        return "ok"
+
+    assert asyncio.run(scheduler.call("gemini", "m", flaky)) == "ok"
+    assert len(attempts) == 3
+
+    async def bad_request():
+        attempts.append(1)
+        raise _StatusError(400)
+
+    attempts.clear()
+    with pytest.raises(_StatusError):
+        asyncio.run(scheduler.call("gemini", "m", bad_request))
+    assert len(attempts) == 1
+
+
+def test_scheduler_applies_per_model_limits():
+    scheduler = RateLimitScheduler(limits={"groq:small": {"rpm": 600}})
+    small = scheduler._limits_for("groq", "small")
+    other = scheduler._limits_for("groq", "other")
+    assert small.requests is not None and small.requests.rate == 10
+    assert other.requests is None
+
+
+def test_scheduler_corrects_oversized_estimates_by_what_was_charged():
+    scheduler = RateLimitScheduler(limits={"groq": {"tpm": 6000}})
+
+    async def request():
+        return "ok"
+
+    asyncio.run(scheduler.call("groq", "m", request, estimated_tokens=10000, actual_tokens=lambda _result: 100))
+    bucket = scheduler._limits_for("groq", "m").tokens
+    # 6000 was taken (the estimate clamped to capacity) and 100 used, so 5900 is refunded
+    assert 5900 <= bucket.tokens < 5901
+
+def test_retry_after_reads_gemini_retry_delay():
+    exc = Exception("quota")
+    exc.details = {"error": {"details": [{"@type": "RetryInfo", "retryDelay": "17s"}]}}
+    assert retry_after(exc) == 17.0
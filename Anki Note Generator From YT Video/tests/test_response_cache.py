@@ -0,0 +1,96 @@
+import sys
+import asyncio
+import sqlite3
+import time
+from pathlib import Path
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import response_cache
+from response_cache import ResponseCache, cache_key
+from schemas import FlashcardsResponse, TopicsResponse
+
+
+def _counting_call(calls):
+    async def call():
+        calls.append(1)
+        return f"answer {len(calls)}"
+
+    return call
+
+
+def test_get_or_call_serves_repeats_from_disk(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    calls = []
+    cache = ResponseCache(path)
+
+    first = asyncio.run(cache.get_or_call("groq", "m", "prompt", _counting_call(calls), max_tokens=10))
+    second = asyncio.run(cache.get_or_call("groq", "m", "prompt", _counting_call(calls), max_tokens=10))
+    cache.close()
+
+    assert first == second == "answer 1"
+    assert cache.stats() == {"hits": 1, "misses": 1}
+    # A new process reads the same file
+    reopened = ResponseCache(path)
+    assert asyncio.run(reopened.get_or_call("groq", "m", "prompt", _counting_call(calls), max_tokens=10)) == "answer 1"
+    assert len(calls) == 1
+
+
+def test_refresh_mode_overwrites_and_off_mode_bypasses(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    calls = []
+    asyncio.run(ResponseCache(path).get_or_call("groq", "m", "p", _counting_call(calls)))
+
+    refreshed = asyncio.run(ResponseCache(path, mode="refresh").get_or_call("groq", "m", "p", _counting_call(calls)))
+    assert refreshed == "answer 2"
+    assert asyncio.run(ResponseCache(path).get_or_call("groq", "m", "p", _counting_call(calls))) == "answer 2"
+
+    off = ResponseCache(path, mode="off")
+    assert asyncio.run(off.get_or_call("groq", "m", "p", _counting_call(calls))) == "answer 3"
+    assert len(calls) == 3
+
+
+def test_key_covers_schema_tokens_and_context():
+    base = cache_key("gemini", "m", "p", TopicsResponse, 100, "ctx")
+    assert base == cache_key("gemini", "m", "p", TopicsResponse, 100, "ctx")
+    assert base != cache_key("gemini", "m", "p", FlashcardsResponse, 100, "ctx")
+    assert base != cache_key("gemini", "m", "p", TopicsResponse, 200, "ctx")
+    assert base != cache_key("gemini", "m", "p", TopicsResponse, 100, "other")
+    assert base != cache_key("groq", "m", "p", TopicsResponse, 100, "ctx")
+
+
+def test_evicts_expired_and_least_recently_used(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), max_bytes=25, max_age_seconds=0.2)
+    cache.put("a", "x" * 10)
+    cache.put("b", "x" * 10)
+    assert cache.get("a") is not None  # "a" is now more recently used than "b"
+    cache.put("c", "x" * 10)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+    time.sleep(0.25)
+    assert cache.get("a") is None
+
+
+def test_running_size_matches_table_after_replace_and_evict(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = ResponseCache(path, max_bytes=25)
+    cache.put("a", "x" * 10)
+    cache.put("a", "x" * 4)
+    cache.put("b", "x" * 10)
+    cache.put("c", "x" * 12)  # 26 bytes, so "a" is evicted
+    with sqlite3.connect(path) as conn:
+        assert cache._size == conn.execute("SELECT SUM(size) FROM responses").fetchone()[0] == 22
+
+
+def test_unknown_mode_reuses_the_process_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(response_cache, "_DEFAULT_CACHE", None)
+    monkeypatch.setenv("LLM_CACHE_PATH", str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setenv("LLM_CACHE", "bogus")
+    first = response_cache.get_response_cache()
+    assert first.mode == "on"
+    assert response_cache.get_response_cache() is first
+    first.close()
@@ -0,0 +1,44 @@
+import sys
+import json
+from pathlib import Path
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import pytest
+from pydantic import ValidationError
+
+from schemas import CARD_ADAPTER, FLASHCARDS_ADAPTER, CardMatching, CardMultipleChoice, CardQA, validate_completion
+
+
+def test_card_type_is_inferred_when_missing():
+    assert isinstance(CARD_ADAPTER.validate_python({"question": "q", "answer": "a"}), CardQA)
+    assert isinstance(
+        CARD_ADAPTER.validate_python({"question": "q", "options": ["a", "b"], "correct_options": [0, 1]}),
+        CardMultipleChoice,
+    )
+    assert isinstance(CARD_ADAPTER.validate_python({"pairs": [{"left": "a", "right": "b"}]}), CardMatching)
+
+
+def test_explicit_type_selects_one_variant():
+    with pytest.raises(ValidationError) as excinfo:
+        CARD_ADAPTER.validate_python({"type": "single_choice", "question": "q", "answer": "a"})
+    # Only the tagged variant is tried, so errors name its missing fields
+    assert {e["loc"][-1] for e in excinfo.value.errors()} == {"options", "correct_option"}
+
+
+def test_validate_completion_uses_raw_json_and_falls_back_to_parser():
+    payload = {"decks": [{"topic": "A", "cards": [{"type": "qa", "question": "q", "answer": "a"}]}]}
+    calls = []
+
+    def parse(text):
+        calls.append(text)
+        return json.loads(text.strip().strip("`").removeprefix("json"))
+
+    clean = validate_completion(FLASHCARDS_ADAPTER, json.dumps(payload), parse)
+    fenced = validate_completion(FLASHCARDS_ADAPTER, "```json\n" + json.dumps(payload) + "\n```", parse)
+
+    assert clean == fenced
+    assert len(calls) == 1
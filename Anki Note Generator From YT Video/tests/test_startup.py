@@ -0,0 +1,51 @@
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+# Cumulative import time budgets (ms); scale with IMPORT_BUDGET_FACTOR on slow machines
+MAIN_BUDGET_MS = 150
+PIPELINE_BUDGET_MS = 600
+# Only the paths that use them may import these
+INTERACTIVE_ONLY = ("questionary",)
+ON_DEMAND = ("youtube_transcript_api", "groq", "google.genai", "yt_dlp")
+
+_LINE_RE = re.compile(r"^import time:\s+\d+ \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def _import_times(statement: str) -> dict[str, float]:
+    """Cumulative import time in ms per module, from `python -X importtime`."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in proc.stderr.splitlines():
+        m = _LINE_RE.match(line)
+        if m:
+            times[m.group(3)] = int(m.group(1)) / 1000
+    return times
+
+
+def _budget(ms: float) -> float:
+    return ms * float(os.getenv("IMPORT_BUDGET_FACTOR") or 1)
+
+
+def test_main_imports_no_heavy_modules():
+    times = _import_times("import main")
+    assert not [m for m in INTERACTIVE_ONLY + ON_DEMAND + ("genanki", "pydantic") if m in times]
+    assert times["main"] < _budget(MAIN_BUDGET_MS), times["main"]
+
+
+def test_non_interactive_pipeline_skips_prompt_and_fallback_modules():
+    # What a `YOUTUBE_URL=... python main.py` run imports before fetching the transcript
+    times = _import_times("import main, batch")
+    assert not [m for m in INTERACTIVE_ONLY + ON_DEMAND if m in times]
+    assert times["batch"] < _budget(PIPELINE_BUDGET_MS), times["batch"]
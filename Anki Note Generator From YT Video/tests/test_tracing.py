@@ -0,0 +1,144 @@
+import sys
+import asyncio
+import json
+from pathlib import Path
+from types import SimpleNamespace
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import pytest
+
+import tracing
+from rate_limiter import RateLimitScheduler
+
+
+@pytest.fixture(autouse=True)
+def _tracing_off():
+    tracing.disable()
+    yield
+    tracing.disable()
+
+
+def test_disabled_tracing_returns_shared_noop_span():
+    first = tracing.span("llm", provider="groq")
+    with first as sp:
+        sp.add_bytes_in("prompt")
+        sp.bytes_out += 10
+        sp.set(cached=False)
+        tracing.add_retry()
+    assert first is tracing.span("other")
+    assert sp.bytes_out == 0
+    assert tracing.finish() is None
+
+
+def test_spans_nest_across_tasks_and_threads():
+    tracer = tracing.enable()
+
+    def in_thread():
+        with tracing.span("package") as sp:
+            sp.add_bytes_out(b"12345")
+
+    async def worker(i):
+        with tracing.span("llm", video=i) as sp:
+            sp.add_bytes_in("héllo")
+            await asyncio.sleep(0)
+
+    async def main():
+        with tracing.span("run"):
+            await asyncio.gather(worker(0), worker(1))
+            await asyncio.to_thread(in_thread)
+
+    asyncio.run(main())
+    spans = {(s.name, s.attrs.get("video")): s for s in tracer.spans}
+    root = spans[("run", None)]
+    assert root.parent_id is None
+    for key in [("llm", 0), ("llm", 1), ("package", None)]:
+        assert spans[key].parent_id == root.span_id
+    assert spans[("llm", 0)].bytes_in == len("héllo".encode("utf-8"))
+    assert spans[("package", None)].bytes_out == 5
+    assert root.duration_ns >= spans[("llm", 0)].duration_ns
+
+
+def test_span_records_error_and_scheduler_retries():
+    tracer = tracing.enable()
+    scheduler = RateLimitScheduler(max_retries=2, base_delay=0.001)
+    attempts = []
+
+    class _Unavailable(Exception):
+        status_code = 503
+        response = SimpleNamespace(status_code=503, headers={})
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise _Unavailable("busy")
+        return "ok"
+
+    async def main():
+        with tracing.span("llm"):
+            await scheduler.call("groq", "m", flaky)
+
+    asyncio.run(main())
+    with pytest.raises(ValueError):
+        with tracing.span("parse"):
+            raise ValueError("bad json")
+
+    llm, parse = tracer.spans
+    assert llm.retries == 2 and llm.error is None
+    assert parse.error == "ValueError"
+
+
+def test_finish_exports_jsonl_and_summary(monkeypatch, tmp_path):
+    path = tmp_path / "trace.jsonl"
+    monkeypatch.setenv("TRACE_FILE", str(path))
+    assert tracing.configure_from_env() is not None
+    with tracing.span("run"):
+        for _ in range(3):
+            with tracing.span("llm") as sp:
+                sp.add_bytes_in(100)
+                sp.add_bytes_out("x" * 20)
+
+    report = tracing.finish()
+    lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [line["name"] for line in lines] == ["llm", "llm", "llm", "run"]
+    assert {line["trace_id"] for line in lines} == {lines[0]["trace_id"]}
+    assert lines[0]["parent_id"] == lines[-1]["span_id"]
+    assert lines[0]["bytes_in"] == 100 and lines[0]["bytes_out"] == 20
+
+    rows = {row.split()[0]: row.split() for row in report.splitlines()[1:]}
+    assert rows["llm"][1] == "3"
+    assert rows["llm"][5:7] == ["300", "60"]
+    assert tracing.get_tracer() is None
+
+
+def test_otlp_export_is_opentelemetry_json(monkeypatch, tmp_path):
+    path = tmp_path / "trace.json"
+    monkeypatch.setenv("TRACE", "1")
+    monkeypatch.setenv("TRACE_FILE", str(path))
+    monkeypatch.setenv("TRACE_FORMAT", "otlp")
+    tracing.configure_from_env()
+    with tracing.span("run"):
+        with tracing.span("llm", provider="groq", cached=True):
+            pass
+    tracing.finish()
+
+    data = json.loads(path.read_text(encoding="utf-8"))
+    spans = data["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    llm, run = spans
+    assert len(llm["traceId"]) == 32 and len(llm["spanId"]) == 16
+    assert llm["parentSpanId"] == run["spanId"] and run["parentSpanId"] == ""
+    assert int(llm["endTimeUnixNano"]) >= int(llm["startTimeUnixNano"])
+    attrs = {a["key"]: a["value"] for a in llm["attributes"]}
+    assert attrs["provider"] == {"stringValue": "groq"}
+    assert attrs["cached"] == {"boolValue": True}
+    assert attrs["retries"] == {"intValue": "0"}
+
+
+def test_trace_env_off_wins_over_trace_file(monkeypatch, tmp_path):
+    monkeypatch.setenv("TRACE", "off")
+    monkeypatch.setenv("TRACE_FILE", str(tmp_path / "trace.jsonl"))
+    assert tracing.configure_from_env() is None
+    assert tracing.span("run") is tracing.span("run")
@@ -0,0 +1,116 @@
+import sys
+import asyncio
+import os
+from pathlib import Path
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import transcript_extractor as te
+
+
+def _spawn_sleepers(monkeypatch, procs):
+    real_exec = asyncio.create_subprocess_exec
+
+    async def fake_exec(*_cmd, **kwargs):
+        proc = await real_exec(sys.executable, "-c", "import time; time.sleep(30)", **kwargs)
+        procs.append(proc)
+        return proc
+
+    monkeypatch.setattr(te.asyncio, "create_subprocess_exec", fake_exec)
+
+
+def test_attempt_timeout_kills_child_without_retrying(monkeypatch):
+    procs = []
+    _spawn_sleepers(monkeypatch, procs)
+
+    code, output = asyncio.run(te._run_command_async(["yt-dlp", "--list-subs", "x"], timeout=0.2))
+
+    assert (code, output) == (1, "")
+    assert len(procs) == 1  # no binary fallback after a timeout
+    assert all(p.returncode is not None for p in procs)
+
+
+def test_sync_timeout_does_not_retry_binary(monkeypatch):
+    calls = []
+
+    def timing_out(cmd, **kwargs):
+        calls.append(cmd)
+        raise te.subprocess.TimeoutExpired(cmd, kwargs["timeout"])
+
+    monkeypatch.setattr(te.subprocess, "run", timing_out)
+
+    assert te._run_command(["yt-dlp", "--list-subs", "x"], timeout=0.2) == (1, "")
+    assert len(calls) == 1
+
+def test_cancellation_kills_child_and_removes_work_dir(monkeypatch):
+    procs = []
+    work_dirs = []
+    _spawn_sleepers(monkeypatch, procs)
+    monkeypatch.setattr(te, "_fetch_with_video_info", lambda *a, **k: None)
+    real_mkdtemp = te.tempfile.mkdtemp
+
+    def tracking_mkdtemp(**kwargs):
+        path = real_mkdtemp(**kwargs)
+        work_dirs.append(path)
+        return path
+
+    monkeypatch.setattr(te.tempfile, "mkdtemp", tracking_mkdtemp)
+
+    async def main():
+        task = asyncio.create_task(
+            te.extract_transcript_async("https://youtu.be/abcdefghijk", ["en"], use_cache=False, attempt_timeout=30)
+        )
+        while not procs:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            return True
+        return False
+
+    assert asyncio.run(main())
+    assert procs[0].returncode is not None
+    assert work_dirs and not os.path.exists(work_dirs[0])
+
+
+def test_timed_out_info_thread_keeps_its_directory_until_it_finishes(monkeypatch):
+    import threading
+
+    release = threading.Event()
+    seen = {"attempt_dirs": []}
+
+    def slow_info(url, work_dir, langs):
+        seen["info_dir"] = work_dir
+        release.wait(5)
+        # Still writing after the caller gave up on this attempt
+        Path(work_dir, "late.json3").write_text("{}", encoding="utf-8")
+        return None
+
+    async def no_subs(cmd, timeout):
+        if "-o" in cmd:
+            seen["attempt_dirs"].append(os.path.dirname(cmd[cmd.index("-o") + 1]))
+        return 1, ""
+
+    monkeypatch.setattr(te, "_fetch_with_video_info", slow_info)
+    monkeypatch.setattr(te, "_run_command_async", no_subs)
+    monkeypatch.setattr(te, "_fetch_with_transcript_api", lambda *a: None)
+
+    async def main():
+        try:
+            await te.extract_transcript_async("https://youtu.be/abcdefghijk", ["en"], use_cache=False, attempt_timeout=0.05)
+        except Exception as exc:
+            seen["error"] = str(exc)
+        seen["kept"] = os.path.isdir(seen["info_dir"])
+        release.set()
+
+    asyncio.run(main())  # waits for the worker thread on shutdown
+
+    assert "No transcript" in seen["error"]
+    assert seen["kept"]
+    # Every fallback attempt got its own directory, apart from the abandoned thread's
+    assert len(set(seen["attempt_dirs"] + [seen["info_dir"]])) == 4
+    assert not os.path.exists(os.path.dirname(seen["info_dir"]))
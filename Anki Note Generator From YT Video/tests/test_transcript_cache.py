@@ -0,0 +1,142 @@
+import sys
+import asyncio
+import os
+import threading
+import time
+from pathlib import Path
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from transcript_cache import TranscriptCache
+
+
+def test_cache_prefers_manual_and_respects_language_key(tmp_path):
+    cache = TranscriptCache(directory=str(tmp_path))
+    cache.put("abcdefghijk", ["en"], "auto", "auto text")
+    cache.put("abcdefghijk", ["en"], "manual", "manual text")
+
+    assert cache.get("abcdefghijk", ["en"]) == "manual text"
+    assert cache.get("abcdefghijk", ["de"]) is None
+
+
+def test_cache_expires_entries_after_ttl(tmp_path):
+    cache = TranscriptCache(directory=str(tmp_path), ttl_seconds=0.05)
+    cache.put("abcdefghijk", ["en"], "manual", "text")
+    time.sleep(0.1)
+    assert cache.get("abcdefghijk", ["en"]) is None
+
+
+def test_cache_evicts_least_recently_used_when_over_size(tmp_path):
+    cache = TranscriptCache(directory=str(tmp_path), max_bytes=10_000)
+    cache.put("aaaaaaaaaaa", ["en"], "manual", "a" * 4000)
+    cache.put("bbbbbbbbbbb", ["en"], "manual", "b" * 4000)
+    # Make "a" older than "b", then touch "a" through a read so "b" becomes the LRU entry
+    old = time.time() - 100
+    os.utime(cache._path("aaaaaaaaaaa", ["en"], "manual"), (old, old))
+    os.utime(cache._path("bbbbbbbbbbb", ["en"], "manual"), (old + 1, old + 1))
+    assert cache.get("aaaaaaaaaaa", ["en"]) is not None
+
+    cache.put("ccccccccccc", ["en"], "manual", "c" * 4000)
+
+    assert cache.get("bbbbbbbbbbb", ["en"]) is None
+    assert cache.get("aaaaaaaaaaa", ["en"]) is not None
+    assert cache.get("ccccccccccc", ["en"]) is not None
+
+
+def test_concurrent_requests_share_one_fetch(tmp_path):
+    cache = TranscriptCache(directory=str(tmp_path))
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.1)
+        return "shared text", "auto"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_fetch("abcdefghijk", ["en"], fetch)))
+        for _ in range(5)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert results == ["shared text"] * 5
+
+
+def test_extract_transcript_uses_cache(tmp_path, monkeypatch):
+    import transcript_extractor as te
+    import transcript_cache as tc
+
+    monkeypatch.setattr(tc, "_DEFAULT_CACHE", TranscriptCache(directory=str(tmp_path)))
+    calls = []
+
+    def fake_fetch(video_url, language_preference=None, working_directory=None, attempt_timeout=None):
+        calls.append(video_url)
+        return "cached transcript", "manual"
+
+    monkeypatch.setattr(te, "_fetch_transcript", fake_fetch)
+
+    url = "https://www.youtube.com/watch?v=abcdefghijk"
+    assert te.extract_transcript(url, ["en"]) == "cached transcript"
+    assert te.extract_transcript("https://youtu.be/abcdefghijk", ["en"]) == "cached transcript"
+    assert len(calls) == 1
+
+
+def test_async_requests_share_one_fetch(tmp_path):
+    cache = TranscriptCache(directory=str(tmp_path))
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "shared text", "manual"
+
+    async def main():
+        return await asyncio.gather(*(cache.aget_or_fetch("abcdefghijk", ["en"], fetch) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["shared text"] * 5
+    assert len(calls) == 1
+    assert cache.get("abcdefghijk", ["en"]) == "shared text"
+
+
+def test_cancelled_fetch_is_taken_over_by_a_waiter(tmp_path):
+    cache = TranscriptCache(directory=str(tmp_path))
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return f"text from fetch {len(calls)}", "manual"
+
+    async def main():
+        leader = asyncio.create_task(cache.aget_or_fetch("abcdefghijk", ["en"], fetch))
+        await asyncio.sleep(0.01)
+        followers = [asyncio.create_task(cache.aget_or_fetch("abcdefghijk", ["en"], fetch)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await asyncio.gather(*followers)
+
+    assert asyncio.run(main()) == ["text from fetch 2"] * 3
+    assert len(calls) == 2
+
+
+def test_put_walks_the_directory_only_when_over_budget(tmp_path, monkeypatch):
+    cache = TranscriptCache(directory=str(tmp_path), max_bytes=10_000)
+    walks = []
+    real_walk = os.walk
+    monkeypatch.setattr(os, "walk", lambda *a, **k: walks.append(1) or real_walk(*a, **k))
+
+    for i in range(4):
+        cache.put(f"video{i:06d}", ["en"], "manual", "x" * 2000)
+    assert len(walks) == 1  # the first put measures the directory
+
+    cache.put("videoxxxxxx", ["en"], "manual", "y" * 3000)
+    assert len(walks) == 2
+    assert cache._size <= 10_000
+    assert cache.get("video000000", ["en"]) is None
@@ -0,0 +1,99 @@
+import sys
+import json
+from pathlib import Path
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import yt_info
+
+
+_RAW_INFO = {
+    "id": "abcdefghijk",
+    "title": " Lecture 1 ",
+    "chapters": [{"start_time": 0, "end_time": 60, "title": "Intro"}],
+    "subtitles": {
+        "de": [{"ext": "json3", "url": "https://subs/de-manual"}],
+        "en-GB": [{"ext": "vtt", "url": "https://subs/en-gb.vtt"}, {"ext": "json3", "url": "https://subs/en-gb"}],
+    },
+    "automatic_captions": {
+        "en": [{"ext": "json3", "url": "https://subs/en-auto"}],
+    },
+}
+
+
+class _FakeYDL:
+    def __init__(self):
+        self.extract_calls = 0
+
+    def extract_info(self, url, download=False, process=True):
+        self.extract_calls += 1
+        return _RAW_INFO
+
+
+def test_select_track_prefers_manual_then_language_order():
+    info = yt_info._info_from_dict(_RAW_INFO)
+    assert info.title == "Lecture 1"
+    assert info.chapters[0]["title"] == "Intro"
+
+    track = yt_info.select_track(info, ["en", "en.*"])
+    assert (track.kind, track.lang, track.url) == ("manual", "en-GB", "https://subs/en-gb")
+
+    track = yt_info.select_track(info, ["fr"])
+    assert track is None
+
+    info.manual_tracks = []
+    track = yt_info.select_track(info, ["en", "en.*"])
+    assert (track.kind, track.lang) == ("auto", "en")
+
+
+def test_transcript_and_title_share_one_extraction(monkeypatch, tmp_path):
+    import transcript_extractor as te
+    from yt_title import fetch_video_title
+
+    fake = _FakeYDL()
+    monkeypatch.setattr(yt_info, "_get_ydl", lambda: fake)
+    monkeypatch.setattr(yt_info, "_INFO_CACHE", type(yt_info._INFO_CACHE)())
+
+    def fake_download(track, destination):
+        payload = {"events": [{"segs": [{"utf8": "hello "}, {"utf8": "world"}]}]}
+        Path(destination).write_text(json.dumps(payload), encoding="utf-8")
+        return destination
+
+    monkeypatch.setattr(te, "download_track", fake_download)
+
+    url = "https://www.youtube.com/watch?v=abcdefghijk"
+    text, kind = te._fetch_transcript(url, ["en"], working_directory=str(tmp_path))
+    assert (text, kind) == ("hello world", "manual")
+    assert fetch_video_title(url) == "Lecture 1"
+    assert fake.extract_calls == 1
+
+
+def test_concurrent_lookups_wait_for_the_running_extraction(monkeypatch):
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    release = threading.Event()
+
+    class _SlowYDL(_FakeYDL):
+        def extract_info(self, url, download=False, process=True):
+            release.wait(5)
+            return super().extract_info(url, download, process)
+
+    fake = _SlowYDL()
+    monkeypatch.setattr(yt_info, "_get_ydl", lambda: fake)
+    monkeypatch.setattr(yt_info, "_INFO_CACHE", type(yt_info._INFO_CACHE)())
+
+    url = "https://www.youtube.com/watch?v=abcdefghijk"
+    with ThreadPoolExecutor(4) as pool:
+        futures = [pool.submit(yt_info.get_video_info, url) for _ in range(4)]
+        time.sleep(0.05)
+        release.set()
+        infos = [f.result() for f in futures]
+
+    assert fake.extract_calls == 1
+    assert all(info is infos[0] for info in infos)
+    assert yt_info._INFO_INFLIGHT == {}
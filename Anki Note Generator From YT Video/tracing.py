@@ -0,0 +1,296 @@
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+from typing import Any, Optional, Union
+
+# The innermost open span of the current task or thread. asyncio tasks and
+# `asyncio.to_thread` copy the context, so their spans nest under the caller's.
+_current: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("trace_span", default=None)
+
+_tracer: Optional["Tracer"] = None
+
+
+def _size(value: Union[str, bytes, int, None]) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    return len(value)
+
+
+class Span:
+    """One timed stage: wall time, bytes in and out, retries and free-form attributes."""
+
+    __slots__ = (
+        "tracer",
+        "name",
+        "span_id",
+        "parent_id",
+        "start_ns",
+        "duration_ns",
+        "bytes_in",
+        "bytes_out",
+        "retries",
+        "attrs",
+        "error",
+        "_t0",
+        "_token",
+    )
+
+    def __init__(self, tracer: "Tracer", name: str, attrs: dict) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.span_id = tracer.next_id()
+        self.parent_id: Optional[str] = None
+        self.start_ns = 0
+        self.duration_ns = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.retries = 0
+        self.attrs = attrs
+        self.error: Optional[str] = None
+
+    def __enter__(self) -> "Span":
+        parent = _current.get()
+        self.parent_id = parent.span_id if parent is not None else None
+        self._token = _current.set(self)
+        self.start_ns = time.time_ns()
+        self._t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.duration_ns = time.perf_counter_ns() - self._t0
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        _current.reset(self._token)
+        self.tracer.finished(self)
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def add_bytes_in(self, value: Union[str, bytes, int, None]) -> None:
+        """Count `value` (text is measured as UTF-8) as input of this stage."""
+        self.bytes_in += _size(value)
+
+    def add_bytes_out(self, value: Union[str, bytes, int, None]) -> None:
+        self.bytes_out += _size(value)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.tracer.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start_ns / 1e9,
+            "duration_ms": round(self.duration_ns / 1e6, 3),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "retries": self.retries,
+            "error": self.error,
+            "attrs": self.attrs,
+        }
+
+
+class _NoopSpan:
+    """Shared stand-in returned while tracing is off; every operation does nothing."""
+
+    __slots__ = ()
+    bytes_in = bytes_out = retries = 0
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        return None
+
+    def set(self, **attrs: Any) -> None:
+        return None
+
+    def add_bytes_in(self, value: Any) -> None:
+        return None
+
+    def add_bytes_out(self, value: Any) -> None:
+        return None
+
+
+_NOOP = _NoopSpan()
+
+
+class Tracer:
+    """Collects finished spans of one run. Safe to use from several threads."""
+
+    def __init__(self) -> None:
+        self.trace_id = os.urandom(16).hex()
+        self.spans: list[Span] = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def next_id(self) -> str:
+        return f"{next(self._ids):016x}"
+
+    def finished(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def write_jsonl(self, path: str) -> None:
+        """One JSON object per span, in the order spans finished."""
+        with open(path, "w", encoding="utf-8") as f:
+            for span in list(self.spans):
+                f.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+    def to_otlp(self) -> dict:
+        """The spans as an OTLP/JSON `ExportTraceServiceRequest`, for OpenTelemetry collectors."""
+
+        def value(v: Any) -> dict:
+            if isinstance(v, bool):
+                return {"boolValue": v}
+            if isinstance(v, int):
+                return {"intValue": str(v)}
+            if isinstance(v, float):
+                return {"doubleValue": v}
+            return {"stringValue": str(v)}
+
+        spans = []
+        for span in list(self.spans):
+            attrs = {"bytes_in": span.bytes_in, "bytes_out": span.bytes_out, "retries": span.retries, **span.attrs}
+            spans.append(
+                {
+                    "traceId": self.trace_id,
+                    "spanId": span.span_id,
+                    "parentSpanId": span.parent_id or "",
+                    "name": span.name,
+                    "kind": 1,
+                    "startTimeUnixNano": str(span.start_ns),
+                    "endTimeUnixNano": str(span.start_ns + span.duration_ns),
+                    "attributes": [{"key": k, "value": value(v)} for k, v in attrs.items()],
+                    # STATUS_CODE_ERROR = 2, STATUS_CODE_UNSET = 0
+                    "status": {"code": 2, "message": span.error} if span.error else {"code": 0},
+                }
+            )
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "anki-yt-notes"}}]},
+                    "scopeSpans": [{"scope": {"name": "tracing"}, "spans": spans}],
+                }
+            ]
+        }
+
+    def write_otlp(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_otlp(), f)
+
+    def summary(self) -> str:
+        """Per-stage totals, slowest stage first."""
+        stages: dict[str, list] = {}
+        for span in list(self.spans):
+            s = stages.setdefault(span.name, [0, 0, 0, 0, 0, 0, 0])
+            s[0] += 1
+            s[1] += span.duration_ns
+            s[2] = max(s[2], span.duration_ns)
+            s[3] += span.bytes_in
+            s[4] += span.bytes_out
+            s[5] += span.retries
+            s[6] += span.error is not None
+        if not stages:
+            return "Trace: no spans recorded."
+        lines = [
+            f"{'stage':<12} {'count':>6} {'total s':>9} {'mean ms':>9} {'max ms':>9} "
+            f"{'bytes in':>11} {'bytes out':>11} {'retries':>7} {'errors':>6}"
+        ]
+        for name, (count, total, longest, b_in, b_out, retries, errors) in sorted(
+            stages.items(), key=lambda item: -item[1][1]
+        ):
+            lines.append(
+                f"{name:<12} {count:>6} {total / 1e9:>9.3f} {total / count / 1e6:>9.1f} {longest / 1e6:>9.1f} "
+                f"{b_in:>11} {b_out:>11} {retries:>7} {errors:>6}"
+            )
+        return "\n".join(lines)
+
+
+def span(name: str, **attrs: Any) -> Union[Span, _NoopSpan]:
+    """
+    Context manager timing one stage, nested under the enclosing span.
+
+        with tracing.span("llm", provider="groq") as sp:
+            sp.add_bytes_in(prompt)
+
+    Returns a shared no-op span while tracing is disabled.
+    """
+    tracer = _tracer
+    if tracer is None:
+        return _NOOP
+    return Span(tracer, name, attrs)
+
+
+def current_span() -> Union[Span, _NoopSpan]:
+    return _current.get() or _NOOP
+
+
+def add_retry() -> None:
+    """Count a retry against the innermost open span."""
+    current = _current.get()
+    if current is not None:
+        current.retries += 1
+
+
+def enable() -> Tracer:
+    """Start collecting spans (a fresh trace) and return the tracer."""
+    global _tracer
+    _tracer = Tracer()
+    return _tracer
+
+
+def disable() -> Optional[Tracer]:
+    """Stop collecting spans; returns the tracer that was active, if any."""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+def get_tracer() -> Optional[Tracer]:
+    return _tracer
+
+
+def tracing_settings() -> dict:
+    """
+    Tracing options from env: `TRACE` (on/off), `TRACE_FILE` (path to export to,
+    which also turns tracing on) and `TRACE_FORMAT` ("jsonl" or "otlp").
+    """
+    path = os.path.expanduser(os.getenv("TRACE_FILE") or "")
+    flag = (os.getenv("TRACE") or "").strip().lower()
+    return {
+        "enabled": flag in ("1", "true", "yes", "on") or (bool(path) and flag not in ("0", "false", "no", "off")),
+        "path": path or None,
+        "format": (os.getenv("TRACE_FORMAT") or "jsonl").strip().lower(),
+    }
+
+
+def configure_from_env() -> Optional[Tracer]:
+    settings = tracing_settings()
+    return enable() if settings["enabled"] else None
+
+
+def finish() -> Optional[str]:
+    """
+    Stop tracing, export the spans to `TRACE_FILE` when set and return the summary
+    (None when tracing was off).
+    """
+    tracer = disable()
+    if tracer is None:
+        return None
+    settings = tracing_settings()
+    if settings["path"]:
+        if settings["format"] == "otlp":
+            tracer.write_otlp(settings["path"])
+        else:
+            tracer.write_jsonl(settings["path"])
+    return tracer.summary()
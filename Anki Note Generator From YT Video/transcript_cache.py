@@ -0,0 +1,245 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Iterable, Optional
+
+
+TRACK_KINDS = ("manual", "auto", "any")
+
+_DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".cache", "anki-yt-notes", "transcripts")
+_DEFAULT_TTL_SECONDS = 30 * 24 * 3600
+_DEFAULT_MAX_BYTES = 500 * 1024 * 1024
+
+
+class _LeaderCancelled(Exception):
+    """Set on a shared fetch whose leading task was cancelled; a waiter fetches instead."""
+
+
+def _language_key(language_preference: Optional[Iterable[str]]) -> str:
+    return ",".join(language_preference or [])
+
+
+class TranscriptCache:
+    """
+    On-disk transcript cache keyed by (video id, language preference, track kind).
+
+    - Entries older than `ttl_seconds` are treated as misses and removed.
+    - When the directory grows beyond `max_bytes`, least recently used entries are evicted
+      (reads refresh an entry's mtime). The size is measured once, then tracked as
+      entries are written, so the directory is only walked again when over budget.
+    - Concurrent `get_or_fetch` (threads) or `aget_or_fetch` (tasks) calls for the same
+      video share a single fetch.
+    """
+
+    def __init__(
+        self,
+        directory: str = _DEFAULT_DIR,
+        ttl_seconds: float = _DEFAULT_TTL_SECONDS,
+        max_bytes: int = _DEFAULT_MAX_BYTES,
+    ) -> None:
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._inflight: dict[str, Future] = {}
+        self._async_inflight: dict[str, asyncio.Future] = {}
+        # Bytes in the directory: measured by the first `evict`, then kept up to date by `put`
+        self._size: Optional[int] = None
+
+    def _path(self, video_id: str, language_preference: Optional[Iterable[str]], kind: str) -> str:
+        raw = "\x1f".join([video_id, _language_key(language_preference), kind])
+        digest = hashlib.sha256(raw.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest[:2], f"{digest}.json")
+
+    def get(self, video_id: str, language_preference: Optional[Iterable[str]] = None) -> Optional[str]:
+        """Return a cached transcript, preferring manual over auto-generated tracks."""
+        for kind in TRACK_KINDS:
+            path = self._path(video_id, language_preference, kind)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if time.time() - float(entry.get("created", 0)) > self.ttl_seconds:
+                self._remove(path)
+                continue
+            text = entry.get("text")
+            if isinstance(text, str) and text:
+                try:
+                    os.utime(path)
+                except OSError:
+                    pass
+                return text
+        return None
+
+    def put(self, video_id: str, language_preference: Optional[Iterable[str]], kind: str, text: str) -> None:
+        if kind not in TRACK_KINDS:
+            raise ValueError(f"Unknown track kind: {kind}")
+        path = self._path(video_id, language_preference, kind)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        entry = {
+            "video_id": video_id,
+            "languages": list(language_preference or []),
+            "kind": kind,
+            "created": time.time(),
+            "text": text,
+        }
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        written = os.path.getsize(path)
+        with self._lock:
+            if self._size is not None:
+                self._size += written - replaced
+            over = self._size is None or self._size > self.max_bytes
+        if over:
+            self.evict()
+
+    def _remove(self, path: str) -> None:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            if self._size is not None:
+                self._size -= size
+
+    def evict(self) -> None:
+        """Drop expired entries, then least recently used ones until under `max_bytes`."""
+        entries: list[tuple[float, int, str]] = []
+        now = time.time()
+        for root, _dirs, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        entries.sort()
+        for mtime, size, path in entries:
+            # mtime is refreshed on reads, so an entry whose mtime is past the TTL is
+            # certainly expired; younger ones are checked on read.
+            if total <= self.max_bytes and now - mtime <= self.ttl_seconds:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        with self._lock:
+            self._size = total
+
+    def _flight_key(self, video_id: str, language_preference: Optional[Iterable[str]]) -> str:
+        return f"{video_id}\x1f{_language_key(language_preference)}"
+
+    def get_or_fetch(
+        self,
+        video_id: str,
+        language_preference: Optional[Iterable[str]],
+        fetch: Callable[[], tuple[str, str]],
+    ) -> str:
+        """
+        Return the cached transcript or call `fetch` -> (text, kind) and store its result.
+
+        Callers racing on the same video and languages wait for the first caller's fetch.
+        """
+        cached = self.get(video_id, language_preference)
+        if cached is not None:
+            return cached
+
+        flight_key = self._flight_key(video_id, language_preference)
+        with self._lock:
+            future = self._inflight.get(flight_key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[flight_key] = future
+        if not leader:
+            return future.result()
+
+        try:
+            text, kind = fetch()
+            try:
+                self.put(video_id, language_preference, kind, text)
+            except OSError:
+                # A read-only or full cache directory must not fail the extraction
+                pass
+            future.set_result(text)
+            return text
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(flight_key, None)
+
+    async def aget_or_fetch(
+        self,
+        video_id: str,
+        language_preference: Optional[Iterable[str]],
+        fetch: Callable[[], Awaitable[tuple[str, str]]],
+    ) -> str:
+        """Async `get_or_fetch`: concurrent tasks for the same video await one fetch."""
+        cached = await asyncio.to_thread(self.get, video_id, language_preference)
+        if cached is not None:
+            return cached
+
+        flight_key = self._flight_key(video_id, language_preference)
+        while (future := self._async_inflight.get(flight_key)) is not None:
+            try:
+                # shield: a cancelled follower must not cancel the shared fetch
+                return await asyncio.shield(future)
+            except _LeaderCancelled:
+                # The first waiter to wake up takes over the fetch, the others follow it
+                continue
+
+        future = asyncio.get_running_loop().create_future()
+        self._async_inflight[flight_key] = future
+        try:
+            text, kind = await fetch()
+            try:
+                await asyncio.to_thread(self.put, video_id, language_preference, kind, text)
+            except OSError:
+                pass
+            future.set_result(text)
+            return text
+        except BaseException as exc:
+            # Waiters must not inherit this task's cancellation
+            future.set_exception(_LeaderCancelled() if isinstance(exc, asyncio.CancelledError) else exc)
+            # Mark retrieved so an unobserved failure does not log a warning
+            future.exception()
+            raise
+        finally:
+            self._async_inflight.pop(flight_key, None)
+
+
+_DEFAULT_CACHE: Optional[TranscriptCache] = None
+
+
+def get_default_cache() -> Optional[TranscriptCache]:
+    """Process-wide cache configured from env; None when `TRANSCRIPT_CACHE=off`."""
+    global _DEFAULT_CACHE
+    if (os.getenv("TRANSCRIPT_CACHE") or "").strip().lower() in ("0", "off", "false", "no"):
+        return None
+    if _DEFAULT_CACHE is None:
+        _DEFAULT_CACHE = TranscriptCache(
+            directory=os.getenv("TRANSCRIPT_CACHE_DIR") or _DEFAULT_DIR,
+            ttl_seconds=float(os.getenv("TRANSCRIPT_CACHE_TTL") or _DEFAULT_TTL_SECONDS),
+            max_bytes=int(float(os.getenv("TRANSCRIPT_CACHE_MAX_MB") or _DEFAULT_MAX_BYTES / 1024 / 1024) * 1024 * 1024),
+        )
+    return _DEFAULT_CACHE
@@ -1,25 +1,21 @@
+import asyncio
 import glob
-import json
 import os
 import re
 import shutil
 import subprocess
 import tempfile
+import threading
 from typing import Optional, Iterable
 
-from youtube_transcript_api import YouTubeTranscriptApi, NoTranscriptFound, TranscriptsDisabled
+from json3_stream import iter_json3_segments
+from transcript_cache import get_default_cache
+from yt_info import download_track, get_video_info, select_track
 
 
 def _parse_json3_to_text(file_path: str) -> str:
-    with open(file_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    text_fragments: list[str] = []
-    for event in data.get("events", []):
-        for seg in event.get("segs", []) or []:
-            frag = seg.get("utf8")
-            if frag:
-                text_fragments.append(frag)
-    return "".join(text_fragments).strip()
+    # Streams events instead of json.load-ing multi-hour subtitle files whole
+    return "".join(seg.text for seg in iter_json3_segments(file_path)).strip()
 
 
 def _normalize_langs(langs: Optional[Iterable[str]]) -> list[str]:
@@ -42,72 +38,67 @@ def _normalize_langs(langs: Optional[Iterable[str]]) -> list[str]:
     return result
 
 
-def _run_ytdlp_for_subs(
+def _fetch_with_video_info(
     video_url: str,
     work_dir: str,
-    manual_subs: bool,
     language_preference: Optional[list[str]] = None,
-) -> list[str]:
+) -> Optional[tuple[str, str]]:
     """
-    Run yt-dlp to fetch subtitles (json3) into work_dir and return list of created .json3 files.
-    If manual_subs is True, tries human subtitles only, else auto-generated.
+    Fetch a transcript with one in-process yt-dlp extraction: pick the best track from the
+    extracted info and download only that track. Returns None when no track matches.
     """
-    language_preference = _normalize_langs(language_preference)
-
-    # Output template without extension so subtitle language and ext are appended
-    output_template = os.path.join(work_dir, "%(id)s")
-
-    # Build base command
-    cmd = [
-        "yt-dlp",
-        "--skip-download",
-        "--no-progress",
-        "--sub-format",
-        "json3",
-        "--sub-langs",
-        ",".join(language_preference),
-        "-o",
-        output_template,
-    ]
-
+    info = get_video_info(video_url)
+    track = select_track(info, _normalize_langs(language_preference))
+    if track is None:
+        return None
+    path = os.path.join(work_dir, f"{info.video_id or 'video'}.{track.lang}.json3")
+    download_track(track, path)
+    text = _parse_json3_to_text(path)
+    if not text:
+        return None
+    return text, track.kind
+
+
+def _attempt_timeout(timeout: Optional[float] = None) -> float:
+    """Per-attempt timeout in seconds for a single yt-dlp/transcript attempt."""
+    if timeout is not None:
+        return timeout
+    return float(os.getenv("YTDLP_ATTEMPT_TIMEOUT") or 120)
+
+
+def _cookie_proxy_args() -> list[str]:
     # Optional proxy/cookies via env
+    args: list[str] = []
     proxy = os.getenv("YTDLP_PROXY")
     if proxy:
-        cmd += ["--proxy", proxy]
+        args += ["--proxy", proxy]
     cookies_browser = os.getenv("YTDLP_COOKIES_BROWSER")
     if cookies_browser:
-        cmd += ["--cookies-from-browser", cookies_browser]
+        args += ["--cookies-from-browser", cookies_browser]
     cookies_file = os.getenv("YTDLP_COOKIES_FILE")
     if cookies_file:
-        cmd += ["--cookies", cookies_file]
-
-    cmd.append(video_url)
-    if manual_subs:
-        cmd.insert(1, "--write-sub")
-    else:
-        cmd.insert(1, "--write-auto-sub")
-
-    # Try running as module to favor uv environment
-    try_cmd = ["python", "-m", "yt_dlp"] + cmd[1:]
-    result = subprocess.run(try_cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        # Fallback to direct binary name
-        result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        # Still return whatever files might have been produced if any
-        pass
-
-    return sorted(glob.glob(os.path.join(work_dir, "*.json3")))
+        args += ["--cookies", cookies_file]
+    return args
 
 
-def _run_ytdlp_for_subs_both(
+def _subs_command(
     video_url: str,
     work_dir: str,
+    manual_subs: Optional[bool],
     language_preference: Optional[list[str]] = None,
 ) -> list[str]:
-    """Attempt downloading both manual and auto subtitles in all available languages."""
-    language_preference = ["all"]
+    """
+    Build the yt-dlp command fetching json3 subtitles into work_dir.
+    manual_subs=True fetches human subtitles, False auto-generated, None both in all languages.
+    """
+    if manual_subs is None:
+        language_preference = ["all"]
+    else:
+        language_preference = _normalize_langs(language_preference)
+
+    # Output template without extension so subtitle language and ext are appended
     output_template = os.path.join(work_dir, "%(id)s")
+
     cmd = [
         "yt-dlp",
         "--skip-download",
@@ -116,62 +107,242 @@ def _run_ytdlp_for_subs_both(
         "json3",
         "--sub-langs",
         ",".join(language_preference),
-        "--write-sub",
-        "--write-auto-sub",
         "-o",
         output_template,
     ]
-    proxy = os.getenv("YTDLP_PROXY")
-    if proxy:
-        cmd += ["--proxy", proxy]
-    cookies_browser = os.getenv("YTDLP_COOKIES_BROWSER")
-    if cookies_browser:
-        cmd += ["--cookies-from-browser", cookies_browser]
-    cookies_file = os.getenv("YTDLP_COOKIES_FILE")
-    if cookies_file:
-        cmd += ["--cookies", cookies_file]
+    cmd += _cookie_proxy_args()
     cmd.append(video_url)
+    if manual_subs is None:
+        cmd[1:1] = ["--write-sub", "--write-auto-sub"]
+    elif manual_subs:
+        cmd.insert(1, "--write-sub")
+    else:
+        cmd.insert(1, "--write-auto-sub")
+    return cmd
+
+
+def _run_command(cmd: list[str], timeout: float) -> tuple[int, str]:
+    """
+    Run a yt-dlp command, preferring the module form; returns (returncode, output).
 
+    The binary is only tried when the module form is missing or fails, not after a
+    timeout, so an attempt never takes longer than `timeout`.
+    """
+    # Try running as module to favor uv environment
     try_cmd = ["python", "-m", "yt_dlp"] + cmd[1:]
-    result = subprocess.run(try_cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        result = subprocess.run(cmd, capture_output=True, text=True)
-    return sorted(glob.glob(os.path.join(work_dir, "*.json3")))
+    for candidate in (try_cmd, cmd):
+        try:
+            result = subprocess.run(candidate, capture_output=True, text=True, timeout=timeout)
+        except FileNotFoundError:
+            continue
+        except subprocess.TimeoutExpired:
+            # subprocess.run kills the child on timeout
+            break
+        if result.returncode == 0:
+            return 0, result.stdout or result.stderr or ""
+    return 1, ""
 
 
-def _yt_dlp_list_subs_output(video_url: str) -> str:
-    cmd = ["yt-dlp", "--list-subs", video_url]
+async def _run_command_async(cmd: list[str], timeout: float) -> tuple[int, str]:
+    """Async `_run_command`: the child is killed on timeout or when the caller is cancelled."""
     try_cmd = ["python", "-m", "yt_dlp"] + cmd[1:]
-    result = subprocess.run(try_cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        result = subprocess.run(cmd, capture_output=True, text=True)
-    return (result.stdout or result.stderr or "").strip()
-
-
-def _parse_list_subs_codes(output: str) -> list[str]:
-    # yt-dlp --list-subs prints a table; parse language codes from lines like:
-    # en        vtt, ttml, srv3, ...
-    codes: list[str] = []
-    for line in output.splitlines():
-        line = line.strip()
-        if not line or line.startswith("Language") or line.startswith("Available subtitles"):
+    for candidate in (try_cmd, cmd):
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *candidate,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+        except FileNotFoundError:
             continue
-        parts = line.split()
-        if parts and re.match(r"^[a-z]{2}(-[A-Za-z0-9]+)*$", parts[0]):
-            codes.append(parts[0])
-    # Deduplicate
-    return list(dict.fromkeys(codes))
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+        except asyncio.TimeoutError:
+            await _kill(proc)
+            break
+        except BaseException:
+            await _kill(proc)
+            raise
+        if proc.returncode == 0:
+            return 0, (stdout or stderr or b"").decode("utf-8", errors="replace")
+    return 1, ""
+
+
+async def _kill(proc: asyncio.subprocess.Process) -> None:
+    if proc.returncode is None:
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+        # Shielded so a second cancellation cannot leave a zombie behind
+        await asyncio.shield(proc.wait())
+
+
+def _subtitle_files(work_dir: str) -> list[str]:
+    return sorted(glob.glob(os.path.join(work_dir, "*.json3")))
+
+
+def _attempt_dir(work_dir: str, name: str) -> str:
+    """A fresh subdirectory per attempt, so no attempt picks up files left by another."""
+    path = os.path.join(work_dir, name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class _WorkDir:
+    """
+    A temporary directory shared with a worker thread we may stop waiting for.
+
+    `release()` removes it at once unless the thread is still running; then the thread
+    removes it when it finishes, so the directory never disappears under its writes.
+    """
+
+    def __init__(self) -> None:
+        self.path = tempfile.mkdtemp(prefix="yt_transcript_")
+        self._lock = threading.Lock()
+        self._running = False
+        self._released = False
+
+    def run(self, fn, *args):
+        """Call `fn(*args)` in the calling (worker) thread; skipped once released."""
+        with self._lock:
+            if self._released:
+                return None
+            self._running = True
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._running = False
+                remove = self._released
+            if remove:
+                shutil.rmtree(self.path, ignore_errors=True)
+
+    def release(self) -> None:
+        with self._lock:
+            self._released = True
+            remove = not self._running
+        if remove:
+            shutil.rmtree(self.path, ignore_errors=True)
+
+
+def _yt_dlp_list_subs_output(video_url: str, timeout: Optional[float] = None) -> str:
+    cmd = ["yt-dlp", "--list-subs", video_url]
+    _code, output = _run_command(cmd, _attempt_timeout(timeout))
+    return output.strip()
+
+
+def _fetch_with_transcript_api(
+    video_url: str,
+    language_preference: Optional[list[str]] = None,
+) -> Optional[tuple[str, str]]:
+    """Final fallback: youtube-transcript-api (prefer manual, then auto)."""
+    # Imported here: only this rarely used fallback needs it, and it is slow to import
+    from youtube_transcript_api import NoTranscriptFound, TranscriptsDisabled, YouTubeTranscriptApi
+
+    try:
+        vid = _extract_video_id(video_url)
+        lp = language_preference or ["en", "en-US", "en-GB"]
+        api = YouTubeTranscriptApi()
+        transcripts = api.list(vid)
+
+        # Try manually created transcripts first, then auto-generated ones
+        for finder, kind in (
+            (transcripts.find_manually_created_transcript, "manual"),
+            (transcripts.find_generated_transcript, "auto"),
+        ):
+            for lang in lp:
+                try:
+                    tr = finder([lang])
+                    items = tr.fetch()
+                    text = " ".join(item.get("text", "") for item in items if item.get("text"))
+                    if text.strip():
+                        return text.strip(), kind
+                except Exception:
+                    continue
+    except (NoTranscriptFound, TranscriptsDisabled):
+        pass
+    return None
+
+
+def _no_transcript_error(subs_info: str) -> Exception:
+    # As a helpful hint, include available subs listing (truncated)
+    msg = "No transcript found or generated."
+    if subs_info:
+        msg += " Available subtitles info (yt-dlp --list-subs):\n" + subs_info[:1500]
+    return Exception(msg)
+
+
+def _select_subtitle_file(files_to_parse: list[str], language_preference: Optional[list[str]]) -> str:
+    # Prefer language order provided
+    selected_file = files_to_parse[0]
+    if language_preference:
+        # Try to match exact language code in file name first; then prefix matches (e.g., en, en-US)
+        for lang in language_preference:
+            candidates = [p for p in files_to_parse if f".{lang}.json3" in p]
+            if candidates:
+                selected_file = candidates[0]
+                break
+        else:
+            # prefix match like ".en-"
+            for lang in language_preference:
+                prefix_candidates = [p for p in files_to_parse if f".{lang.split('-')[0]}-" in p]
+                if prefix_candidates:
+                    selected_file = prefix_candidates[0]
+                    break
+    return selected_file
+
+
+def _transcript_from_files(files_to_parse: list[str], language_preference: Optional[list[str]]) -> str:
+    transcript = _parse_json3_to_text(_select_subtitle_file(files_to_parse, language_preference))
+    if not transcript:
+        raise Exception("Transcript is empty.")
+    return transcript
+
+
+def _cached_video_id(video_url: str, use_cache: bool):
+    cache = get_default_cache() if use_cache else None
+    if cache is None:
+        return None, None
+    try:
+        return cache, _extract_video_id(video_url)
+    except ValueError:
+        return None, None
 
 
 def extract_transcript(
     video_url: str,
     language_preference: Optional[list[str]] = None,
     working_directory: Optional[str] = None,
+    use_cache: bool = True,
+    attempt_timeout: Optional[float] = None,
 ) -> str:
     """
     Extract transcript using yt-dlp. Prefer human subtitles; fallback to auto.
     Returns transcript text or raises Exception on failure.
+
+    Results are served from the persistent transcript cache when available
+    (see `transcript_cache`); pass `use_cache=False` to always download.
+    Each yt-dlp attempt is bounded by `attempt_timeout` seconds (env `YTDLP_ATTEMPT_TIMEOUT`).
     """
+    cache, video_id = _cached_video_id(video_url, use_cache)
+    if cache is None:
+        return _fetch_transcript(video_url, language_preference, working_directory, attempt_timeout)[0]
+    return cache.get_or_fetch(
+        video_id,
+        language_preference,
+        lambda: _fetch_transcript(video_url, language_preference, working_directory, attempt_timeout),
+    )
+
+
+def _fetch_transcript(
+    video_url: str,
+    language_preference: Optional[list[str]] = None,
+    working_directory: Optional[str] = None,
+    attempt_timeout: Optional[float] = None,
+) -> tuple[str, str]:
+    """Download and parse a transcript; returns (text, track kind) where kind is manual/auto/any."""
+    timeout = _attempt_timeout(attempt_timeout)
     temp_dir = None
     work_dir = working_directory
     try:
@@ -179,91 +350,105 @@ def extract_transcript(
             temp_dir = tempfile.mkdtemp(prefix="yt_transcript_")
             work_dir = temp_dir
 
-        # First: try human subtitles
-        manual_files = _run_ytdlp_for_subs(
-            video_url, work_dir, manual_subs=True, language_preference=language_preference
-        )
-        files_to_parse = manual_files
+        # Fast path: a single in-process extraction; the subprocess chain below is the fallback
+        try:
+            fetched = _fetch_with_video_info(video_url, _attempt_dir(work_dir, "info"), language_preference)
+        except Exception:
+            fetched = None
+        if fetched is not None:
+            return fetched
+
+        # Then: human subtitles, auto-generated ones, and finally both in all languages
+        for manual_subs, kind in ((True, "manual"), (False, "auto"), (None, "any")):
+            attempt_dir = _attempt_dir(work_dir, kind)
+            _run_command(_subs_command(video_url, attempt_dir, manual_subs, language_preference), timeout)
+            files_to_parse = _subtitle_files(attempt_dir)
+            if files_to_parse:
+                return _transcript_from_files(files_to_parse, language_preference), kind
+
+        fetched = _fetch_with_transcript_api(video_url, language_preference)
+        if fetched is not None:
+            return fetched
+        try:
+            subs_info = _yt_dlp_list_subs_output(video_url, timeout)
+        except Exception:
+            subs_info = ""
+        raise _no_transcript_error(subs_info)
+    finally:
+        if temp_dir and os.path.isdir(temp_dir):
+            shutil.rmtree(temp_dir, ignore_errors=True)
 
-        # Fallback: auto-generated
-        if not files_to_parse:
-            auto_files = _run_ytdlp_for_subs(
-                video_url, work_dir, manual_subs=False, language_preference=language_preference
-            )
-            files_to_parse = auto_files
 
-        # Final yt-dlp attempt: try both manual and auto, all languages
-        if not files_to_parse:
-            both_files = _run_ytdlp_for_subs_both(
-                video_url, work_dir, language_preference=language_preference or ["all"]
+async def extract_transcript_async(
+    video_url: str,
+    language_preference: Optional[list[str]] = None,
+    use_cache: bool = True,
+    attempt_timeout: Optional[float] = None,
+) -> str:
+    """
+    Non-blocking `extract_transcript` for use inside an event loop.
+
+    yt-dlp subprocesses run as asyncio child processes; every attempt is bounded by
+    `attempt_timeout`, and cancelling the awaiting task kills the running child and
+    removes the work directory.
+    """
+    cache, video_id = _cached_video_id(video_url, use_cache)
+    if cache is None:
+        return (await _fetch_transcript_async(video_url, language_preference, attempt_timeout))[0]
+    return await cache.aget_or_fetch(
+        video_id,
+        language_preference,
+        lambda: _fetch_transcript_async(video_url, language_preference, attempt_timeout),
+    )
+
+
+async def _fetch_transcript_async(
+    video_url: str,
+    language_preference: Optional[list[str]] = None,
+    attempt_timeout: Optional[float] = None,
+) -> tuple[str, str]:
+    timeout = _attempt_timeout(attempt_timeout)
+    shared = _WorkDir()
+    work_dir = shared.path
+    try:
+        # The in-process extraction runs in a worker thread; its sockets are bounded by
+        # YTDLP_SOCKET_TIMEOUT, and we stop waiting for it after `timeout`. The thread may
+        # keep writing after that, so it gets its own subdirectory and `shared` is only
+        # removed once it has finished.
+        info_dir = _attempt_dir(work_dir, "info")
+        try:
+            fetched = await asyncio.wait_for(
+                asyncio.to_thread(shared.run, _fetch_with_video_info, video_url, info_dir, language_preference),
+                timeout,
             )
-            files_to_parse = both_files
-
-        if not files_to_parse:
-            # Final fallback: youtube-transcript-api (prefer manual, then auto)
-            try:
-                vid = _extract_video_id(video_url)
-                lp = language_preference or ["en", "en-US", "en-GB"]
-                api = YouTubeTranscriptApi()
-                transcripts = api.list(vid)
-
-                # Try manually created transcripts first
-                for lang in lp:
-                    try:
-                        tr = transcripts.find_manually_created_transcript([lang])
-                        items = tr.fetch()
-                        text = " ".join(item.get("text", "") for item in items if item.get("text"))
-                        if text.strip():
-                            return text.strip()
-                    except Exception:
-                        continue
-
-                # Fallback: auto-generated transcripts
-                for lang in lp:
-                    try:
-                        tr = transcripts.find_generated_transcript([lang])
-                        items = tr.fetch()
-                        text = " ".join(item.get("text", "") for item in items if item.get("text"))
-                        if text.strip():
-                            return text.strip()
-                    except Exception:
-                        continue
-            except (NoTranscriptFound, TranscriptsDisabled):
-                pass
-            # As a helpful hint, include available subs listing (truncated)
-            try:
-                subs_info = _yt_dlp_list_subs_output(video_url)
-            except Exception:
-                subs_info = ""
-            msg = "No transcript found or generated."
-            if subs_info:
-                msg += " Available subtitles info (yt-dlp --list-subs):\n" + subs_info[:1500]
-            raise Exception(msg)
-
-        # Prefer language order provided
-        selected_file = files_to_parse[0]
-        if language_preference:
-            # Try to match exact language code in file name first; then prefix matches (e.g., en, en-US)
-            for lang in language_preference:
-                candidates = [p for p in files_to_parse if f".{lang}.json3" in p]
-                if candidates:
-                    selected_file = candidates[0]
-                    break
-            else:
-                # prefix match like ".en-"
-                for lang in language_preference:
-                    prefix_candidates = [p for p in files_to_parse if f".{lang.split('-')[0]}-" in p]
-                    if prefix_candidates:
-                        selected_file = prefix_candidates[0]
-                        break
-
-        transcript = _parse_json3_to_text(selected_file)
-        if not transcript:
-            raise Exception("Transcript is empty.")
-        return transcript
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            fetched = None
+        if fetched is not None:
+            return fetched
+
+        for manual_subs, kind in ((True, "manual"), (False, "auto"), (None, "any")):
+            attempt_dir = _attempt_dir(work_dir, kind)
+            await _run_command_async(_subs_command(video_url, attempt_dir, manual_subs, language_preference), timeout)
+            files_to_parse = _subtitle_files(attempt_dir)
+            if files_to_parse:
+                text = await asyncio.to_thread(_transcript_from_files, files_to_parse, language_preference)
+                return text, kind
+
+        try:
+            fetched = await asyncio.wait_for(
+                asyncio.to_thread(_fetch_with_transcript_api, video_url, language_preference),
+                timeout,
+            )
+        except asyncio.TimeoutError:
+            fetched = None
+        if fetched is not None:
+            return fetched
+        _code, subs_info = await _run_command_async(["yt-dlp", "--list-subs", video_url], timeout)
+        raise _no_transcript_error(subs_info.strip())
     finally:
-        if temp_dir and os.path.isdir(temp_dir):
-            shutil.rmtree(temp_dir, ignore_errors=True)
+        shared.release()
 
 
 def _extract_video_id(url: str) -> str:
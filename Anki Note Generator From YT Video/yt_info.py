@@ -0,0 +1,175 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+
+@dataclass
+class SubtitleTrack:
+    lang: str
+    kind: str  # "manual" or "auto"
+    ext: str
+    url: str
+
+
+@dataclass
+class VideoInfo:
+    video_id: str
+    title: Optional[str]
+    chapters: list[dict] = field(default_factory=list)
+    manual_tracks: list[SubtitleTrack] = field(default_factory=list)
+    auto_tracks: list[SubtitleTrack] = field(default_factory=list)
+
+
+# YoutubeDL instances are not thread-safe, so each worker thread keeps its own warm
+# instance (extractor registry, cookie jar, HTTP connections) across videos.
+_LOCAL = threading.local()
+
+_INFO_CACHE_SIZE = 64
+_INFO_CACHE: "OrderedDict[str, VideoInfo]" = OrderedDict()
+_INFO_LOCK = threading.Lock()
+# Extractions still running, so concurrent lookups of one video wait for it instead of repeating it
+_INFO_INFLIGHT: "dict[str, Future[VideoInfo]]" = {}
+
+
+def _ydl_params() -> dict:
+    params: dict = {
+        "quiet": True,
+        "no_warnings": True,
+        "skip_download": True,
+        "noprogress": True,
+        "socket_timeout": float(os.getenv("YTDLP_SOCKET_TIMEOUT") or 30),
+    }
+    proxy = os.getenv("YTDLP_PROXY")
+    if proxy:
+        params["proxy"] = proxy
+    cookies_browser = os.getenv("YTDLP_COOKIES_BROWSER")
+    if cookies_browser:
+        params["cookiesfrombrowser"] = (cookies_browser, None, None, None)
+    cookies_file = os.getenv("YTDLP_COOKIES_FILE")
+    if cookies_file:
+        params["cookiefile"] = cookies_file
+    return params
+
+
+def _get_ydl():
+    """Return this thread's YoutubeDL, rebuilding it only when the env-derived options change."""
+    params = _ydl_params()
+    ydl = getattr(_LOCAL, "ydl", None)
+    if ydl is None or getattr(_LOCAL, "params", None) != params:
+        from yt_dlp import YoutubeDL
+
+        if ydl is not None:
+            ydl.close()
+        ydl = YoutubeDL(dict(params))
+        _LOCAL.ydl = ydl
+        _LOCAL.params = params
+    return ydl
+
+
+def _tracks_from(subs: Optional[dict], kind: str) -> list[SubtitleTrack]:
+    tracks: list[SubtitleTrack] = []
+    for lang, formats in (subs or {}).items():
+        if lang == "live_chat":
+            continue
+        for fmt in formats or []:
+            if fmt.get("ext") == "json3" and fmt.get("url"):
+                tracks.append(SubtitleTrack(lang=lang, kind=kind, ext="json3", url=fmt["url"]))
+                break
+    return tracks
+
+
+def _info_from_dict(data: dict) -> VideoInfo:
+    title = data.get("title")
+    return VideoInfo(
+        video_id=str(data.get("id") or ""),
+        title=title.strip() if isinstance(title, str) and title.strip() else None,
+        chapters=list(data.get("chapters") or []),
+        manual_tracks=_tracks_from(data.get("subtitles"), "manual"),
+        auto_tracks=_tracks_from(data.get("automatic_captions"), "auto"),
+    )
+
+
+def _cache_key(url: str) -> str:
+    from transcript_extractor import _extract_video_id
+
+    try:
+        return _extract_video_id(url)
+    except ValueError:
+        return url
+
+
+def get_video_info(url: str) -> VideoInfo:
+    """
+    Extract title, chapters and subtitle tracks with a single in-process yt-dlp call.
+
+    Recent results are memoized per video id and concurrent calls for a video wait for
+    the extraction already running, so the transcript and title lookups for the same
+    video share one extraction.
+    """
+    key = _cache_key(url)
+    with _INFO_LOCK:
+        cached = _INFO_CACHE.get(key)
+        if cached is not None:
+            _INFO_CACHE.move_to_end(key)
+            return cached
+        pending = _INFO_INFLIGHT.get(key)
+        if pending is None:
+            future: "Future[VideoInfo]" = Future()
+            _INFO_INFLIGHT[key] = future
+    if pending is not None:
+        return pending.result()
+
+    try:
+        # process=False skips format selection, which is irrelevant for subtitles and
+        # fails on videos without downloadable formats.
+        data = _get_ydl().extract_info(url, download=False, process=False)
+        info = _info_from_dict(data or {})
+    except BaseException as exc:
+        with _INFO_LOCK:
+            _INFO_INFLIGHT.pop(key, None)
+        future.set_exception(exc)
+        raise
+
+    with _INFO_LOCK:
+        _INFO_INFLIGHT.pop(key, None)
+        _INFO_CACHE[key] = info
+        _INFO_CACHE.move_to_end(key)
+        while len(_INFO_CACHE) > _INFO_CACHE_SIZE:
+            _INFO_CACHE.popitem(last=False)
+    future.set_result(info)
+    return info
+
+
+def select_track(info: VideoInfo, language_patterns: Iterable[str]) -> Optional[SubtitleTrack]:
+    """
+    Choose the best subtitle track locally: manual before auto, then language preference order.
+
+    `language_patterns` uses yt-dlp `--sub-langs` syntax (e.g. "en", "en.*").
+    """
+    patterns = list(language_patterns)
+    for tracks in (info.manual_tracks, info.auto_tracks):
+        for pattern in patterns:
+            try:
+                regex = re.compile(pattern)
+            except re.error:
+                continue
+            for track in tracks:
+                if regex.fullmatch(track.lang):
+                    return track
+    return None
+
+
+def download_track(track: SubtitleTrack, destination: str) -> str:
+    """Download one subtitle track through the warm YoutubeDL (proxy/cookies applied)."""
+    response = _get_ydl().urlopen(track.url)
+    try:
+        with open(destination, "wb") as f:
+            while chunk := response.read(64 * 1024):
+                f.write(chunk)
+    finally:
+        response.close()
+    return destination
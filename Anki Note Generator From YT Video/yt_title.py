@@ -2,9 +2,18 @@ import subprocess
 import json
 from typing import Optional
 
+from yt_info import get_video_info
+
 
 def fetch_video_title(url: str) -> Optional[str]:
     """Fetch the YouTube video title using yt-dlp metadata extraction."""
+    # Reuses the in-process extraction already done for the transcript when possible
+    try:
+        title = get_video_info(url).title
+        if title:
+            return title
+    except Exception:
+        pass
     cmd = [
         "python",
         "-m",